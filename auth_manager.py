@@ -0,0 +1,232 @@
+import base64
+import json
+import logging
+import os
+import threading
+import time
+
+from broker_client import GENERATE_TOKENS_PATH, LOGIN_PATH, LOGOUT_PATH
+
+log = logging.getLogger(__name__)
+
+# Used when the JWT carries no readable "exp"
+DEFAULT_TOKEN_TTL = 6 * 3600
+
+
+def token_expiry(jwt_token):
+    """Epoch seconds from the JWT's "exp" claim (not verified), or None"""
+    try:
+        payload = jwt_token.split(".")[1]
+        claims = json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))
+        return float(claims["exp"])
+    except (AttributeError, IndexError, KeyError, TypeError, ValueError):
+        return None
+
+
+class AuthManager:
+    """
+    One Angel One session shared by everything in the process.
+
+    login() reuses the current session, or the one cached in `cache_path`
+    by an earlier run, and only does the password + TOTP login when neither
+    is usable. headers() hands out the request headers, built once per
+    token; once the JWT is within `refresh_margin` seconds of expiring, the
+    next call renews it through generateTokens (falling back to a fresh
+    login) while other threads keep using the still-valid old headers.
+
+    Callbacks added with on_change(callback) get the manager after every
+    new token, e.g. to hand it to the WebSocket feed.
+    """
+
+    def __init__(self, broker, api_key, client_id, password, totp_secret=None, cache_path=None,
+                 refresh_margin=900, login_retry=60, totp_required=True):
+        self.broker = broker
+        self.api_key = api_key
+        self.client_id = client_id
+        self.password = password
+        self.totp_secret = totp_secret
+        self.totp_required = totp_required
+        self.cache_path = cache_path
+        self.refresh_margin = refresh_margin
+        self.login_retry = login_retry
+        self.jwt_token = None
+        self.refresh_token = None
+        self.feed_token = None
+        self.expires_at = 0.0
+        self.logins = 0
+        self.refreshes = 0
+        self._base_headers = {
+            "Content-type": "application/json",
+            "X-ClientLocalIP": "127.0.0.1",
+            "X-ClientPublicIP": "127.0.0.1",
+            "X-MACAddress": "00:00:00:00:00:00",
+            "Accept": "application/json",
+            "X-PrivateKey": api_key,
+            "X-UserType": "USER",
+            "X-SourceID": "WEB",
+        }
+        self._headers = dict(self._base_headers)
+        self._renew_at = float("inf")
+        self._failed_at = 0.0
+        self._listeners = []
+        self._lock = threading.Lock()
+
+    @property
+    def logged_in(self):
+        return self.jwt_token is not None and time.time() < self.expires_at
+
+    def on_change(self, callback):
+        self._listeners.append(callback)
+
+    def headers(self):
+        """Headers for a secure call, renewing the token first if it is about to expire"""
+        if time.time() >= self._renew_at:
+            self._renew()
+        return self._headers
+
+    def login(self):
+        """Make sure there is a usable session; returns True if there is"""
+        with self._lock:
+            if self.logged_in:
+                return True
+            if self._load_cache():
+                return True
+            return self._login()
+
+    def logout(self):
+        with self._lock:
+            if self.jwt_token is None:
+                return True
+            try:
+                response = self.broker.post(LOGOUT_PATH, {"clientcode": self.client_id}, headers=self._headers)
+                response_data = response.json()
+                if response_data.get("status"):
+                    log.info("✅ Logout successful!")
+                else:
+                    log.error("❌ Logout failed. Error: %s", response_data.get("message"))
+                return bool(response_data.get("status"))
+            except Exception as e:
+                log.warning("⚠ An error occurred during logout: %s", e)
+                return False
+            finally:
+                self._set_session(None, None, None)
+                self._remove_cache()
+
+    def _renew(self):
+        # Only one thread renews; the others carry on with the current token while it is still valid
+        if not self._lock.acquire(blocking=not self.logged_in):
+            return
+        try:
+            if time.time() < self._renew_at:
+                return
+            if self.refresh_token is not None and self._refresh():
+                return
+            if time.time() - self._failed_at >= self.login_retry:
+                self._login()
+        finally:
+            self._lock.release()
+
+    def _refresh(self):
+        try:
+            response = self.broker.post(GENERATE_TOKENS_PATH, {"refreshToken": self.refresh_token},
+                                        headers=self._headers)
+            response_data = response.json()
+        except Exception as e:
+            log.warning("⚠ Token refresh failed: %s", e)
+            return False
+        if not response_data.get("status"):
+            log.warning("⚠ Token refresh refused: %s", response_data.get("message"))
+            return False
+        data = response_data["data"]
+        self._set_session(data["jwtToken"], data.get("refreshToken") or self.refresh_token,
+                          data.get("feedToken") or self.feed_token)
+        self.refreshes += 1
+        log.info("🔑 Session token renewed, valid until %s", time.strftime("%H:%M:%S", time.localtime(self.expires_at)))
+        return True
+
+    def _login(self):
+        payload = {"clientcode": self.client_id, "password": self.password, "totp": ""}
+        if self.totp_secret or self.totp_required:
+            payload["totp"] = self._totp()
+        try:
+            response = self.broker.post(LOGIN_PATH, payload, headers=self._base_headers)
+            response_data = response.json()
+        except Exception as e:
+            log.warning("⚠ An error occurred during login: %s", e)
+            self._failed_at = time.time()
+            return False
+        if not response_data.get("status"):
+            log.error("❌ Login failed. Error: %s", response_data.get("message"))
+            self._failed_at = time.time()
+            return False
+        data = response_data["data"]
+        self._set_session(data["jwtToken"], data.get("refreshToken"), data.get("feedToken"))
+        self.logins += 1
+        log.info("✅ Login successful!")
+        return True
+
+    def _totp(self):
+        """Current TOTP, waiting for the next one if this one is about to roll over mid-request"""
+        import pyotp
+
+        totp = pyotp.TOTP(self.totp_secret)
+        remaining = totp.interval - time.time() % totp.interval
+        if remaining < 3:
+            time.sleep(remaining)
+        return totp.now()
+
+    def _set_session(self, jwt_token, refresh_token, feed_token, expires_at=None, save=True):
+        self.jwt_token, self.refresh_token, self.feed_token = jwt_token, refresh_token, feed_token
+        if jwt_token is None:
+            self.expires_at, self._renew_at = 0.0, float("inf")
+            self._headers = dict(self._base_headers)
+            return
+        self.expires_at = expires_at or token_expiry(jwt_token) or time.time() + DEFAULT_TOKEN_TTL
+        self._renew_at = self.expires_at - min(self.refresh_margin, (self.expires_at - time.time()) / 2)
+        self._headers = {**self._base_headers, "Authorization": f"Bearer {jwt_token}"}
+        if save:
+            self._save_cache()
+        for callback in self._listeners:
+            try:
+                callback(self)
+            except Exception as e:
+                log.warning("⚠ Session listener failed: %s", e)
+
+    def _load_cache(self):
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return False
+        try:
+            with open(self.cache_path) as f:
+                cached = json.load(f)
+        except (OSError, ValueError) as e:
+            log.warning("⚠ Ignoring unreadable session cache %s: %s", self.cache_path, e)
+            return False
+        if cached.get("client_id") != self.client_id or cached.get("expires_at", 0) - time.time() < self.refresh_margin:
+            return False
+        self._set_session(cached["jwt_token"], cached.get("refresh_token"), cached.get("feed_token"),
+                          cached["expires_at"], save=False)
+        log.info("🔑 Reusing the cached session, valid until %s",
+                 time.strftime("%H:%M:%S", time.localtime(self.expires_at)))
+        return True
+
+    def _save_cache(self):
+        if not self.cache_path:
+            return
+        tmp = self.cache_path + ".tmp"
+        try:
+            os.makedirs(os.path.dirname(self.cache_path) or ".", exist_ok=True)
+            fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, "w") as f:
+                json.dump({"client_id": self.client_id, "jwt_token": self.jwt_token,
+                           "refresh_token": self.refresh_token, "feed_token": self.feed_token,
+                           "expires_at": self.expires_at}, f)
+            os.replace(tmp, self.cache_path)
+        except OSError as e:
+            log.warning("⚠ Could not cache the session in %s: %s", self.cache_path, e)
+
+    def _remove_cache(self):
+        if self.cache_path and os.path.exists(self.cache_path):
+            try:
+                os.remove(self.cache_path)
+            except OSError:
+                pass
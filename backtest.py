@@ -0,0 +1,208 @@
+import argparse
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from supertrend_engine import supertrend_arrays
+
+TRADE_COLUMNS = [
+    "side", "entry_time", "entry_price", "stop_loss", "take_profit",
+    "exit_time", "exit_price", "exit_reason", "quantity", "pnl",
+]
+
+
+def supertrend_signals(high, low, close, length=10, multiplier=2.0):
+    """
+    Vectorized 'signal' / 'signal_change' as calculate_supertrend builds them:
+    returns (trend, is_buy bool array, signal_change bool array).
+    Changes before the ATR warm-up is complete are ignored, as in the live loop.
+    """
+    trend, _ = supertrend_arrays(high, low, close, length, multiplier)
+    is_buy = np.asarray(close, dtype=np.float64) > trend  # NaN trend compares False -> 'sell'
+    change = np.zeros(is_buy.size, dtype=bool)
+    change[1:] = is_buy[1:] != is_buy[:-1]
+    change[:length + 1] = False
+    return trend, is_buy, change
+
+
+def rolling_extreme(values, window, func):
+    """func (np.minimum / np.maximum) over the trailing `window` values, shorter at the start"""
+    out = np.array(values, dtype=np.float64)
+    for k in range(1, window):
+        func(out[k:], values[:-k], out=out[k:])
+    return out
+
+
+def simulate_trades(high, low, close, length=10, multiplier=2.0, risk_reward=2.0, sl_lookback=3, quantity=1):
+    """Trade records (TRADE_COLUMNS order, times as bar indexes) for the Supertrend rules on plain arrays"""
+    _, is_buy, change = supertrend_signals(high, low, close, length, multiplier)
+    return trades_from_signals(high, low, close, is_buy, change, risk_reward, sl_lookback, quantity)
+
+
+def trades_from_signals(high, low, close, is_buy, change, risk_reward=2.0, sl_lookback=3, quantity=1):
+    """The position state machine, given precomputed signals (lets a sweep reuse one Supertrend run)"""
+    n = close.size
+    change_idx = np.flatnonzero(change)
+
+    lowest = rolling_extreme(low, sl_lookback, np.minimum)
+    highest = rolling_extreme(high, sl_lookback, np.maximum)
+
+    trades = []
+    for c, entry in enumerate(change_idx):
+        side = 1 if is_buy[entry] else -1
+        entry_price = close[entry]
+        if entry >= sl_lookback - 1:
+            stop = lowest[entry] if side > 0 else highest[entry]
+        else:
+            stop = entry_price * (0.98 if side > 0 else 1.02)
+        risk = (entry_price - stop) * side
+        target = entry_price + side * risk_reward * risk
+
+        # The position lives until the next signal change (reversal) unless stop/target hits first
+        end = change_idx[c + 1] if c + 1 < len(change_idx) else n
+        window = slice(entry + 1, end)
+        if side > 0:
+            stop_hit = low[window] <= stop
+            target_hit = high[window] >= target
+        else:
+            stop_hit = high[window] >= stop
+            target_hit = low[window] <= target
+        hit = stop_hit | target_hit
+
+        if hit.any():
+            offset = int(np.argmax(hit))
+            exit_i = entry + 1 + offset
+            if stop_hit[offset]:  # Stop is checked first, like the live loop
+                exit_price, reason = stop, "stop_loss"
+            else:
+                exit_price, reason = target, "take_profit"
+        elif end < n:
+            exit_i, exit_price, reason = end, close[end], "reversal"
+        else:
+            exit_i, exit_price, reason = n - 1, close[n - 1], "end_of_data"
+
+        trades.append((
+            "long" if side > 0 else "short", entry, entry_price, stop, target,
+            exit_i, exit_price, reason, quantity, side * (exit_price - entry_price) * quantity,
+        ))
+    return trades
+
+
+def run_backtest(df, length=10, multiplier=2.0, risk_reward=2.0, sl_lookback=3, quantity=1,
+                 initial_capital=0.0):
+    """
+    Replay the live Supertrend rules over an OHLCV DataFrame (indexed by candle time):
+      - on a signal change: close any open position at the close, then open in
+        the direction of the new signal at the close;
+      - stop loss: lowest low (long) / highest high (short) of the last
+        `sl_lookback` candles, take profit at `risk_reward` x the risk;
+      - otherwise exit at the stop/target price when a candle's low/high crosses it.
+
+    Everything is vectorized except a loop over trades (trades_from_signals),
+    which jumps from entry to exit with NumPy searches instead of visiting every bar.
+    Returns a dict with 'trades' and 'equity' DataFrames and 'summary' stats.
+    """
+    high = df["high"].to_numpy(dtype=np.float64)
+    low = df["low"].to_numpy(dtype=np.float64)
+    close = df["close"].to_numpy(dtype=np.float64)
+    times = df.index
+
+    trades = simulate_trades(high, low, close, length, multiplier, risk_reward, sl_lookback, quantity)
+    trades_df = pd.DataFrame(trades, columns=TRADE_COLUMNS)
+    equity = equity_curve(close, trades_df, initial_capital)
+
+    if not trades_df.empty:
+        trades_df["entry_time"] = times[trades_df["entry_time"].to_numpy()]
+        trades_df["exit_time"] = times[trades_df["exit_time"].to_numpy()]
+
+    equity_df = pd.DataFrame({"close": close, "position": equity[1], "equity": equity[0]}, index=times)
+    return {"trades": trades_df, "equity": equity_df, "summary": summarize(trades_df, equity[0], initial_capital)}
+
+
+def equity_curve(close, trades, initial_capital=0.0):
+    """Mark-to-market equity and position per bar from a trades table (bar-index times)"""
+    n = close.size
+    position = np.zeros(n)
+    exit_fill = np.full(n, np.nan)
+    for side, entry, exit_i, exit_price, quantity in zip(
+            trades["side"], trades["entry_time"], trades["exit_time"], trades["exit_price"], trades["quantity"]):
+        position[entry + 1:exit_i + 1] = (1 if side == "long" else -1) * quantity
+        exit_fill[exit_i] = exit_price
+
+    # Each held bar earns the move from the previous close; the exit bar ends at the fill price
+    mark = close.copy()
+    exited = ~np.isnan(exit_fill) & (position != 0)
+    mark[exited] = exit_fill[exited]
+    pnl = np.zeros(n)
+    pnl[1:] = position[1:] * (mark[1:] - close[:-1])
+    return initial_capital + np.cumsum(pnl), position
+
+
+def summarize(trades, equity, initial_capital=0.0):
+    if trades.empty:
+        return {"trades": 0, "net_pnl": 0.0}
+    pnl = trades["pnl"]
+    drawdown = equity - np.maximum.accumulate(equity)
+    return {
+        "trades": int(len(trades)),
+        "net_pnl": float(pnl.sum()),
+        "win_rate": float((pnl > 0).mean()),
+        "avg_pnl": float(pnl.mean()),
+        "profit_factor": float(pnl[pnl > 0].sum() / -pnl[pnl < 0].sum()) if (pnl < 0).any() else float("inf"),
+        "max_drawdown": float(drawdown.min()),
+        "final_equity": float(equity[-1]) if equity.size else initial_capital,
+        "exit_reasons": trades["exit_reason"].value_counts().to_dict(),
+    }
+
+
+def write_results(result, out_dir):
+    """Write trades.csv, equity.csv and summary.json under out_dir"""
+    os.makedirs(out_dir, exist_ok=True)
+    result["trades"].to_csv(os.path.join(out_dir, "trades.csv"), index=False)
+    result["equity"].to_csv(os.path.join(out_dir, "equity.csv"))
+    with open(os.path.join(out_dir, "summary.json"), "w") as f:
+        json.dump(result["summary"], f, indent=2, default=str)
+
+
+def load_candles(path):
+    """Load an OHLCV CSV (date, open, high, low, close, volume), e.g. saved getCandleData output"""
+    df = pd.read_csv(path)
+    df["date"] = pd.to_datetime(df["date"])
+    return df.set_index("date").sort_index()
+
+
+def load_stored_candles(symbol, interval="ONE_MINUTE", start=None, end=None):
+    """Candles already in the local CandleStore, symbol given as EXCHANGE:TOKEN (e.g. NSE:3045)"""
+    from candle_store import CandleStore
+
+    exchange, symbol_token = symbol.split(":")
+    return CandleStore().read(exchange, symbol_token, interval, start, end)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backtest the Supertrend strategy on historical candles")
+    parser.add_argument("csv", nargs="?", help="OHLCV CSV with date, open, high, low, close, volume columns")
+    parser.add_argument("--store", metavar="EXCHANGE:TOKEN", help="Read candles from the local candle store instead")
+    parser.add_argument("--interval", default="ONE_MINUTE")
+    parser.add_argument("--start", help="First day (YYYY-MM-DD) to read from the store")
+    parser.add_argument("--end", help="Last day (YYYY-MM-DD) to read from the store")
+    parser.add_argument("--length", type=int, default=10)
+    parser.add_argument("--multiplier", type=float, default=2.0)
+    parser.add_argument("--risk-reward", type=float, default=2.0)
+    parser.add_argument("--quantity", type=int, default=1)
+    parser.add_argument("--out", default="backtest_results")
+    args = parser.parse_args()
+
+    if args.store:
+        df = load_stored_candles(args.store, args.interval, args.start, args.end)
+    elif args.csv:
+        df = load_candles(args.csv)
+    else:
+        parser.error("give a CSV file or --store EXCHANGE:TOKEN")
+
+    result = run_backtest(df, args.length, args.multiplier, args.risk_reward,
+                          quantity=args.quantity)
+    write_results(result, args.out)
+    print(f"✅ Backtest done: {result['summary']}")
@@ -0,0 +1,418 @@
+import argparse
+import datetime
+import importlib.util
+import json
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from backtest import supertrend_signals
+from candle_builder import COLUMNS, CandleBuilder
+from supertrend_engine import StreamingSupertrend, supertrend_arrays, supertrend_scan
+
+# Default grid; --bars / --symbols go up to 10M bars and 1000 symbols
+DEFAULT_BARS = [100, 10_000, 1_000_000]
+DEFAULT_SYMBOLS = [1, 10, 100, 1000]
+DEFAULT_VARIANTS = [1, 10, 50]
+WORKLOADS = ("indicator", "aggregator", "strategy", "variants", "scan")
+START = "2025-01-06 09:15"
+
+
+def synthetic_ohlcv(bars, seed=0, start=START, candle_minutes=1):
+    """Random-walk OHLCV candles indexed like the broker's (IST, from 09:15)"""
+    rng = np.random.default_rng(seed)
+    close = 100 + np.cumsum(rng.normal(0, 0.3, bars))
+    open_ = np.empty(bars)
+    open_[0] = close[0]
+    open_[1:] = close[:-1]
+    spread = rng.random((2, bars)) * 0.3
+    index = pd.date_range(start, periods=bars, freq=f"{candle_minutes}min", tz="Asia/Kolkata", name="date")
+    return pd.DataFrame({
+        "open": open_,
+        "high": np.maximum(open_, close) + spread[0],
+        "low": np.minimum(open_, close) - spread[1],
+        "close": close,
+        "volume": rng.integers(100, 10_000, bars).astype(np.float64),
+    }, index=index)
+
+
+def synthetic_ticks(symbols, bars, ticks_per_bar=4, seed=0, start=START):
+    """
+    Interleaved ticks for `symbols` instruments, `ticks_per_bar` per 1-minute
+    candle, in arrival order. Returns (symbol ids, epoch ns, price, cumulative volume).
+    """
+    rng = np.random.default_rng(seed)
+    steps = bars * ticks_per_bar
+    step_ns = 60_000_000_000 // ticks_per_bar
+    times = pd.Timestamp(start, tz="Asia/Kolkata").value + np.arange(steps, dtype=np.int64) * step_ns
+    prices = 100 + np.cumsum(rng.normal(0, 0.1, (steps, symbols)), axis=0)
+    volumes = np.cumsum(rng.integers(1, 100, (steps, symbols)), axis=0)
+    return (np.tile(np.arange(symbols), steps), np.repeat(times, symbols),
+            prices.ravel(), volumes.ravel())
+
+
+def pandas_update(live_df, timestamp, price, volume, candle_minutes=1):
+    """
+    The DataFrame-per-quote candle update the live loop used before
+    CandleBuilder (one-row frame, .at revisions, concat, tail(100)); the baseline.
+    """
+    start = timestamp.floor(f"{candle_minutes}min")
+    if live_df is not None and not live_df.empty and live_df.index[-1] == start:
+        last = live_df.index[-1]
+        live_df.at[last, "high"] = max(live_df.at[last, "high"], price)
+        live_df.at[last, "low"] = min(live_df.at[last, "low"], price)
+        live_df.at[last, "close"] = price
+        live_df.at[last, "volume"] += volume
+        return live_df
+    row = pd.DataFrame([[price, price, price, price, volume]], index=[start], columns=COLUMNS)
+    combined = row if live_df is None or live_df.empty else pd.concat([live_df, row])
+    return combined.sort_index().tail(100)
+
+
+def _measure(run, prepare=None, memory=True, min_seconds=0.2, max_runs=100):
+    """
+    Median wall time of run(prepare()) over enough runs to fill min_seconds,
+    per-call latency percentiles if run returns them (nanoseconds), and in a
+    separate traced run the peak Python/NumPy allocation, setup included.
+    """
+    prepare = prepare or (lambda: None)
+    runs, latencies, total = [], [], 0.0
+    while total < min_seconds and len(runs) < max_runs:
+        state = prepare()
+        start = time.perf_counter()
+        samples = run(state)
+        runs.append(time.perf_counter() - start)
+        total += runs[-1]
+        if samples:
+            latencies.extend(samples)
+    result = {"seconds": float(np.median(runs)), "runs": len(runs)}
+    if latencies:
+        p50, p99 = np.percentile(np.asarray(latencies), [50, 99]) / 1000
+        result.update(p50_us=round(float(p50), 2), p99_us=round(float(p99), 2))
+    if memory:
+        tracemalloc.start()
+        try:
+            run(prepare())
+            result["peak_mb"] = round(tracemalloc.get_traced_memory()[1] / 2 ** 20, 2)
+        finally:
+            tracemalloc.stop()
+    return result
+
+
+def _record(results, workload, engine, items, measured=None, skipped=None, **params):
+    entry = {"workload": workload, "engine": engine, **params, "items": items}
+    if skipped:
+        entry["skipped"] = skipped
+    else:
+        entry["seconds"] = round(measured.pop("seconds"), 6)
+        entry["throughput"] = round(items / entry["seconds"]) if entry["seconds"] else None
+        entry.update(measured)
+    results.append(entry)
+    unit = "bars/s" if workload in ("indicator", "scan") else "ticks/s"
+    label = f"{workload:<10} {engine:<10} " + " ".join(f"{k}={v}" for k, v in params.items())
+    if skipped:
+        print(f"{label:<60} skipped: {skipped}")
+    else:
+        latency = f"   p50 {entry['p50_us']:.1f}us p99 {entry['p99_us']:.1f}us" if "p50_us" in entry else ""
+        memory = f"   peak {entry['peak_mb']:.1f}MB" if "peak_mb" in entry else ""
+        print(f"{label:<60} {entry['throughput']:>12,} {unit}{latency}{memory}")
+
+
+def bench_indicator(results, bars, engines, memory, legacy_max):
+    """Supertrend over a whole candle history: pandas_ta vs the array and streaming engines"""
+    df = synthetic_ohlcv(bars)
+    high, low, close = (df[c].to_numpy() for c in ("high", "low", "close"))
+
+    for engine in engines:
+        if engine == "pandas_ta":
+            if importlib.util.find_spec("pandas_ta") is None:
+                _record(results, "indicator", engine, bars, skipped="pandas_ta is not installed", bars=bars)
+                continue
+            if bars > legacy_max:
+                _record(results, "indicator", engine, bars, skipped=f"over --legacy-max {legacy_max}", bars=bars)
+                continue
+            import Live_trading_with_Supertrend_ultra_final_lite as lt
+            run = lambda _: lt.calculate_supertrend(df) and None
+        elif engine == "arrays":
+            run = lambda _: supertrend_signals(high, low, close) and None
+        elif engine == "streaming":
+            run = lambda _: StreamingSupertrend().seed(high, low, close) and None
+        else:
+            continue
+        _record(results, "indicator", engine, bars, _measure(run, memory=memory), bars=bars)
+
+
+def bench_aggregator(results, symbols, bars, ticks_per_bar, engines, memory, legacy_max):
+    """Folding interleaved ticks into 1-minute candles, per-tick latency"""
+    ids, times, prices, volumes = synthetic_ticks(symbols, bars, ticks_per_bar)
+    ticks = len(ids)
+    params = {"symbols": symbols, "bars": bars, "ticks_per_bar": ticks_per_bar}
+
+    for engine in engines:
+        if engine == "pandas":
+            if ticks > legacy_max:
+                _record(results, "aggregator", engine, ticks, skipped=f"over --legacy-max {legacy_max}", **params)
+                continue
+            stamps = pd.DatetimeIndex(times).tz_localize("UTC").tz_convert("Asia/Kolkata")
+            prepare = lambda: [None] * symbols
+
+            def run(frames):
+                clock, latencies = time.perf_counter_ns, []
+                for s, ts, price in zip(ids.tolist(), stamps, prices.tolist()):
+                    t = clock()
+                    frames[s] = pandas_update(frames[s], ts, price, 1.0)
+                    latencies.append(clock() - t)
+                return latencies
+        elif engine == "builder":
+            prepare = lambda: [CandleBuilder(capacity=100) for _ in range(symbols)]
+
+            def run(builders):
+                clock, latencies = time.perf_counter_ns, []
+                for s, ts, price, volume in zip(ids.tolist(), times.tolist(), prices.tolist(), volumes.tolist()):
+                    t = clock()
+                    builders[s].update(ts, price, volume)
+                    latencies.append(clock() - t)
+                return latencies
+        else:
+            continue
+        _record(results, "aggregator", engine, ticks, _measure(run, prepare, memory), **params)
+
+
+def bench_strategy(results, symbols, bars, ticks_per_bar, engines, memory, legacy_max, history=100):
+    """
+    The whole per-tick path (candles, Supertrend, decision; orders are no-ops)
+    for `symbols` warmed-up strategies.
+    """
+    ids, times, prices, volumes = synthetic_ticks(symbols, bars, ticks_per_bar)
+    ticks = len(ids)
+    params = {"symbols": symbols, "bars": bars, "ticks_per_bar": ticks_per_bar}
+    warm_up = synthetic_ohlcv(history, start=str(pd.Timestamp(START) - pd.Timedelta(minutes=history)))
+
+    for engine in engines:
+        if engine == "pandas_ta":
+            # Before the streaming engine: DataFrame update plus a full calculate_supertrend per quote
+            if importlib.util.find_spec("pandas_ta") is None:
+                _record(results, "strategy", engine, ticks, skipped="pandas_ta is not installed", **params)
+                continue
+            if ticks > legacy_max:
+                _record(results, "strategy", engine, ticks, skipped=f"over --legacy-max {legacy_max}", **params)
+                continue
+            import Live_trading_with_Supertrend_ultra_final_lite as lt
+            stamps = pd.DatetimeIndex(times).tz_localize("UTC").tz_convert("Asia/Kolkata")
+            prepare = lambda: [warm_up.copy() for _ in range(symbols)]
+
+            def run(frames):
+                clock, latencies = time.perf_counter_ns, []
+                for s, ts, price in zip(ids.tolist(), stamps, prices.tolist()):
+                    t = clock()
+                    frames[s] = pandas_update(frames[s], ts, price, 1.0)
+                    signals = lt.calculate_supertrend(frames[s])
+                    signals["signal_change"].iloc[-1]
+                    latencies.append(clock() - t)
+                return latencies
+        elif engine == "streaming":
+            from trading_engine import RUNNING, SymbolStrategy
+
+            class _Strategy(SymbolStrategy):
+                def submit_order(self, key, side, quantity, **order):
+                    return None
+
+            def prepare():
+                strategies = []
+                for s in range(symbols):
+                    strategy = _Strategy(f"SYM{s}", str(s), "NSE", 1, history=history)
+                    strategy.candles.load(warm_up)
+                    strategy.indicators.seed(strategy.candles.view())
+                    strategy.state = RUNNING
+                    strategies.append(strategy)
+                return strategies
+
+            def run(strategies):
+                clock, latencies = time.perf_counter_ns, []
+                for s, ts, price, volume in zip(ids.tolist(), times.tolist(), prices.tolist(), volumes.tolist()):
+                    t = clock()
+                    strategies[s].on_price(ts, price, volume)
+                    latencies.append(clock() - t)
+                return latencies
+        else:
+            continue
+        _record(results, "strategy", engine, ticks, _measure(run, prepare, memory), **params)
+
+
+def bench_variants(results, variants, bars, ticks_per_bar, engines, memory, history=100):
+    """
+    `variants` Supertrend strategies on one symbol (multipliers 1.0, 1.1, ...,
+    all on ATR(10)), per tick: each on its own candles and indicators, or all
+    on one CandleBuilder and IndicatorGraph as the engine runs them.
+    """
+    from indicators import IndicatorGraph
+    from strategies import SupertrendStrategy
+    from trading_engine import RUNNING, SymbolStrategy
+
+    class _Strategy(SymbolStrategy):
+        def submit_order(self, key, side, quantity, **order):
+            return None
+
+    _, times, prices, volumes = synthetic_ticks(1, bars, ticks_per_bar)
+    ticks = len(times)
+    params = {"variants": variants, "bars": bars, "ticks_per_bar": ticks_per_bar}
+    warm_up = synthetic_ohlcv(history, start=str(pd.Timestamp(START) - pd.Timedelta(minutes=history)))
+    rules = [SupertrendStrategy(10, round(1.0 + 0.1 * v, 1)) for v in range(variants)]
+
+    def start(strategies):
+        for strategy in strategies:
+            strategy.state = RUNNING
+        return strategies
+
+    for engine in engines:
+        if engine == "separate":
+            def prepare():
+                strategies = []
+                for rule in rules:
+                    strategy = _Strategy("SYM", "0", "NSE", 1, history=history, strategy=rule)
+                    strategy.candles.load(warm_up)
+                    strategy.indicators.seed(strategy.candles.view())
+                    strategies.append(strategy)
+                return start(strategies)
+
+            def run(strategies):
+                clock, latencies = time.perf_counter_ns, []
+                for ts, price, volume in zip(times.tolist(), prices.tolist(), volumes.tolist()):
+                    t = clock()
+                    for strategy in strategies:
+                        strategy.on_price(ts, price, volume)
+                    latencies.append(clock() - t)
+                return latencies
+        elif engine == "shared":
+            def prepare():
+                candles = CandleBuilder(capacity=history)
+                graph = IndicatorGraph(candles)
+                strategies = [_Strategy("SYM", "0", "NSE", 1, history=history, strategy=rule, candles=candles,
+                                        indicators=graph) for rule in rules]
+                candles.load(warm_up)
+                graph.seed(candles.view())
+                return start(strategies)
+
+            def run(strategies):
+                clock, perf, latencies = time.perf_counter_ns, time.perf_counter, []
+                candles, graph = strategies[0].candles, strategies[0].indicators
+                for ts, price, volume in zip(times.tolist(), prices.tolist(), volumes.tolist()):
+                    t = clock()
+                    received = perf()
+                    new_bar = candles.update(ts, price, volume)
+                    changed = graph.update(new_bar) if new_bar is not None else None
+                    for strategy in strategies:
+                        strategy.on_candle(new_bar, received, changed)
+                    latencies.append(clock() - t)
+                return latencies
+        else:
+            continue
+        _record(results, "variants", engine, ticks, _measure(run, prepare, memory), **params)
+
+
+def bench_scan(results, symbols, bars, engines, memory):
+    """Newest-bar Supertrend signal for every symbol from its last `bars` candles: one call per symbol vs one matrix"""
+    frames = [synthetic_ohlcv(bars, seed=s) for s in range(symbols)]
+    high, low, close = (np.stack([df[c].to_numpy() for df in frames]) for c in ("high", "low", "close"))
+    params = {"symbols": symbols, "bars": bars}
+
+    for engine in engines:
+        if engine == "loop":
+            run = lambda _: [supertrend_arrays(high[s], low[s], close[s]) for s in range(symbols)] and None
+        elif engine == "matrix":
+            run = lambda _: supertrend_scan(high, low, close) and None
+        else:
+            continue
+        _record(results, "scan", engine, symbols * bars, _measure(run, memory=memory), **params)
+
+
+def compare(previous, results):
+    """Throughput change against an earlier results file, matched on workload, engine and sizes"""
+    def key(entry):
+        return tuple((k, v) for k, v in entry.items()
+                     if k in ("workload", "engine", "bars", "symbols", "variants", "ticks_per_bar"))
+
+    before = {key(entry): entry for entry in previous.get("results", []) if entry.get("throughput")}
+    print(f"\nAgainst {previous.get('commit') or 'previous run'}:")
+    for entry in results:
+        old = before.get(key(entry))
+        if old is None or not entry.get("throughput"):
+            continue
+        change = (entry["throughput"] / old["throughput"] - 1) * 100
+        label = " ".join(str(v) for _, v in key(entry))
+        print(f"  {label:<50} {old['throughput']:>12,} -> {entry['throughput']:>12,}  ({change:+.1f}%)")
+
+
+def _commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the indicator, candle aggregator and strategy paths "
+                                                 "on synthetic data (no network)")
+    parser.add_argument("--workloads", nargs="+", choices=WORKLOADS, default=list(WORKLOADS))
+    parser.add_argument("--bars", type=int, nargs="+", default=DEFAULT_BARS,
+                        help="History sizes for the indicator workload")
+    parser.add_argument("--symbols", type=int, nargs="+", default=DEFAULT_SYMBOLS,
+                        help="Symbol counts for the per-tick and scan workloads")
+    parser.add_argument("--variants", type=int, nargs="+", default=DEFAULT_VARIANTS,
+                        help="Strategy variants on one symbol for the variants workload")
+    parser.add_argument("--tick-bars", type=int, default=100,
+                        help="Candles per symbol in the per-tick and scan workloads")
+    parser.add_argument("--ticks-per-bar", type=int, default=4)
+    parser.add_argument("--legacy-max", type=int, default=20_000,
+                        help="Skip the pandas/pandas_ta paths above this many bars or ticks")
+    parser.add_argument("--no-memory", action="store_true", help="Skip the traced run that measures peak memory")
+    parser.add_argument("--json", dest="json_path", help="Write the results to this JSON file")
+    parser.add_argument("--compare", help="An earlier --json file to report throughput changes against")
+    args = parser.parse_args()
+
+    memory = not args.no_memory
+    results = []
+    if "indicator" in args.workloads:
+        for bars in args.bars:
+            bench_indicator(results, bars, ("pandas_ta", "arrays", "streaming"), memory, args.legacy_max)
+    if "aggregator" in args.workloads:
+        for symbols in args.symbols:
+            bench_aggregator(results, symbols, args.tick_bars, args.ticks_per_bar, ("pandas", "builder"),
+                             memory, args.legacy_max)
+    if "strategy" in args.workloads:
+        for symbols in args.symbols:
+            bench_strategy(results, symbols, args.tick_bars, args.ticks_per_bar, ("pandas_ta", "streaming"),
+                           memory, args.legacy_max)
+    if "variants" in args.workloads:
+        for variants in args.variants:
+            bench_variants(results, variants, args.tick_bars, args.ticks_per_bar, ("separate", "shared"), memory)
+    if "scan" in args.workloads:
+        for symbols in args.symbols:
+            bench_scan(results, symbols, args.tick_bars, ("loop", "matrix"), memory)
+
+    report = {
+        "commit": _commit(),
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "args": vars(args),
+        "results": results,
+    }
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+# What the web entry point and the trading stack pull in, cheapest first
+DEFAULT_MODULES = [
+    "flask",
+    "main",
+    "instrument_index",
+    "numpy",
+    "pandas",
+    "Live_trading_with_Supertrend_ultra_final_lite",
+    "trading_engine",
+    "pyotp",
+    "pandas_ta",
+]
+
+
+def import_cost(module, runs=5):
+    """
+    Import `module` in `runs` fresh interpreters. Returns the median wall
+    time of the import statement in ms and the packages that took the most
+    of it (summed -X importtime self times), or None if it fails to import.
+    """
+    here = os.path.dirname(os.path.abspath(__file__))
+    code = ("import time; start = time.perf_counter(); import {}; "
+            "print((time.perf_counter() - start) * 1000)").format(module)
+    totals = []
+    packages = {}
+    for _ in range(runs):
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", code],
+            cwd=here, capture_output=True, text=True,
+            env=dict(os.environ, PYTHONDONTWRITEBYTECODE="1"),
+        )
+        if result.returncode != 0:
+            return None
+        totals.append(float(result.stdout.split()[-1]))
+
+        # Self times only: the nesting in importtime output is unreliable once threads import too
+        run_packages = {}
+        for line in result.stderr.splitlines():
+            if not line.startswith("import time:") or "[us]" in line:
+                continue
+            self_us, _, name = line[len("import time:"):].split("|")
+            package = name.strip().split(".")[0]
+            run_packages[package] = run_packages.get(package, 0) + int(self_us) / 1000
+        for package, ms in run_packages.items():
+            packages.setdefault(package, []).append(ms)
+
+    heaviest = sorted(((statistics.median(times), name) for name, times in packages.items()), reverse=True)
+    return {
+        "module": module,
+        "median_ms": round(statistics.median(totals), 1),
+        "min_ms": round(min(totals), 1),
+        "heaviest": [{"package": name, "ms": round(ms, 1)} for ms, name in heaviest[:5]],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure cold import time per module in fresh interpreters")
+    parser.add_argument("modules", nargs="*", default=DEFAULT_MODULES)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--json", dest="json_path", help="Also write the results to this JSON file")
+    args = parser.parse_args()
+
+    results = []
+    for module in args.modules:
+        cost = import_cost(module, args.runs)
+        if cost is None:
+            print(f"⚠ {module}: failed to import, skipped")
+            continue
+        results.append(cost)
+        heaviest = ", ".join(f"{item['package']} {item['ms']:.0f}ms" for item in cost["heaviest"][:3])
+        print(f"{module:<50} {cost['median_ms']:>8.1f} ms   ({heaviest})")
+
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump({"python": sys.version.split()[0], "runs": args.runs, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
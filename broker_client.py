@@ -0,0 +1,143 @@
+import logging
+import os
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from metrics import LatencyHistogram
+
+log = logging.getLogger(__name__)
+
+DEFAULT_BASE_URL = "https://apiconnect.angelone.in"
+
+# Angel One REST endpoints
+LOGIN_PATH = "/rest/auth/angelbroking/user/v1/loginByPassword"
+LOGOUT_PATH = "/rest/secure/angelbroking/user/v1/logout"
+GENERATE_TOKENS_PATH = "/rest/auth/angelbroking/jwt/v1/generateTokens"
+CANDLE_DATA_PATH = "/rest/secure/angelbroking/historical/v1/getCandleData"
+QUOTE_PATH = "/rest/secure/angelbroking/market/v1/quote/"
+PLACE_ORDER_PATH = "/rest/secure/angelbroking/order/v1/placeOrder"
+ORDER_BOOK_PATH = "/rest/secure/angelbroking/order/v1/getOrderBook"
+POSITION_PATH = "/rest/secure/angelbroking/order/v1/getPosition"
+MODIFY_ORDER_PATH = "/rest/secure/angelbroking/order/v1/modifyOrder"
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class BrokerClient:
+    """
+    Shared HTTP client for the Angel One REST API.
+
+    Keeps one requests.Session with a keep-alive connection pool so calls reuse
+    TCP+TLS connections, applies (connect, read) timeouts, retries with
+    exponential backoff and records per-endpoint latency histograms.
+    Point base_url (or ANGELONE_BASE_URL) at a local stub server for testing.
+    """
+
+    def __init__(self, base_url=None, pool_size=10, connect_timeout=3.05, read_timeout=10,
+                 max_retries=3, backoff_factor=0.25):
+        self.base_url = (base_url or os.getenv("ANGELONE_BASE_URL") or DEFAULT_BASE_URL).rstrip("/")
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.pool_size = pool_size
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        self.latency = {}
+        self.retries = {}
+        self.errors = {}
+        self._lock = threading.Lock()
+
+    def url(self, path):
+        return self.base_url + path
+
+    def warm_up(self, connections=2):
+        """Open `connections` keep-alive connections ahead of time so the first order doesn't pay for the handshake"""
+        connections = max(1, min(connections, self.pool_size))
+
+        def _touch():
+            try:
+                self.session.head(self.base_url, timeout=self.timeout)
+            except requests.RequestException as e:
+                log.warning("⚠ Connection warm-up failed: %s", e)
+
+        threads = [threading.Thread(target=_touch, daemon=True) for _ in range(connections)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def post(self, path, payload=None, headers=None, idempotent=True):
+        """
+        POST json to an API path and return the requests.Response.
+
+        Idempotent calls (quotes, candles, login) are retried on connection
+        errors, timeouts and 429/5xx responses. Non-idempotent calls (orders)
+        are only retried when the connection could not be opened, so a
+        request the broker may have received is never sent twice.
+        """
+        return self._request("POST", path, payload, headers, idempotent)
+
+    def get(self, path, headers=None):
+        """GET an API path (order book, positions); retried like an idempotent POST"""
+        return self._request("GET", path, None, headers, True)
+
+    def _request(self, method, path, payload, headers, idempotent):
+        attempt = 0
+        while True:
+            error = None
+            start = time.perf_counter()
+            try:
+                response = self.session.request(method, self.url(path), json=payload, headers=headers,
+                                                timeout=self.timeout)
+            except requests.exceptions.ConnectTimeout as e:
+                error, retryable = e, True
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                error, retryable = e, idempotent
+            else:
+                retryable = idempotent and response.status_code in RETRY_STATUSES
+            finally:
+                self._observe(path, (time.perf_counter() - start) * 1000)
+
+            if not retryable or attempt >= self.max_retries:
+                if error is not None:
+                    self._count(self.errors, path)
+                    raise error
+                return response
+
+            if error is None:
+                response.close()
+            attempt += 1
+            self._count(self.retries, path)
+            time.sleep(self.backoff_factor * (2 ** (attempt - 1)))
+
+    def _observe(self, path, elapsed_ms):
+        histogram = self.latency.get(path)
+        if histogram is None:
+            with self._lock:
+                histogram = self.latency.setdefault(path, LatencyHistogram())
+        histogram.observe(elapsed_ms)
+
+    def _count(self, counter, path):
+        with self._lock:
+            counter[path] = counter.get(path, 0) + 1
+
+    def stats(self):
+        """Per-endpoint latency, retry and error numbers"""
+        return {
+            path: {
+                "latency": histogram.snapshot(),
+                "retries": self.retries.get(path, 0),
+                "errors": self.errors.get(path, 0),
+            }
+            for path, histogram in list(self.latency.items())
+        }
+
+    def close(self):
+        self.session.close()
@@ -0,0 +1,587 @@
+import argparse
+import base64
+import json
+import logging
+import os
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pandas as pd
+
+from broker_client import (LOGIN_PATH, LOGOUT_PATH, GENERATE_TOKENS_PATH, CANDLE_DATA_PATH, QUOTE_PATH, PLACE_ORDER_PATH,
+                           ORDER_BOOK_PATH, POSITION_PATH, MODIFY_ORDER_PATH)
+from candle_store import CandleStore
+
+log = logging.getLogger(__name__)
+
+NS_PER_MINUTE = 60 * 1_000_000_000
+IST_OFFSET_NS = 330 * NS_PER_MINUTE
+MARKET_OPEN_MINUTE = 9 * 60 + 15   # Day open/high/low/volume count from 09:15 IST
+SESSION_MINUTES = 375              # 09:15 to 15:30; the previous close is the close of the 15:29 candle
+TICK_SIZE = 0.05
+FEED_TIME_FORMAT = "%d-%b-%Y %H:%M:%S"  # exchFeedTime as the quote API sends it
+
+SECURE_PATHS = (LOGOUT_PATH, CANDLE_DATA_PATH, QUOTE_PATH, PLACE_ORDER_PATH, ORDER_BOOK_PATH, POSITION_PATH,
+                MODIFY_ORDER_PATH)
+ORDER_PATHS = (PLACE_ORDER_PATH, MODIFY_ORDER_PATH)
+
+
+def _hash_uniform(seed, minutes):
+    """Deterministic uniform [0, 1) numbers per (seed, minute) (splitmix64), so any minute can be computed on its own"""
+    with np.errstate(over="ignore"):
+        x = minutes.astype(np.uint64) * np.uint64(0x9E3779B97F4A7C15) + np.uint64(seed)
+        x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        x = x ^ (x >> np.uint64(31))
+    return (x >> np.uint64(11)).astype(np.float64) / float(1 << 53)
+
+
+class SyntheticPath:
+    """
+    Endless 1-minute candles for one token, a pure function of time: a few
+    token-specific swings (minutes to days long, so Supertrend flips) plus
+    per-minute noise. Needs no state, so history and the live price agree.
+    """
+
+    def __init__(self, symbol_token):
+        self.seed = int.from_bytes(str(symbol_token).encode()[:8].ljust(8, b"\0"), "little") ^ 0x5DEECE66D
+        rng = np.random.default_rng(self.seed & 0xFFFFFFFF)
+        self.base = float(rng.uniform(50, 3000))
+        self.periods = rng.uniform([20, 180, 1500], [60, 600, 5000])   # minutes
+        self.amplitudes = rng.uniform([0.002, 0.006, 0.02], [0.006, 0.02, 0.05])
+        self.phases = rng.uniform(0, 2 * np.pi, 3)
+        self.volume = float(rng.uniform(1_000, 50_000))
+
+    def _level(self, minutes):
+        m = minutes.astype(np.float64)[:, None]
+        swing = (self.amplitudes * np.sin(2 * np.pi * m / self.periods + self.phases)).sum(axis=1)
+        noise = (_hash_uniform(self.seed, minutes) - 0.5) * 0.004
+        return self.base * np.exp(swing + noise)
+
+    def candles(self, first_minute, last_minute):
+        """Minute numbers (epoch minutes) and their (open, high, low, close, volume) rows, first..last inclusive"""
+        minutes = np.arange(first_minute, last_minute + 1, dtype=np.int64)
+        levels = self._level(np.arange(first_minute, last_minute + 2, dtype=np.int64))
+        open_, close = levels[:-1], levels[1:]
+        upper_wick = _hash_uniform(self.seed + 1, minutes) * 0.001 * open_
+        lower_wick = _hash_uniform(self.seed + 3, minutes) * 0.001 * open_
+        rows = np.column_stack([
+            open_,
+            np.maximum(open_, close) + upper_wick,
+            np.minimum(open_, close) - lower_wick,
+            close,
+            np.floor(self.volume * (0.5 + _hash_uniform(self.seed + 2, minutes))),
+        ])
+        return minutes, rows
+
+
+class RecordedPath:
+    """
+    Stored 1-minute candles replayed on the simulator's clock, shifted by
+    `offset_minutes` (whole days, so 09:15 stays 09:15). Before the recording
+    the first open holds, after it the last close.
+    """
+
+    def __init__(self, records, offset_minutes):
+        self.minutes = records["time"] // NS_PER_MINUTE + offset_minutes
+        self.rows = np.column_stack([records[c] for c in ("open", "high", "low", "close", "volume")])
+
+    def candles(self, first_minute, last_minute):
+        lo, hi = np.searchsorted(self.minutes, [first_minute, last_minute + 1])
+        return self.minutes[lo:hi], self.rows[lo:hi]
+
+    def row_at(self, minute):
+        i = np.searchsorted(self.minutes, minute, side="right") - 1
+        if i < 0:
+            first = self.rows[0]
+            return np.array([first[0]] * 4 + [0.0]), False
+        return self.rows[i], self.minutes[i] == minute
+
+
+class BrokerSimulator:
+    """
+    Local stand-in for the Angel One REST API: login, logout,
+    generateTokens, quote, getCandleData, placeOrder, modifyOrder,
+    getOrderBook and getPosition, on a localhost HTTP server. Session JWTs
+    expire `token_ttl` real seconds after they are issued.
+
+    Time runs on a simulated exchange clock that starts at `start` (default
+    now) and advances `speed` times faster than real time. Prices come from a
+    SyntheticPath per token, or are replayed from the candle store when
+    `replay_day` is given (that day's candles are served as if they were
+    today's). Quotes carry exchFeedTime in simulated time and candles are
+    only served up to the simulated now.
+
+    MARKET orders fill at the current price with a random adverse slippage
+    averaging `slippage_bps`. STOPLOSS_MARKET orders wait as "trigger
+    pending" until a minute's low (SELL) or high (BUY) since they were placed
+    crosses the trigger, checked whenever a request comes in, and then fill
+    at the trigger with slippage; modifyOrder can move the trigger or make
+    them MARKET. `reject_rate` of new orders are rejected, and for
+    `drop_rate` of them the order is taken but the connection is dropped
+    before the answer (to exercise order-book reconciliation). Each
+    response is held back `latency_ms` (orders `order_latency_ms`) of real
+    time, +/- 50% jitter. There is no WebSocket feed; use the polling mode.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, speed=1.0, start=None, replay_day=None, store=None,
+                 slippage_bps=2.0, latency_ms=5.0, order_latency_ms=20.0, reject_rate=0.0, drop_rate=0.0,
+                 token_ttl=86400.0, seed=None):
+        self.speed = float(speed)
+        start = pd.Timestamp(start or pd.Timestamp.now(tz="Asia/Kolkata"))
+        if start.tzinfo is None:
+            start = start.tz_localize("Asia/Kolkata")
+        self.start_ns = start.value
+        self.replay_day = pd.Timestamp(replay_day).date() if replay_day else None
+        self.store = store or CandleStore()
+        self.slippage_bps = slippage_bps
+        self.latency_ms = latency_ms
+        self.order_latency_ms = order_latency_ms
+        self.reject_rate = reject_rate
+        self.drop_rate = drop_rate
+        self.token_ttl = token_ttl
+        self._random = random.Random(seed)
+
+        self._paths = {}
+        self._days = {}  # (exchange, token) -> [day start, next minute, open, high, low, volume, previous close]
+        self._tokens = {}          # JWT -> expiry (epoch seconds)
+        self._refresh_tokens = {}  # refresh token -> the JWT it renews
+        self.orders = []
+        self._stops = {}  # order id -> (order record, minute placed) while a stop is trigger pending
+        self._lock = threading.Lock()
+        self._wall_start_ns = None
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        """Serve on a background thread and start the clock; returns the base URL"""
+        self._wall_start_ns = time.monotonic_ns()
+        self._thread = threading.Thread(target=self._server.serve_forever, name="broker-simulator", daemon=True)
+        self._thread.start()
+        log.info("🧪 Broker simulator on %s at %gx from %s", self.base_url, self.speed,
+                 pd.Timestamp(self.start_ns, tz="UTC").tz_convert("Asia/Kolkata"))
+        return self.base_url
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def now_ns(self):
+        """Current simulated time, epoch ns"""
+        if self._wall_start_ns is None:
+            return self.start_ns
+        return self.start_ns + int((time.monotonic_ns() - self._wall_start_ns) * self.speed)
+
+    def path(self, exchange, symbol_token):
+        key = (exchange, str(symbol_token))
+        path = self._paths.get(key)
+        if path is None:
+            with self._lock:
+                path = self._paths.get(key)
+                if path is None:
+                    path = self._load_path(*key)
+                    self._paths[key] = path
+        return path
+
+    def _load_path(self, exchange, symbol_token):
+        if self.replay_day is not None:
+            records = self.store.load_day(exchange, symbol_token, "ONE_MINUTE", self.replay_day)
+            if records is not None and len(records):
+                today = pd.Timestamp(self.start_ns + IST_OFFSET_NS).date()
+                offset = (today - self.replay_day).days * 1440
+                return RecordedPath(np.array(records), offset)
+            log.warning("⚠ No stored candles for %s:%s on %s, using a synthetic path",
+                        exchange, symbol_token, self.replay_day)
+        return SyntheticPath(symbol_token)
+
+    # Prices
+
+    def price(self, path, now_ns):
+        """Last traded price: within a minute it moves open -> nearer extreme -> other extreme -> close"""
+        minute, into = divmod(now_ns, NS_PER_MINUTE)
+        if isinstance(path, RecordedPath):
+            row, live = path.row_at(minute)
+            if not live:
+                return float(row[3])
+        else:
+            row = path.candles(minute, minute)[1][0]
+        open_, high, low, close = row[:4]
+        first, second = (low, high) if close >= open_ else (high, low)
+        points = (open_, first, second, close)
+        x = into / NS_PER_MINUTE * 3
+        i = min(int(x), 2)
+        return float(points[i] + (points[i + 1] - points[i]) * (x - i))
+
+    def _day(self, key, path, day_start, minute):
+        """Open, high, low and volume of the day's completed minutes, extended by only the minutes since the last call"""
+        with self._lock:
+            day = self._days.get(key)
+            if day is None or day[0] != day_start or day[1] > minute:
+                _, previous = path.candles(day_start - 1440, day_start - 1440 + SESSION_MINUTES - 1)
+                day = [day_start, day_start, None, -np.inf, np.inf, 0.0,
+                       float(previous[-1, 3]) if len(previous) else None]
+            if day[1] < minute:
+                _, rows = path.candles(day[1], minute - 1)
+                if len(rows):
+                    day[2] = float(rows[0, 0]) if day[2] is None else day[2]
+                    day[3] = max(day[3], float(rows[:, 1].max()))
+                    day[4] = min(day[4], float(rows[:, 2].min()))
+                    day[5] += float(rows[:, 4].sum())
+                day[1] = minute
+            self._days[key] = day
+            return list(day[2:])
+
+    def quote(self, exchange, symbol_token, now_ns):
+        key = (exchange, str(symbol_token))
+        path = self.path(*key)
+        ltp = self.price(path, now_ns)
+        minute = now_ns // NS_PER_MINUTE
+        day_start = (now_ns + IST_OFFSET_NS) // (1440 * NS_PER_MINUTE) * 1440 - 330 + MARKET_OPEN_MINUTE
+        open_, high, low, volume, prev_close = self._day(key, path, day_start, max(minute, day_start))
+        current = path.candles(minute, minute)[1]
+        if len(current) and minute >= day_start:
+            volume += current[0, 4] * (now_ns % NS_PER_MINUTE) / NS_PER_MINUTE
+        prev_close = prev_close or ltp
+        feed_time = pd.Timestamp(now_ns + IST_OFFSET_NS).strftime(FEED_TIME_FORMAT)
+        return {
+            "exchange": exchange,
+            "tradingSymbol": str(symbol_token),
+            "symbolToken": str(symbol_token),
+            "ltp": round(ltp, 2),
+            "open": round(open_ if open_ is not None else ltp, 2),
+            "high": round(max(high, ltp), 2),
+            "low": round(min(low, ltp), 2),
+            "close": round(prev_close, 2),
+            "netChange": round(ltp - prev_close, 2),
+            "percentChange": round((ltp - prev_close) / prev_close * 100, 2) if prev_close else 0.0,
+            "tradeVolume": int(volume),
+            "exchFeedTime": feed_time,
+            "exchTradeTime": feed_time,
+        }
+
+    def candles(self, exchange, symbol_token, interval, from_date, to_date, now_ns):
+        """Completed candles in [from, to] up to the simulated now, in the getCandleData row format"""
+        minutes = {"ONE_MINUTE": 1, "THREE_MINUTE": 3, "FIVE_MINUTE": 5, "TEN_MINUTE": 10,
+                   "FIFTEEN_MINUTE": 15, "THIRTY_MINUTE": 30, "ONE_HOUR": 60}.get(interval)
+        if minutes is None:
+            raise ValueError(f"Unsupported interval {interval}")
+        first = pd.Timestamp(from_date, tz="Asia/Kolkata").value // NS_PER_MINUTE
+        last = min(pd.Timestamp(to_date, tz="Asia/Kolkata").value // NS_PER_MINUTE, now_ns // NS_PER_MINUTE - 1)
+        if last < first:
+            return []
+        times, rows = self.path(exchange, symbol_token).candles(first, last)
+        if minutes > 1:
+            from candle_builder import resample_arrays
+            resampled = resample_arrays(times * NS_PER_MINUTE, *rows.T, minutes)
+            times, rows = resampled[0] // NS_PER_MINUTE, np.column_stack(resampled[1:])
+            # The last bucket is only complete if it ends by now
+            complete = times + minutes <= now_ns // NS_PER_MINUTE
+            times, rows = times[complete], rows[complete]
+        stamps = pd.DatetimeIndex(times * NS_PER_MINUTE, tz="UTC").tz_convert("Asia/Kolkata")
+        return [
+            [stamp.isoformat(), round(o, 2), round(h, 2), round(l, 2), round(c, 2), int(v)]
+            for stamp, (o, h, l, c, v) in zip(stamps, rows.tolist())
+        ]
+
+    def place_order(self, order, now_ns):
+        required = ("exchange", "symboltoken", "transactiontype", "quantity")
+        missing = [field for field in required if not order.get(field)]
+        if missing:
+            return {"status": False, "message": f"Missing {', '.join(missing)}", "errorcode": "AB1008", "data": None}
+        order_type = order.get("ordertype", "MARKET")
+        if order_type not in ("MARKET", "STOPLOSS_MARKET"):
+            return {"status": False, "message": "Only MARKET and STOPLOSS_MARKET orders are simulated",
+                    "errorcode": "AB1009", "data": None}
+        if order_type == "STOPLOSS_MARKET" and not order.get("triggerprice"):
+            return {"status": False, "message": "Missing triggerprice", "errorcode": "AB1008", "data": None}
+
+        order_id = uuid.uuid4().hex[:15]
+        quantity = int(order["quantity"])
+        record = {
+            "variety": order.get("variety", "NORMAL"),
+            "ordertype": order_type,
+            "producttype": order.get("producttype", "INTRADAY"),
+            "duration": order.get("duration", "DAY"),
+            "orderid": order_id,
+            "uniqueorderid": order_id,
+            "ordertag": order.get("ordertag", ""),
+            "tradingsymbol": order.get("tradingsymbol"),
+            "symboltoken": str(order["symboltoken"]),
+            "exchange": order["exchange"],
+            "transactiontype": order["transactiontype"],
+            "quantity": str(quantity),
+            "updatetime": pd.Timestamp(now_ns + IST_OFFSET_NS).strftime(FEED_TIME_FORMAT),
+        }
+        ltp = self.price(self.path(order["exchange"], order["symboltoken"]), now_ns)
+        side = 1 if order["transactiontype"] == "BUY" else -1
+        if self._random.random() < self.reject_rate:
+            self._reject(record, "Simulated rejection")
+        elif order_type == "MARKET":
+            self._fill(record, ltp, now_ns)
+        elif (float(order["triggerprice"]) - ltp) * side <= 0:
+            self._reject(record, "Trigger price is already through the last traded price")
+        else:
+            record.update(status="trigger pending", orderstatus="trigger pending", text="",
+                          triggerprice=float(order["triggerprice"]), filledshares="0",
+                          unfilledshares=str(quantity), averageprice=0)
+        with self._lock:
+            self.orders.append(record)
+            if record["status"] == "trigger pending":
+                self._stops[order_id] = (record, now_ns // NS_PER_MINUTE)
+        return {"status": True, "message": "SUCCESS", "errorcode": "",
+                "data": {"script": order.get("tradingsymbol"), "orderid": order_id, "uniqueorderid": order_id}}
+
+    def modify_order(self, change, now_ns):
+        """Move a pending stop's trigger, or make it a MARKET order that fills at once"""
+        with self._lock:
+            entry = self._stops.get(change.get("orderid"))
+        if entry is None:
+            return {"status": False, "message": "Order is not open for modification", "errorcode": "AB4008",
+                    "data": None}
+        record = entry[0]
+        order_type = change.get("ordertype", record["ordertype"])
+        if order_type == "MARKET":
+            with self._lock:
+                self._stops.pop(record["orderid"], None)
+            record["ordertype"] = "MARKET"
+            self._fill(record, self.price(self.path(record["exchange"], record["symboltoken"]), now_ns), now_ns)
+        elif change.get("triggerprice"):
+            record["triggerprice"] = float(change["triggerprice"])
+            record["updatetime"] = pd.Timestamp(now_ns + IST_OFFSET_NS).strftime(FEED_TIME_FORMAT)
+        return {"status": True, "message": "SUCCESS", "errorcode": "",
+                "data": {"orderid": record["orderid"], "uniqueorderid": record["orderid"]}}
+
+    def _check_stops(self, now_ns):
+        """Fill the pending stops whose trigger was crossed since they were placed"""
+        with self._lock:
+            stops = list(self._stops.values())
+        minute = now_ns // NS_PER_MINUTE
+        for record, placed_minute in stops:
+            path = self.path(record["exchange"], record["symboltoken"])
+            ltp = self.price(path, now_ns)
+            _, rows = path.candles(placed_minute + 1, minute - 1)
+            trigger = record["triggerprice"]
+            if record["transactiontype"] == "BUY":
+                crossed = max([ltp, *rows[:, 1].tolist()]) >= trigger
+            else:
+                crossed = min([ltp, *rows[:, 2].tolist()]) <= trigger
+            if crossed:
+                with self._lock:
+                    if self._stops.pop(record["orderid"], None) is None:
+                        continue
+                self._fill(record, trigger, now_ns)
+
+    def _fill(self, record, price, now_ns):
+        side = 1 if record["transactiontype"] == "BUY" else -1
+        slippage = self._random.uniform(0, 2 * self.slippage_bps) / 10_000
+        fill = round(price * (1 + side * slippage) / TICK_SIZE) * TICK_SIZE
+        record.update(status="complete", orderstatus="complete", text="", filledshares=record["quantity"],
+                      unfilledshares="0", averageprice=round(fill, 2),
+                      updatetime=pd.Timestamp(now_ns + IST_OFFSET_NS).strftime(FEED_TIME_FORMAT))
+
+    @staticmethod
+    def _reject(record, text):
+        record.update(status="rejected", orderstatus="rejected", text=text, filledshares="0",
+                      unfilledshares=record["quantity"], averageprice=0)
+
+    def positions(self):
+        """Net position per instrument from the filled orders, in the getPosition format"""
+        totals = {}
+        with self._lock:
+            orders = [order for order in self.orders if order["status"] == "complete"]
+        for order in orders:
+            key = (order["exchange"], order["symboltoken"])
+            entry = totals.setdefault(key, {"tradingsymbol": order["tradingsymbol"], "buy": [0, 0.0], "sell": [0, 0.0]})
+            side = entry["buy" if order["transactiontype"] == "BUY" else "sell"]
+            side[0] += int(order["filledshares"])
+            side[1] += int(order["filledshares"]) * order["averageprice"]
+        return [
+            {
+                "exchange": exchange,
+                "symboltoken": token,
+                "tradingsymbol": entry["tradingsymbol"],
+                "producttype": "INTRADAY",
+                "buyqty": str(entry["buy"][0]),
+                "sellqty": str(entry["sell"][0]),
+                "netqty": str(entry["buy"][0] - entry["sell"][0]),
+                "totalbuyavgprice": f"{entry['buy'][1] / entry['buy'][0]:.2f}" if entry["buy"][0] else "0",
+                "totalsellavgprice": f"{entry['sell'][1] / entry['sell'][0]:.2f}" if entry["sell"][0] else "0",
+            }
+            for (exchange, token), entry in totals.items()
+        ]
+
+    # HTTP
+
+    def _issue_tokens(self):
+        """A JWT-shaped session token whose "exp" claim says when it stops working, with its refresh token"""
+        expiry = time.time() + self.token_ttl
+        claims = {"username": "SIMULATOR", "exp": int(expiry), "jti": uuid.uuid4().hex}
+        segments = [{"alg": "none"}, claims]
+        jwt_token = ".".join(base64.urlsafe_b64encode(json.dumps(part).encode()).rstrip(b"=").decode()
+                             for part in segments) + "." + uuid.uuid4().hex
+        refresh_token = uuid.uuid4().hex
+        with self._lock:
+            self._tokens[jwt_token] = int(expiry)
+            self._refresh_tokens[refresh_token] = jwt_token
+        return {"jwtToken": jwt_token, "refreshToken": refresh_token, "feedToken": uuid.uuid4().hex}
+
+    def _respond(self, path, body, headers):
+        if path in SECURE_PATHS:
+            expiry = self._tokens.get(headers.get("Authorization", "")[len("Bearer "):])
+            if expiry is None or time.time() >= expiry:
+                return 401, {"status": False, "message": "Invalid Token", "errorcode": "AG8001", "data": None}
+
+        now_ns = self.now_ns()
+        if path == LOGIN_PATH:
+            return 200, {"status": True, "message": "SUCCESS", "errorcode": "", "data": self._issue_tokens()}
+        if path == GENERATE_TOKENS_PATH:
+            with self._lock:
+                jwt_token = self._refresh_tokens.pop(body.get("refreshToken"), None)
+                self._tokens.pop(jwt_token, None)
+            if jwt_token is None:
+                return 200, {"status": False, "message": "Invalid refresh token", "errorcode": "AB8051", "data": None}
+            return 200, {"status": True, "message": "SUCCESS", "errorcode": "", "data": self._issue_tokens()}
+        if path == LOGOUT_PATH:
+            jwt_token = headers.get("Authorization", "")[len("Bearer "):]
+            with self._lock:
+                self._tokens.pop(jwt_token, None)
+                for refresh_token in [r for r, t in self._refresh_tokens.items() if t == jwt_token]:
+                    del self._refresh_tokens[refresh_token]
+            return 200, {"status": True, "message": "SUCCESS", "errorcode": "", "data": ""}
+        if self._stops:
+            self._check_stops(now_ns)
+        if path == QUOTE_PATH:
+            fetched = [self.quote(exchange, token, now_ns)
+                       for exchange, tokens in (body.get("exchangeTokens") or {}).items() for token in tokens]
+            return 200, {"status": True, "message": "SUCCESS", "errorcode": "",
+                         "data": {"fetched": fetched, "unfetched": []}}
+        if path == CANDLE_DATA_PATH:
+            try:
+                data = self.candles(body["exchange"], body["symboltoken"], body["interval"],
+                                    body["fromdate"], body["todate"], now_ns)
+            except (KeyError, ValueError) as e:
+                return 200, {"status": False, "message": f"Invalid request: {e}", "errorcode": "AB13000", "data": None}
+            return 200, {"status": True, "message": "SUCCESS", "errorcode": "", "data": data}
+        if path == PLACE_ORDER_PATH:
+            return 200, self.place_order(body, now_ns)
+        if path == MODIFY_ORDER_PATH:
+            return 200, self.modify_order(body, now_ns)
+        if path == ORDER_BOOK_PATH:
+            with self._lock:
+                book = [dict(order) for order in self.orders]
+            return 200, {"status": True, "message": "SUCCESS", "errorcode": "", "data": book or None}
+        if path == POSITION_PATH:
+            return 200, {"status": True, "message": "SUCCESS", "errorcode": "", "data": self.positions() or None}
+        return 404, {"status": False, "message": f"Unknown endpoint {path}", "errorcode": "", "data": None}
+
+    def _delay(self, path):
+        latency = self.order_latency_ms if path in ORDER_PATHS else self.latency_ms
+        if latency > 0:
+            time.sleep(latency * self._random.uniform(0.5, 1.5) / 1000)
+
+    def _handler(self):
+        simulator = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # Keep-alive, like the real API, so BrokerClient's pool is exercised
+
+            def _send(self, status, payload):
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_HEAD(self):
+                self.send_response(200)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                try:
+                    body = json.loads(self.rfile.read(length) or b"{}")
+                except ValueError:
+                    body = {}
+                simulator._delay(self.path)
+                status, payload = simulator._respond(self.path, body, self.headers)
+                if self.path == PLACE_ORDER_PATH and simulator._random.random() < simulator.drop_rate:
+                    self.close_connection = True  # Order taken, answer lost
+                    return
+                self._send(status, payload)
+
+            do_GET = do_POST
+
+            def log_message(self, format, *args):
+                log.debug("simulator: " + format, *args)
+
+        return Handler
+
+
+def start_from_env():
+    """Start a simulator configured by SIM_* environment variables; returns its base URL"""
+    simulator = BrokerSimulator(
+        host=os.getenv("SIM_HOST", "127.0.0.1"),
+        port=int(os.getenv("SIM_PORT", "0")),
+        speed=float(os.getenv("SIM_SPEED", "1")),
+        start=os.getenv("SIM_START") or None,
+        replay_day=os.getenv("SIM_REPLAY_DAY") or None,
+        slippage_bps=float(os.getenv("SIM_SLIPPAGE_BPS", "2")),
+        latency_ms=float(os.getenv("SIM_LATENCY_MS", "5")),
+        order_latency_ms=float(os.getenv("SIM_ORDER_LATENCY_MS", "20")),
+        reject_rate=float(os.getenv("SIM_REJECT_RATE", "0")),
+        drop_rate=float(os.getenv("SIM_DROP_RATE", "0")),
+        token_ttl=float(os.getenv("SIM_TOKEN_TTL", "86400")),
+    )
+    return simulator.start()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a local Angel One API simulator "
+                                                 "(point ANGELONE_BASE_URL at the printed URL)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8800)
+    parser.add_argument("--speed", type=float, default=1.0, help="Simulated seconds per real second (up to 1000)")
+    parser.add_argument("--start", help="Simulated start time, IST (default now)")
+    parser.add_argument("--replay-day", help="Replay this stored day's 1-minute candles instead of synthetic prices")
+    parser.add_argument("--store", help="Candle store directory for --replay-day (default CANDLE_STORE_DIR)")
+    parser.add_argument("--slippage-bps", type=float, default=2.0)
+    parser.add_argument("--latency-ms", type=float, default=5.0)
+    parser.add_argument("--order-latency-ms", type=float, default=20.0)
+    parser.add_argument("--reject-rate", type=float, default=0.0)
+    parser.add_argument("--drop-rate", type=float, default=0.0, help="Share of placeOrder answers to drop")
+    parser.add_argument("--token-ttl", type=float, default=86400.0, help="Seconds a session token stays valid")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    simulator = BrokerSimulator(args.host, args.port, args.speed, args.start, args.replay_day,
+                                CandleStore(args.store) if args.store else None, args.slippage_bps,
+                                args.latency_ms, args.order_latency_ms, args.reject_rate, args.drop_rate,
+                                args.token_ttl)
+    simulator.start()
+    try:
+        while True:
+            time.sleep(60)
+            now = pd.Timestamp(simulator.now_ns(), tz="UTC").tz_convert("Asia/Kolkata")
+            log.info("🕒 %s, %d orders", now.strftime("%Y-%m-%d %H:%M"), len(simulator.orders))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        simulator.stop()
+        filled = [order for order in simulator.orders if order["status"] == "complete"]
+        log.info("Simulated %d orders (%d filled)", len(simulator.orders), len(filled))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+import numpy as np
+import pandas as pd
+
+NS_PER_MINUTE = 60 * 1_000_000_000
+NS_PER_DAY = 1440 * NS_PER_MINUTE
+IST_OFFSET_NS = 330 * NS_PER_MINUTE      # Asia/Kolkata is UTC+05:30, no DST
+MARKET_OPEN_NS = (9 * 60 + 15) * NS_PER_MINUTE
+
+COLUMNS = ["open", "high", "low", "close", "volume"]
+OPEN, HIGH, LOW, CLOSE, VOLUME = range(5)
+
+
+def to_ns(timestamp):
+    """Epoch nanoseconds (UTC) for a Timestamp/datetime; naive values are taken as IST"""
+    ts = pd.Timestamp(timestamp)
+    if ts.tzinfo is None:
+        ts = ts.tz_localize("Asia/Kolkata")
+    return ts.value
+
+
+def candle_start_ns(timestamp_ns, candle_minutes):
+    """Start of the candle holding timestamp_ns, counted from the 09:15 market open (daily candles start at midnight)"""
+    local_ns = timestamp_ns + IST_OFFSET_NS
+    day_ns = local_ns - local_ns % NS_PER_DAY
+    if candle_minutes >= 1440:
+        return day_ns - IST_OFFSET_NS
+    size_ns = candle_minutes * NS_PER_MINUTE
+    since_open = local_ns - day_ns - MARKET_OPEN_NS
+    return day_ns + MARKET_OPEN_NS + (since_open // size_ns) * size_ns - IST_OFFSET_NS
+
+
+class CandleBuilder:
+    """
+    Builds OHLCV candles from ticks or polled quotes into preallocated NumPy buffers.
+
+    Each row is written twice, at i and i + capacity, so the latest `capacity`
+    candles are always one contiguous slice: frame() wraps it in a DataFrame
+    without copying, and nothing is allocated per update.
+
+    Volume comes from the quote's cumulative day volume: each update adds the
+    increase since the previous one.
+    """
+
+    def __init__(self, candle_minutes=1, capacity=100):
+        self.candle_minutes = int(candle_minutes)
+        self.capacity = int(capacity)
+        self._ohlcv = np.zeros((2 * self.capacity, len(COLUMNS)), dtype=np.float64)
+        self._time = np.zeros(2 * self.capacity, dtype=np.int64)
+        self._next = 0          # ring slot for the next new candle
+        self.size = 0
+        self.last_cum_volume = None
+
+    def __len__(self):
+        return self.size
+
+    @property
+    def empty(self):
+        return self.size == 0
+
+    @property
+    def _last(self):
+        return (self._next - 1) % self.capacity
+
+    @property
+    def last_time_ns(self):
+        return int(self._time[self._last]) if self.size else None
+
+    def last(self, column=None):
+        """The forming candle as an (open, high, low, close, volume) row view, or one of its values"""
+        row = self._ohlcv[self._last]
+        return row if column is None else row[COLUMNS.index(column)]
+
+    def view(self, bars=None):
+        """Contiguous (bars x 5) view of the newest candles, oldest first"""
+        bars = self.size if bars is None else min(bars, self.size)
+        end = self._last + self.capacity + 1 if self.size > self._last + 1 else self._last + 1
+        return self._ohlcv[end - bars:end]
+
+    def times(self, bars=None):
+        bars = self.size if bars is None else min(bars, self.size)
+        end = self._last + self.capacity + 1 if self.size > self._last + 1 else self._last + 1
+        return self._time[end - bars:end]
+
+    def column(self, name, bars=None):
+        return self.view(bars)[:, COLUMNS.index(name)]
+
+    def _write(self, slot, start_ns, open_, high, low, close, volume):
+        for i in (slot, slot + self.capacity):
+            self._time[i] = start_ns
+            row = self._ohlcv[i]
+            row[OPEN] = open_
+            row[HIGH] = high
+            row[LOW] = low
+            row[CLOSE] = close
+            row[VOLUME] = volume
+
+    def _append(self, start_ns, open_, high, low, close, volume):
+        self._write(self._next, start_ns, open_, high, low, close, volume)
+        self._next = (self._next + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+    def update(self, timestamp_ns, price, cum_volume=None):
+        """
+        Fold one trade price into the candles.
+        Returns True if it started a new candle, False if it revised the
+        current one, None if it was older than the current candle and ignored.
+        """
+        volume = 0.0
+        if cum_volume is not None:
+            if self.last_cum_volume is not None and cum_volume >= self.last_cum_volume:
+                volume = float(cum_volume - self.last_cum_volume)
+            self.last_cum_volume = cum_volume  # A drop means a new session, counting restarts
+
+        start_ns = candle_start_ns(timestamp_ns, self.candle_minutes)
+        last_ns = self.last_time_ns
+        if last_ns is not None and start_ns < last_ns:
+            return None
+
+        if start_ns == last_ns:
+            slot = self._last
+            for row in (self._ohlcv[slot], self._ohlcv[slot + self.capacity]):
+                if price > row[HIGH]:
+                    row[HIGH] = price
+                if price < row[LOW]:
+                    row[LOW] = price
+                row[CLOSE] = price
+                row[VOLUME] += volume
+            return False
+
+        self._append(start_ns, price, price, price, price, volume)
+        return True
+
+    def load(self, df):
+        """Replace the buffers with historical candles (a DataFrame indexed by candle time)"""
+        self.load_arrays(*frame_arrays(df))
+
+    def load_arrays(self, times_ns, ohlcv, last_cum_volume=None):
+        """Replace the buffers with candle start times (epoch ns) and an (n x 5) OHLCV array, oldest first"""
+        times_ns = np.asarray(times_ns, dtype=np.int64)[-self.capacity:]
+        ohlcv = np.asarray(ohlcv, dtype=np.float64)[-self.capacity:]
+        n = len(times_ns)
+        for offset in (0, self.capacity):
+            self._time[offset:offset + n] = times_ns
+            self._ohlcv[offset:offset + n] = ohlcv
+        self._next = n % self.capacity
+        self.size = n
+        self.last_cum_volume = last_cum_volume
+
+    def grow(self, capacity):
+        """Keep at least `capacity` candles from now on, holding on to the ones already built"""
+        if capacity <= self.capacity:
+            return
+        times_ns, ohlcv = self.times().copy(), self.view().copy()
+        self.capacity = int(capacity)
+        self._ohlcv = np.zeros((2 * self.capacity, len(COLUMNS)), dtype=np.float64)
+        self._time = np.zeros(2 * self.capacity, dtype=np.int64)
+        self.load_arrays(times_ns, ohlcv, self.last_cum_volume)
+
+    def frame(self, bars=None):
+        """DataFrame over the newest candles; the values share memory with the buffers"""
+        index = pd.DatetimeIndex(self.times(bars).view("datetime64[ns]"), name="date")
+        index = index.tz_localize("UTC").tz_convert("Asia/Kolkata")
+        return pd.DataFrame(self.view(bars), index=index, columns=COLUMNS, copy=False)
+
+
+def frame_arrays(df):
+    """(times_ns, ohlcv) arrays of a candle DataFrame indexed by candle time (naive times are taken as IST)"""
+    if df is None or df.empty:
+        return np.empty(0, dtype=np.int64), np.empty((0, len(COLUMNS)))
+    index = df.index
+    if index.tz is None:
+        index = index.tz_localize("Asia/Kolkata")
+    return index.tz_convert("UTC").asi8, df[COLUMNS].to_numpy(dtype=np.float64)
+
+
+def resample_ohlcv(times_ns, ohlcv, candle_minutes):
+    """resample_arrays for an (n x 5) OHLCV array; returns (times_ns, ohlcv)"""
+    if candle_minutes == 1 or not len(times_ns):
+        return times_ns, ohlcv
+    times_ns, *columns = resample_arrays(times_ns, *np.asarray(ohlcv).T, candle_minutes)
+    return times_ns, np.column_stack(columns)
+
+
+class CandleSeries:
+    """
+    One instrument's candles on several timeframes, all fed by the same prices.
+
+    Every price goes into one CandleBuilder per timeframe: 1-minute always,
+    larger ones as strategies ask for them. They all bucket by
+    candle_start_ns from the 09:15 open, so a 15-minute candle is always
+    what resampling its 1-minute candles would give, kept current without
+    recomputing anything. Seed a timeframe from 1-minute history with
+    resample_ohlcv(*frame_arrays(df), candle_minutes).
+    """
+
+    def __init__(self, capacity=100):
+        self.capacity = int(capacity)
+        self.timeframes = {1: CandleBuilder(1, self.capacity)}
+
+    def timeframe(self, candle_minutes, capacity=None):
+        """The CandleBuilder for a timeframe, created empty on first use and grown if `capacity` is more"""
+        candles = self.timeframes.get(candle_minutes)
+        if candles is None:
+            candles = self.timeframes[candle_minutes] = CandleBuilder(candle_minutes, capacity or self.capacity)
+        elif capacity:
+            candles.grow(capacity)
+        return candles
+
+    def drop(self, candle_minutes):
+        """Stop keeping a timeframe no one uses any more (the 1-minute candles always stay)"""
+        if candle_minutes != 1:
+            self.timeframes.pop(candle_minutes, None)
+
+    def update(self, timestamp_ns, price, cum_volume=None):
+        """Fold one price into every timeframe; {candle_minutes: what CandleBuilder.update returned}"""
+        return {minutes: candles.update(timestamp_ns, price, cum_volume)
+                for minutes, candles in self.timeframes.items()}
+
+
+def resample_arrays(times_ns, open_, high, low, close, volume, candle_minutes):
+    """
+    Vectorized resample of (sorted) base candles into candle_minutes candles
+    with the same 09:15 alignment as CandleBuilder. Returns the same six arrays.
+    """
+    times_ns = np.asarray(times_ns, dtype=np.int64)
+    starts = candle_start_ns(times_ns, candle_minutes)
+    first = np.flatnonzero(np.r_[True, starts[1:] != starts[:-1]])
+    last = np.r_[first[1:] - 1, times_ns.size - 1]
+    return (
+        starts[first],
+        np.asarray(open_, dtype=np.float64)[first],
+        np.maximum.reduceat(np.asarray(high, dtype=np.float64), first),
+        np.minimum.reduceat(np.asarray(low, dtype=np.float64), first),
+        np.asarray(close, dtype=np.float64)[last],
+        np.add.reduceat(np.asarray(volume, dtype=np.float64), first),
+    )
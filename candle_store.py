@@ -0,0 +1,218 @@
+import datetime
+import glob
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+
+log = logging.getLogger(__name__)
+
+CANDLE_DTYPE = np.dtype([
+    ("time", "<i8"),  # Candle start, epoch ns UTC
+    ("open", "<f8"),
+    ("high", "<f8"),
+    ("low", "<f8"),
+    ("close", "<f8"),
+    ("volume", "<f8"),
+])
+
+MARKET_OPEN = datetime.time(9, 15)
+MARKET_CLOSE = datetime.time(15, 30)
+
+
+def _as_datetime(value, default_time):
+    """Naive IST datetime; plain dates (or "YYYY-MM-DD") get default_time"""
+    if isinstance(value, str) and len(value) == 10:
+        value = datetime.date.fromisoformat(value)
+    if isinstance(value, datetime.date) and not isinstance(value, datetime.datetime):
+        return datetime.datetime.combine(value, default_time)
+    ts = pd.Timestamp(value)
+    if ts.tzinfo is not None:
+        ts = ts.tz_convert("Asia/Kolkata").tz_localize(None)
+    return ts.to_pydatetime()
+
+
+def frame_to_records(df):
+    """OHLCV DataFrame indexed by candle time -> CANDLE_DTYPE records (naive times are taken as IST)"""
+    index = df.index
+    if index.tz is None:
+        index = index.tz_localize("Asia/Kolkata")
+    records = np.empty(len(df), dtype=CANDLE_DTYPE)
+    records["time"] = index.tz_convert("UTC").asi8
+    for column in ("open", "high", "low", "close", "volume"):
+        records[column] = df[column].to_numpy(dtype=np.float64)
+    return records
+
+
+def records_to_frame(records):
+    index = pd.DatetimeIndex(records["time"].view("datetime64[ns]"), name="date")
+    index = index.tz_localize("UTC").tz_convert("Asia/Kolkata")
+    return pd.DataFrame({column: records[column] for column in ("open", "high", "low", "close", "volume")},
+                        index=index)
+
+
+class CandleStore:
+    """
+    On-disk candle cache: one memory-mappable .npy file of CANDLE_DTYPE
+    records per symbol, interval and trading day,
+
+        <root>/<exchange>_<token>/<interval>/<YYYY-MM-DD>.npy
+
+    Days still in progress are saved as <day>.partial.npy and topped up on
+    the next request. Past days with no candles (holidays) are kept as empty
+    files so they are never fetched again. Writes merge by candle time and
+    replace files atomically, so fetching the same range twice is harmless.
+    """
+
+    def __init__(self, root=None):
+        self.root = root or os.getenv("CANDLE_STORE_DIR", os.path.join("data", "candles"))
+
+    def _dir(self, exchange, symbol_token, interval):
+        return os.path.join(self.root, f"{exchange}_{symbol_token}", interval)
+
+    def _path(self, exchange, symbol_token, interval, day, partial=False):
+        suffix = ".partial.npy" if partial else ".npy"
+        return os.path.join(self._dir(exchange, symbol_token, interval), day.isoformat() + suffix)
+
+    def days(self, exchange, symbol_token, interval):
+        """{date: (path, complete)} for every stored day"""
+        stored = {}
+        for path in glob.glob(os.path.join(self._dir(exchange, symbol_token, interval), "*.npy")):
+            name = os.path.basename(path)
+            partial = name.endswith(".partial.npy")
+            day = datetime.date.fromisoformat(name.split(".")[0])
+            if day not in stored or not partial:
+                stored[day] = (path, not partial)
+        return stored
+
+    def load_day(self, exchange, symbol_token, interval, day):
+        """Memory-mapped records for one day (None if not stored)"""
+        entry = self.days(exchange, symbol_token, interval).get(day)
+        if entry is None:
+            return None
+        return np.load(entry[0], mmap_mode="r")
+
+    def read(self, exchange, symbol_token, interval, start=None, end=None):
+        """Stored candles between start and end (inclusive) as a DataFrame indexed by IST candle time"""
+        stored = self.days(exchange, symbol_token, interval)
+        start = _as_datetime(start, datetime.time.min) if start is not None else None
+        end = _as_datetime(end, datetime.time.max) if end is not None else None
+
+        chunks = []
+        for day in sorted(stored):
+            if (start is not None and day < start.date()) or (end is not None and day > end.date()):
+                continue
+            records = np.load(stored[day][0], mmap_mode="r")
+            if len(records):
+                chunks.append(records)
+        records = np.concatenate(chunks) if chunks else np.empty(0, dtype=CANDLE_DTYPE)
+
+        if start is not None or end is not None:
+            times = records["time"]
+            mask = np.ones(len(records), dtype=bool)
+            if start is not None:
+                mask &= times >= pd.Timestamp(start, tz="Asia/Kolkata").value
+            if end is not None:
+                mask &= times <= pd.Timestamp(end, tz="Asia/Kolkata").value
+            records = records[mask]
+        return records_to_frame(records)
+
+    def write(self, exchange, symbol_token, interval, df, days=(), now=None):
+        """
+        Merge candles into the store. `days` lists every day the fetch covered,
+        so days that came back empty are recorded too. Days are marked complete
+        once the market has closed on them.
+        """
+        now = now or datetime.datetime.now()
+        records = frame_to_records(df) if df is not None and len(df) else np.empty(0, dtype=CANDLE_DTYPE)
+        local_days = (records["time"] + 330 * 60 * 10 ** 9).astype("datetime64[ns]").astype("datetime64[D]")
+
+        touched = set(days)
+        touched.update(pd.to_datetime(np.unique(local_days)).date)
+        os.makedirs(self._dir(exchange, symbol_token, interval), exist_ok=True)
+        stored = self.days(exchange, symbol_token, interval)
+
+        for day in sorted(touched):
+            new = records[local_days == np.datetime64(day, "D")]
+            if day in stored:
+                new = np.concatenate([np.load(stored[day][0]), new])
+            # Sort by time; for duplicates the freshly fetched candle wins
+            new = new[np.argsort(new["time"], kind="stable")]
+            if len(new):
+                new = new[np.r_[new["time"][1:] != new["time"][:-1], True]]
+
+            complete = day < now.date() or (day == now.date() and now.time() > MARKET_CLOSE)
+            path = self._path(exchange, symbol_token, interval, day, partial=not complete)
+            tmp = path + ".tmp"
+            with open(tmp, "wb") as f:
+                np.save(f, new)
+            os.replace(tmp, path)
+            if complete:
+                partial_path = self._path(exchange, symbol_token, interval, day, partial=True)
+                if os.path.exists(partial_path):
+                    os.remove(partial_path)
+
+    def missing_ranges(self, exchange, symbol_token, interval, start, end, now=None):
+        """
+        (from, to) datetimes that still have to be fetched to cover start..end.
+        Whole missing weekdays are merged into consecutive ranges; a partial
+        day is resumed from its last stored candle.
+        """
+        now = now or datetime.datetime.now()
+        start = _as_datetime(start, MARKET_OPEN)
+        end = min(_as_datetime(end, MARKET_CLOSE), now)
+        stored = self.days(exchange, symbol_token, interval)
+
+        ranges = []
+        extend = False  # Whether the last range is a run of whole missing days we can grow
+        day = start.date()
+        while day <= end.date():
+            day_start = max(start, datetime.datetime.combine(day, MARKET_OPEN))
+            day_end = min(end, datetime.datetime.combine(day, MARKET_CLOSE))
+            entry = stored.get(day)
+
+            if day.weekday() >= 5 or day_start > day_end:
+                pass
+            elif entry is None:
+                if extend:
+                    ranges[-1][1] = day_end
+                else:
+                    ranges.append([day_start, day_end])
+                    extend = True
+            else:
+                extend = False
+                if not entry[1]:
+                    records = np.load(entry[0], mmap_mode="r")
+                    resume = day_start
+                    if len(records):
+                        last = pd.Timestamp(int(records["time"][-1]), tz="UTC").tz_convert("Asia/Kolkata")
+                        resume = max(day_start, last.tz_localize(None).to_pydatetime())
+                    if resume <= day_end:
+                        ranges.append([resume, day_end])
+            day += datetime.timedelta(days=1)
+
+        return [tuple(missing) for missing in ranges]
+
+    def ensure(self, exchange, symbol_token, interval, start, end, fetch, now=None):
+        """
+        Serve start..end from disk, calling fetch(from_datetime, to_datetime) only
+        for the missing pieces, each no longer than the interval's request limit.
+        fetch must cover the whole range it is given and return a DataFrame
+        (empty if the broker has no candles) or None on failure, in which case
+        nothing is recorded.
+        """
+        from history_downloader import chunk_range
+
+        now = now or datetime.datetime.now()
+        for missing_start, missing_end in self.missing_ranges(exchange, symbol_token, interval, start, end, now):
+            for range_start, range_end in chunk_range(missing_start, missing_end, interval):
+                log.info("📥 Fetching %s candles for %s:%s from %s to %s", interval, exchange, symbol_token,
+                         range_start, range_end)
+                df = fetch(range_start, range_end)
+                if df is None:
+                    continue
+                covered = [day for day in pd.date_range(range_start.date(), range_end.date(), freq="D").date
+                           if day.weekday() < 5]
+                self.write(exchange, symbol_token, interval, df, days=covered, now=now)
+        return self.read(exchange, symbol_token, interval, start, end)
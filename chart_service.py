@@ -0,0 +1,179 @@
+import json
+import logging
+import queue
+import threading
+
+import numpy as np
+
+from supertrend_engine import supertrend_arrays
+
+log = logging.getLogger(__name__)
+
+# One chart bar on the wire: [time ms, open, high, low, close, volume, supertrend, direction]
+BAR_FIELDS = ["time", "open", "high", "low", "close", "volume", "supertrend", "direction"]
+
+
+class ChartService:
+    """
+    Builds chart data off the trading thread.
+
+    The engine only calls mark(strategy) after an update, which records that
+    the symbol changed. Every `interval` seconds the renderer thread copies
+    the candle buffers of the marked symbols (holding `lock` just for the
+    copy), computes the Supertrend line over the copy and pushes the bars
+    that are new or changed since the last push to every subscriber.
+    Subscribers (the /charts/stream SSE route) get a full snapshot first,
+    then only those incremental updates.
+    """
+
+    def __init__(self, lock=None, interval=1.0, max_pending=1024):
+        self.lock = lock or threading.Lock()
+        self.interval = interval
+        self.max_pending = max_pending
+        self._dirty = {}
+        self._charts = {}        # key -> {"symbol", "trading_symbol", "bars"}
+        self._subscribers = []
+        self._state_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="chart-renderer", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stop_event.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def mark(self, strategy):
+        """Note that a strategy's candles changed (cheap; called from the trading thread)"""
+        self._dirty[strategy.key] = strategy
+
+    def forget(self, key):
+        self._dirty.pop(key, None)
+        with self._state_lock:
+            self._charts.pop(key, None)
+        self._broadcast({"symbol": _symbol(key), "removed": True})
+
+    def flush(self):
+        """Render everything marked so far right now (the renderer thread does this every interval)"""
+        self._wake.set()
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            self._render_dirty()
+        self._render_dirty()
+
+    def _render_dirty(self):
+        while self._dirty:
+            try:
+                key, strategy = self._dirty.popitem()
+            except KeyError:
+                break
+            try:
+                self._render(key, strategy)
+            except Exception as e:
+                log.warning("⚠ Error rendering chart for %s: %s", strategy.trading_symbol, e)
+
+    def _render(self, key, strategy):
+        with self.lock:
+            if strategy.candles.empty:
+                return
+            times = strategy.candles.times().copy()
+            ohlcv = strategy.candles.view().copy()
+        line = strategy.supertrend
+        if line is not None:
+            trend, direction = supertrend_arrays(ohlcv[:, 1], ohlcv[:, 2], ohlcv[:, 3], line.length, line.multiplier)
+            trend[:line.length + 1] = np.nan  # Not meaningful until ATR has warmed up
+        else:
+            trend, direction = np.full(len(times), np.nan), np.zeros(len(times), dtype=np.int8)
+        bars = [
+            [int(t // 1_000_000), *(_number(v) for v in row), _number(st), int(d)]
+            for t, row, st, d in zip(times, ohlcv, trend, direction)
+        ]
+
+        with self._state_lock:
+            chart = self._charts.get(key)
+            if chart is None:
+                chart = {"symbol": _symbol(key), "trading_symbol": strategy.trading_symbol, "bars": []}
+                self._charts[key] = chart
+            previous = chart["bars"]
+            since = previous[-1][0] if previous else None
+            chart["bars"] = bars
+
+        # Only bars from the last one already sent (it may still be forming) onwards
+        changed = [bar for bar in bars if since is None or bar[0] >= since]
+        if since is not None and changed and changed[0] == previous[-1]:
+            changed = changed[1:]
+        if changed:
+            self._broadcast({"symbol": chart["symbol"], "trading_symbol": chart["trading_symbol"],
+                             "bars": changed, "reset": since is None})
+
+    def charts(self):
+        """Chart data per strategy: {"NSE:3045:ONE_MINUTE:supertrend_10_2.0": {"symbol", "trading_symbol", "bars"}}"""
+        with self._state_lock:
+            return {chart["symbol"]: dict(chart) for chart in self._charts.values()}
+
+    def subscribe(self):
+        """A queue that receives a snapshot per symbol, then every incremental update"""
+        subscriber = queue.Queue(maxsize=self.max_pending)
+        with self._state_lock:
+            for chart in self._charts.values():
+                subscriber.put_nowait({**chart, "reset": True})
+            self._subscribers.append(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._state_lock:
+            if subscriber in self._subscribers:
+                self._subscribers.remove(subscriber)
+
+    def _broadcast(self, message):
+        with self._state_lock:
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(message)
+            except queue.Full:
+                # A stalled client: drop it; EventSource reconnects and starts from a snapshot
+                self.unsubscribe(subscriber)
+                try:
+                    while True:
+                        subscriber.get_nowait()
+                except queue.Empty:
+                    pass
+                subscriber.put_nowait(None)
+
+    def stream(self, keepalive=15):
+        """Server-sent events for a subscriber, for a Flask streaming Response"""
+        subscriber = self.subscribe()
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                try:
+                    message = subscriber.get(timeout=keepalive)
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+                    continue
+                if message is None:
+                    return
+                yield f"data: {json.dumps(message)}\n\n"
+        finally:
+            self.unsubscribe(subscriber)
+
+
+def _symbol(key):
+    return ":".join(str(part) for part in key)
+
+
+def _number(value):
+    value = float(value)
+    return value if value == value else None
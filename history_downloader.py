@@ -0,0 +1,176 @@
+import argparse
+import datetime
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import pandas as pd
+
+from candle_store import CandleStore, MARKET_CLOSE, MARKET_OPEN
+
+log = logging.getLogger(__name__)
+
+# Most calendar days getCandleData accepts in one request, per interval
+MAX_DAYS_PER_REQUEST = {
+    "ONE_MINUTE": 30,
+    "THREE_MINUTE": 60,
+    "FIVE_MINUTE": 100,
+    "TEN_MINUTE": 100,
+    "FIFTEEN_MINUTE": 200,
+    "THIRTY_MINUTE": 200,
+    "ONE_HOUR": 400,
+    "ONE_DAY": 2000,
+}
+
+REQUESTS_PER_SECOND = 3  # Broker limit for the historical API
+
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` tokens per second, bursts of up to `capacity`"""
+
+    def __init__(self, rate=REQUESTS_PER_SECOND, capacity=None):
+        self.rate = float(rate)
+        self.capacity = max(1.0, float(capacity or rate))  # Below one token acquire() would never return
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available, then take it"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+def chunk_range(start, end, interval):
+    """
+    Split start..end into (from, to) pieces no longer than the interval's
+    request limit. Pieces break on day boundaries, so no two of them write
+    the same day in the candle store.
+    """
+    max_days = MAX_DAYS_PER_REQUEST.get(interval, 30)
+    chunks = []
+    chunk_start = start
+    while chunk_start <= end:
+        last_day = chunk_start.date() + datetime.timedelta(days=max_days - 1)
+        chunk_end = min(end, datetime.datetime.combine(last_day, MARKET_CLOSE))
+        chunks.append((chunk_start, chunk_end))
+        chunk_start = datetime.datetime.combine(last_day + datetime.timedelta(days=1), MARKET_OPEN)
+    return chunks
+
+
+def _default_fetch(symbol_token, exchange, interval, from_date, to_date):
+    import Live_trading_with_Supertrend_ultra_final_lite as lt
+    return lt.fetch_candle_data(symbol_token, exchange, interval, from_date, to_date)
+
+
+def download(instruments, interval, start, end, store=None, fetch=None, workers=4,
+             rate=REQUESTS_PER_SECOND, max_attempts=3, backoff=1.0, now=None):
+    """
+    Backfill the candle store for every (exchange, symbol_token) in instruments
+    over start..end.
+
+    Only ranges the store is missing are requested, split into interval-legal
+    chunks and fetched by `workers` threads that share one token bucket. A chunk
+    that keeps failing after `max_attempts` is reported and skipped; since
+    finished chunks are already on disk, running the same download again picks
+    up where this one stopped.
+
+    fetch(symbol_token, exchange, interval, from, to) defaults to the broker's
+    getCandleData and must return a DataFrame, or None on failure.
+    Returns {"chunks", "candles", "failed": [(exchange, token, from, to), ...]}.
+    """
+    store = store or CandleStore()
+    fetch = fetch or _default_fetch
+    now = now or datetime.datetime.now()
+    bucket = TokenBucket(rate)
+
+    jobs = []
+    for exchange, symbol_token in instruments:
+        for range_start, range_end in store.missing_ranges(exchange, symbol_token, interval, start, end, now):
+            for chunk_start, chunk_end in chunk_range(range_start, range_end, interval):
+                jobs.append((exchange, str(symbol_token), chunk_start, chunk_end))
+
+    def _run(exchange, symbol_token, chunk_start, chunk_end):
+        for attempt in range(max_attempts):
+            if attempt:
+                time.sleep(backoff * (2 ** (attempt - 1)))
+            bucket.acquire()
+            try:
+                df = fetch(symbol_token, exchange, interval, chunk_start, chunk_end)
+            except Exception as e:
+                log.warning("⚠ %s:%s %s fetch error: %s", exchange, symbol_token, chunk_start.date(), e)
+                df = None
+            if df is not None:
+                covered = [day for day in pd.date_range(chunk_start.date(), chunk_end.date(), freq="D").date
+                           if day.weekday() < 5]
+                store.write(exchange, symbol_token, interval, df, days=covered, now=now)
+                return len(df)
+        return None
+
+    log.info("📥 Downloading %d %s chunks for %d symbols", len(jobs), interval, len(instruments))
+    result = {"chunks": len(jobs), "candles": 0, "failed": []}
+    if not jobs:
+        return result
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(_run, *job): job for job in jobs}
+        for done, future in enumerate(as_completed(futures), 1):
+            candles = future.result()
+            if candles is None:
+                result["failed"].append(futures[future])
+            else:
+                result["candles"] += candles
+            if done % 100 == 0 or done == len(futures):
+                log.info("📦 %d/%d chunks done, %d candles, %d failed",
+                         done, len(futures), result["candles"], len(result["failed"]))
+    return result
+
+
+def load_instruments(path):
+    """(exchange, symbol_token) pairs from a CSV with exchange and token (or symboltoken) columns"""
+    df = pd.read_csv(path, dtype=str)
+    token_column = "token" if "token" in df.columns else "symboltoken"
+    return list(zip(df["exchange"], df[token_column]))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backfill the local candle store from the historical API")
+    parser.add_argument("symbols", nargs="*", metavar="EXCHANGE:TOKEN", help="e.g. NSE:3045")
+    parser.add_argument("--symbols-file", help="CSV with exchange and token columns")
+    parser.add_argument("--interval", default="ONE_MINUTE", choices=sorted(MAX_DAYS_PER_REQUEST))
+    parser.add_argument("--start", required=True, help="First day, YYYY-MM-DD")
+    parser.add_argument("--end", default=datetime.date.today().isoformat(), help="Last day, YYYY-MM-DD")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--rate", type=float, default=REQUESTS_PER_SECOND, help="Requests per second")
+    args = parser.parse_args()
+
+    instruments = [tuple(symbol.split(":")) for symbol in args.symbols]
+    if args.symbols_file:
+        instruments += load_instruments(args.symbols_file)
+    if not instruments:
+        parser.error("give EXCHANGE:TOKEN symbols or --symbols-file")
+
+    from log_config import setup_logging
+    setup_logging()
+
+    import Live_trading_with_Supertrend_ultra_final_lite as lt
+    if not lt.login_to_angel_one():
+        raise SystemExit(1)
+    try:
+        result = download(instruments, args.interval, args.start, args.end,
+                          workers=args.workers, rate=args.rate)
+    finally:
+        lt.logout_from_angel_one()
+
+    if result["failed"]:
+        print(f"⚠ {len(result['failed'])} chunks failed; run the same command again to resume")
+    print(f"✅ Download done: {result['candles']} candles in {result['chunks']} chunks")
@@ -0,0 +1,253 @@
+import math
+from collections import namedtuple
+
+from candle_builder import CLOSE, HIGH, LOW
+from supertrend_engine import SupertrendPoint, band_step, rma_step, supertrend_column, true_range
+
+
+class Indicator:
+    """
+    One streaming indicator over a CandleBuilder's candles, known by its
+    spec: (name, *params), e.g. ("atr", 10).
+
+    Subclasses list the specs they read in `depends` and implement
+    step(prev, candle, inputs) -> (state, value): candle is the newest one
+    as (open, high, low, close, volume), inputs the indicators of `depends`,
+    already stepped on it. As with StreamingSupertrend, update(new_bar=False)
+    revises the candle still forming and update(new_bar=True) closes it.
+    """
+
+    name = None
+    State = None   # namedtuple carried from one candle to the next
+    Value = None   # namedtuple of the value, unless it is a plain number
+    depends = ()
+
+    def __init__(self, *params):
+        self.params = params
+        self.spec = (self.name, *params)
+        self.reset()
+
+    def initial(self):
+        raise NotImplementedError
+
+    def step(self, prev, candle, inputs):
+        raise NotImplementedError
+
+    @property
+    def bars(self):
+        return self._current.bars if self._current is not None else 0
+
+    def reset(self):
+        self._closed = self.initial()  # state after the last closed candle
+        self._current = None           # state after the candle still forming
+        self.value = None
+
+    def update(self, candle, new_bar, inputs):
+        """Step on the newest candle; True if the value changed"""
+        if new_bar and self._current is not None:
+            self._closed = self._current
+        self._current, value = self.step(self._closed, candle, inputs)
+        changed = value != self.value
+        self.value = value
+        return changed
+
+    def dump(self):
+        """Everything update() carries between calls, as plain lists (for StateStore snapshots)"""
+        return [list(self._closed),
+                list(self._current) if self._current is not None else None,
+                list(self.value) if isinstance(self.value, tuple) else self.value]
+
+    def restore(self, state):
+        """Carry on from a dump()"""
+        closed, current, value = state
+        self._closed = self.State(*closed)
+        self._current = self.State(*current) if current is not None else None
+        self.value = self.Value(*value) if self.Value is not None and value is not None else value
+
+
+class ATR(Indicator):
+    """Average true range as pandas_ta has it: Wilder's RMA of true range, NaN until `length` true ranges"""
+
+    name = "atr"
+    State = namedtuple("ATRState", ["bars", "close", "mean", "weight", "obs"])
+
+    def __init__(self, length=10):
+        self.length = int(length)
+        self._decay = 1.0 - 1.0 / self.length
+        super().__init__(self.length)
+
+    def initial(self):
+        return self.State(0, math.nan, math.nan, 1.0, 0)
+
+    @property
+    def ready(self):
+        return self._current is not None and self._current.obs >= self.length
+
+    def step(self, prev, candle, inputs):
+        high, low, close = candle[HIGH], candle[LOW], candle[CLOSE]
+        tr = math.nan if prev.bars == 0 else true_range(high, low, prev.close)
+        mean, weight, obs = rma_step(prev.mean, prev.weight, prev.obs, tr, self._decay)
+        return self.State(prev.bars + 1, close, mean, weight, obs), mean if obs >= self.length else math.nan
+
+
+class Supertrend(Indicator):
+    """Supertrend on top of ATR(length): the same SupertrendPoint, bar for bar, as StreamingSupertrend gives"""
+
+    name = "supertrend"
+    State = namedtuple("SupertrendState", ["bars", "upper", "lower", "direction", "signal"])
+    Value = SupertrendPoint
+
+    def __init__(self, length=10, multiplier=2.0):
+        self.length = int(length)
+        self.multiplier = float(multiplier)
+        self.column = supertrend_column(self.length, self.multiplier)
+        self.depends = (("atr", self.length),)
+        super().__init__(self.length, self.multiplier)
+
+    def initial(self):
+        return self.State(0, math.nan, math.nan, 1, None)
+
+    @property
+    def ready(self):
+        """True once ATR has `length` true ranges behind it"""
+        return self.bars > self.length
+
+    def step(self, prev, candle, inputs):
+        high, low, close = candle[HIGH], candle[LOW], candle[CLOSE]
+        atr = inputs[0].value
+        upper, lower, direction, value = band_step(prev.bars == 0, prev.upper, prev.lower, prev.direction,
+                                                   high, low, close, atr, self.multiplier)
+        signal = 'buy' if close > value else 'sell'
+        signal_change = prev.signal is not None and signal != prev.signal
+        state = self.State(prev.bars + 1, upper, lower, direction, signal)
+        return state, SupertrendPoint(value, direction, upper, lower, atr, signal, signal_change)
+
+
+INDICATORS = {indicator.name: indicator for indicator in (ATR, Supertrend)}
+
+
+def make_indicator(spec):
+    name, *params = spec
+    if name not in INDICATORS:
+        raise ValueError(f"Unknown indicator: {name}")
+    return INDICATORS[name](*params)
+
+
+class IndicatorGraph:
+    """
+    The indicators every strategy on one CandleBuilder reads, each one
+    computed once per candle update however many strategies ask for it.
+
+    require(spec) adds an indicator, and the ones it reads, or returns the
+    one already there; release(spec) drops it once nothing reads it any more.
+    update() steps each indicator once, its inputs first, and returns the
+    specs whose value changed, so a strategy can skip updates that changed
+    nothing it reads. seed() replays history through the indicators added
+    since the last seed; the ones already live keep their state.
+    """
+
+    def __init__(self, candles):
+        self.candles = candles
+        self.nodes = {}       # spec -> Indicator
+        self._users = {}      # spec -> strategies and indicators reading it
+        self._fresh = set()   # specs not seeded (or restored) yet
+        # (spec, indicator, input indicators), inputs first. Replaced, never changed
+        # in place, so update() can run while strategies are being added
+        self._order = ()
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def require(self, spec):
+        spec = tuple(spec)
+        node = self.nodes.get(spec)
+        if node is None:
+            node = make_indicator(spec)
+            inputs = tuple(self.require(dep) for dep in node.depends)
+            self.nodes[spec] = node
+            self._users[spec] = 0
+            self._fresh.add(spec)
+            self._order = (*self._order, (spec, node, inputs))
+        self._users[spec] += 1
+        return node
+
+    def release(self, spec):
+        spec = tuple(spec)
+        self._users[spec] -= 1
+        if self._users[spec]:
+            return
+        node = self.nodes.pop(spec)
+        del self._users[spec]
+        self._fresh.discard(spec)
+        self._order = tuple(step for step in self._order if step[0] != spec)
+        for dep in node.depends:
+            self.release(dep)
+
+    def ready(self, specs):
+        nodes = self.nodes
+        for spec in specs:
+            if not nodes[spec].ready:
+                return False
+        return True
+
+    def values(self, specs):
+        return {spec: self.nodes[spec].value for spec in specs}
+
+    def update(self, new_bar):
+        """Step every indicator on the newest candle; returns the set of specs whose value changed"""
+        candle = self.candles.last().tolist()
+        changed = set()
+        for spec, node, inputs in self._order:
+            if node.update(candle, new_bar, inputs):
+                changed.add(spec)
+        return changed
+
+    def _closure(self, specs):
+        """specs and everything they read, inputs first"""
+        seen = {}
+
+        def add(spec):
+            if spec not in seen:
+                for dep in self.nodes[spec].depends:
+                    add(dep)
+                seen[spec] = self.nodes[spec]
+        for spec in specs:
+            add(tuple(spec))
+        return seen
+
+    def seed(self, ohlcv, reseed=False):
+        """
+        Replay candles (e.g. the warm-up history, oldest first) through the
+        indicators added since the last seed, or through all of them with
+        reseed. Inputs they share with indicators already live are replayed
+        on stand-ins, so those keep their state.
+        """
+        if reseed:
+            self._fresh.update(self.nodes)
+        replay = {}
+        for spec, node in self._closure([spec for spec, _, _ in self._order if spec in self._fresh]).items():
+            if spec in self._fresh:
+                node.reset()
+            else:
+                node = make_indicator(spec)
+            replay[spec] = (node, tuple(replay[dep][0] for dep in node.depends))
+        self._fresh.clear()
+        if not replay:
+            return
+        steps = list(replay.values())
+        for candle in ohlcv.tolist():
+            for node, inputs in steps:
+                node.update(candle, True, inputs)
+
+    def dump(self, specs):
+        """[[spec, state], ...] for specs and everything they read"""
+        return [[list(spec), node.dump()] for spec, node in self._closure(specs).items()]
+
+    def restore(self, states, specs):
+        """Take back dump()ed indicators; True if none of specs (or their inputs) still needs a seed()"""
+        for spec, state in states:
+            spec = tuple(spec)
+            if spec in self.nodes:
+                self.nodes[spec].restore(state)
+                self._fresh.discard(spec)
+        return self._fresh.isdisjoint(self._closure(specs))
@@ -0,0 +1,280 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import namedtuple
+
+import numpy as np
+
+log = logging.getLogger(__name__)
+
+SCRIP_MASTER_URL = "https://margincalculator.angelbroking.com/OpenAPI_File/files/OpenAPIScripMaster.json"
+
+# Buckets in the order the dashboard shows them
+CATEGORIES = ("EQ", "FUT", "OPT", "Others")
+GRAM = 3  # n-gram length; shorter queries fall back to prefix matching
+
+_Snapshot = namedtuple(
+    "_Snapshot",
+    ["names", "symbols", "tokens", "exchanges", "bounds", "postings",
+     "name_sorted", "name_ids", "symbol_sorted", "symbol_ids"]
+)
+
+
+def category(symbol):
+    """Same bucketing rules as the dashboard: -EQ, FUT, PE/CE options, everything else"""
+    if "-EQ" in symbol:
+        return 0
+    if "FUT" in symbol:
+        return 1
+    if symbol.endswith("PE") or symbol.endswith("CE"):
+        return 2
+    return 3
+
+
+def _grams(text):
+    return {text[i:i + GRAM] for i in range(len(text) - GRAM + 1)}
+
+
+def _build(instruments):
+    """Index the scrip master records: n-gram postings plus sorted name/symbol arrays for prefixes"""
+    rows = []
+    for instrument in instruments:
+        symbol = str(instrument.get("symbol") or "")
+        rows.append((category(symbol), len(symbol), symbol.upper(), str(instrument.get("name") or "").upper(),
+                     str(instrument.get("token", "")), instrument.get("exch_seg", "")))
+    # Ids follow (bucket, symbol length, symbol), so any id-ordered slice is already ranked
+    # shortest-symbol-first and each bucket is one contiguous id range
+    rows.sort(key=lambda row: row[:3])
+
+    categories = np.array([row[0] for row in rows], dtype=np.int8)
+    symbols = np.array([row[2] for row in rows], dtype=str)
+    names = np.array([row[3] for row in rows], dtype=str)
+
+    gram_ids = {}
+    pairs_gram, pairs_id = [], []
+    for i, row in enumerate(rows):
+        for gram in _grams(row[3]) | _grams(row[2]):
+            pairs_gram.append(gram_ids.setdefault(gram, len(gram_ids)))
+            pairs_id.append(i)
+    pairs_gram = np.array(pairs_gram, dtype=np.int32)
+    pairs_id = np.array(pairs_id, dtype=np.int32)
+    order = np.lexsort((pairs_id, pairs_gram))
+    pairs_gram, pairs_id = pairs_gram[order], pairs_id[order]
+    starts = np.searchsorted(pairs_gram, np.arange(len(gram_ids) + 1))
+    postings = {gram: pairs_id[starts[g]:starts[g + 1]] for gram, g in gram_ids.items()}
+
+    name_ids = np.argsort(names, kind="stable").astype(np.int32)
+    symbol_ids = np.argsort(symbols, kind="stable").astype(np.int32)
+    return _Snapshot(
+        names=names,
+        symbols=symbols,
+        tokens=[row[4] for row in rows],
+        exchanges=[row[5] for row in rows],
+        bounds=np.searchsorted(categories, np.arange(len(CATEGORIES) + 1)),
+        postings=postings,
+        name_sorted=names[name_ids],
+        name_ids=name_ids,
+        symbol_sorted=symbols[symbol_ids],
+        symbol_ids=symbol_ids,
+    )
+
+
+def _key(sorted_values, text):
+    """text as a scalar of the array's own dtype, so searchsorted doesn't cast the whole array (None if too long)"""
+    if len(text) > sorted_values.dtype.itemsize // 4:
+        return None
+    return np.array(text, dtype=sorted_values.dtype)
+
+
+def _equal(sorted_values, ids, value):
+    key = _key(sorted_values, value)
+    if key is None:
+        return ids[:0]
+    return ids[np.searchsorted(sorted_values, key, side="left"):np.searchsorted(sorted_values, key, side="right")]
+
+
+def _prefix(sorted_values, ids, prefix):
+    key = _key(sorted_values, prefix)
+    if key is None or not prefix:
+        return ids[:0]
+    lo = np.searchsorted(sorted_values, key, side="left")
+    # Everything starting with prefix sorts before prefix with its last character bumped
+    hi = np.searchsorted(sorted_values, _key(sorted_values, prefix[:-1] + chr(ord(prefix[-1]) + 1)), side="left")
+    return ids[lo:hi]
+
+
+class InstrumentIndex:
+    """
+    In-memory search over the broker's OpenAPIScripMaster.json so the browser
+    never has to download it.
+
+    Names and symbols are indexed by 3-grams (substring matches, like the old
+    `includes` search) and kept in sorted arrays for prefix lookups. Results
+    are bucketed into EQ / FUT / OPT / Others; within a bucket exact matches
+    come first, then prefix matches, then other substring matches, shortest
+    symbol first.
+
+    The file's modification time is checked at most every `check_interval`
+    seconds. A changed file is re-indexed on a background thread and swapped
+    in when ready, so searches keep answering from the previous index. Only
+    the first load blocks a search; after a failed one, searches answer with
+    no results and the load is retried in the background every
+    `check_interval` seconds.
+    """
+
+    def __init__(self, path=None, check_interval=30):
+        self.path = path or os.getenv("SCRIP_MASTER_PATH", "OpenAPIScripMaster.json")
+        self.check_interval = check_interval
+        self._snapshot = None
+        self._mtime = None
+        self._checked = 0.0
+        self._failed_at = None   # monotonic time of the last failed load, while there is no index
+        self._loader = None
+        self._ready = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def size(self):
+        return len(self._snapshot.symbols) if self._snapshot is not None else 0
+
+    def load(self, background=False):
+        """(Re)build the index from the file, downloading the scrip master first if it is missing"""
+        with self._lock:
+            if self._loader is not None and self._loader.is_alive():
+                return
+            self._loader = threading.Thread(target=self._load, daemon=True)
+            self._loader.start()
+        if not background:
+            self._loader.join()
+
+    def _load(self):
+        try:
+            if not os.path.exists(self.path):
+                download_scrip_master(self.path)
+            mtime = os.path.getmtime(self.path)
+            start = time.perf_counter()
+            with open(self.path, encoding="utf-8") as f:
+                snapshot = _build(json.load(f))
+            self._snapshot, self._mtime = snapshot, mtime
+            self._failed_at = None
+            log.info("🔎 Indexed %d instruments in %.1fs", len(snapshot.symbols), time.perf_counter() - start)
+        except Exception as e:
+            self._failed_at = time.monotonic()
+            log.warning("⚠ Could not load the scrip master %s: %s", self.path, e)
+        finally:
+            self._ready.set()
+
+    def _current(self):
+        now = time.monotonic()
+        if self._snapshot is None:
+            if self._failed_at is None:
+                self.load()
+                self._ready.wait()
+            elif now - self._failed_at >= self.check_interval:
+                self._failed_at = now
+                self.load(background=True)
+        if now - self._checked >= self.check_interval:
+            self._checked = now
+            try:
+                if os.path.getmtime(self.path) != self._mtime:
+                    self.load(background=True)
+            except OSError:
+                pass
+        return self._snapshot
+
+    def search(self, query, symbol=None, instrument_type="", limit=20):
+        """
+        Top `limit` matches per bucket for `query` (in the name or symbol),
+        optionally narrowed to symbols containing `symbol`.
+        Returns {"EQ": [{name, symbol, token, exch_seg}, ...], "FUT": [...], ...}
+        """
+        results = {name: [] for name in CATEGORIES if not instrument_type or name == instrument_type}
+        snapshot = self._current()
+        query = (query or "").strip().upper()
+        symbol = (symbol or "").strip().upper()
+        if snapshot is None or not (query or symbol):
+            return results
+        if not query:
+            query, symbol = symbol, ""
+
+        exact = np.unique(np.concatenate([
+            _equal(snapshot.name_sorted, snapshot.name_ids, query),
+            _equal(snapshot.symbol_sorted, snapshot.symbol_ids, query),
+            _equal(snapshot.symbol_sorted, snapshot.symbol_ids, query + "-EQ"),
+        ]))
+        prefixed = np.unique(np.concatenate([
+            _prefix(snapshot.name_sorted, snapshot.name_ids, query),
+            _prefix(snapshot.symbol_sorted, snapshot.symbol_ids, query),
+        ]))
+        substring = self._candidates(snapshot, query) if len(query) >= GRAM else None
+        narrow = self._candidates(snapshot, symbol) if len(symbol) >= GRAM else None
+
+        for name in results:
+            b = CATEGORIES.index(name)
+            lo, hi = snapshot.bounds[b], snapshot.bounds[b + 1]
+            ids = []
+            # Exact matches, then prefix matches, then any other substring match
+            for pool in (exact, prefixed, substring):
+                if pool is None or len(ids) >= limit:
+                    continue
+                pool = pool[np.searchsorted(pool, lo):np.searchsorted(pool, hi)]
+                if narrow is not None:
+                    pool = np.intersect1d(pool, narrow, assume_unique=True)
+                if ids:
+                    pool = pool[~np.isin(pool, ids)]
+                ids += self._matches(snapshot, pool, query, symbol, limit - len(ids))
+            results[name] = [
+                {"name": snapshot.names[i], "symbol": snapshot.symbols[i],
+                 "token": snapshot.tokens[i], "exch_seg": snapshot.exchanges[i]}
+                for i in ids
+            ]
+        return results
+
+    @staticmethod
+    def _candidates(snapshot, query, enough=256):
+        """
+        Ids holding the query's n-grams, a superset of the substring matches.
+        Intersecting stops once few enough are left; _matches verifies the rest.
+        """
+        lists = []
+        for gram in _grams(query):
+            posting = snapshot.postings.get(gram)
+            if posting is None:
+                return np.empty(0, dtype=np.int32)
+            lists.append(posting)
+        lists.sort(key=len)
+        ids = lists[0]
+        for posting in lists[1:]:
+            if ids.size <= enough:
+                break
+            ids = np.intersect1d(ids, posting, assume_unique=True)
+        return ids
+
+    @staticmethod
+    def _matches(snapshot, ids, query, symbol, limit, chunk=512):
+        """Verify candidate ids in order until `limit` real matches are found"""
+        found = []
+        for start in range(0, len(ids), chunk):
+            part = ids[start:start + chunk]
+            ok = (np.char.find(snapshot.names[part], query) >= 0) | (np.char.find(snapshot.symbols[part], query) >= 0)
+            if symbol:
+                ok &= np.char.find(snapshot.symbols[part], symbol) >= 0
+            found.extend(part[ok].tolist())
+            if len(found) >= limit:
+                break
+        return found[:limit]
+
+
+def download_scrip_master(path):
+    """Fetch the broker's current scrip master to `path`"""
+    import requests
+
+    log.info("📥 Downloading the scrip master...")
+    response = requests.get(SCRIP_MASTER_URL, timeout=60)
+    response.raise_for_status()
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(response.content)
+    os.replace(tmp, path)
@@ -0,0 +1,152 @@
+import atexit
+import contextlib
+import contextvars
+import copy
+import datetime
+import json
+import logging
+import os
+import queue
+import sys
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+LOG_DIR = os.getenv("LOG_DIR", "logs")
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+
+# Per-symbol fields (symbol, token, exchange, strategy_id) attached to every record logged inside log_context()
+_context = contextvars.ContextVar("log_context", default={})
+
+# LogRecord attributes that are not user fields
+_RESERVED = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+_listener = None
+
+
+@contextlib.contextmanager
+def log_context(**fields):
+    """Attach fields to every record logged in this block (and this thread/context only)"""
+    token = _context.set({**_context.get(), **fields})
+    try:
+        yield
+    finally:
+        _context.reset(token)
+
+
+class ContextFilter(logging.Filter):
+    """Copies the current log_context() fields onto the record, in the thread that logs it"""
+
+    def filter(self, record):
+        for key, value in _context.get().items():
+            if not hasattr(record, key):
+                setattr(record, key, value)
+        return True
+
+
+class _QueueHandler(QueueHandler):
+    """Like QueueHandler, but keeps the traceback as its own `exc` field instead of folding it into the message"""
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg, record.args = record.getMessage(), None
+        if record.exc_info:
+            record.exc = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = record.exc_text = None
+        return record
+
+
+class ConsoleFormatter(logging.Formatter):
+    """The plain message, followed by the traceback if there is one"""
+
+    def format(self, record):
+        message = record.getMessage()
+        exc = getattr(record, "exc", None)
+        return f"{message}\n{exc}" if exc else message
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message, context and extra= fields"""
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RESERVED and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class DailyRotatingFileHandler(RotatingFileHandler):
+    """Writes <root>/<YYYY-MM-DD>/<filename>, moving to a new date directory at midnight and rotating by size within a day"""
+
+    def __init__(self, root=LOG_DIR, filename="app.jsonl", max_bytes=20 * 1024 * 1024, backup_count=10):
+        self.root = root
+        self.filename = filename
+        self.day = datetime.date.today()
+        super().__init__(self._path(self.day), maxBytes=max_bytes, backupCount=backup_count,
+                         encoding="utf-8", delay=True)
+
+    def _path(self, day):
+        directory = os.path.join(self.root, day.isoformat())
+        os.makedirs(directory, exist_ok=True)
+        return os.path.join(directory, self.filename)
+
+    def shouldRollover(self, record):
+        if datetime.date.today() != self.day:
+            return True
+        return super().shouldRollover(record)
+
+    def doRollover(self):
+        today = datetime.date.today()
+        if today == self.day:
+            return super().doRollover()
+        if self.stream:
+            self.stream.close()
+            self.stream = None
+        self.day = today
+        self.baseFilename = os.path.abspath(self._path(today))
+
+
+def setup_logging(level=None, log_dir=None, console=True):
+    """
+    Route all logging through a queue to a background listener that writes
+    JSON lines under <log_dir>/<date>/ and plain messages to stdout.
+    Callers only pay for putting the record on the queue; anything below
+    `level` is dropped before any formatting. Safe to call more than once.
+    """
+    global _listener
+    root = logging.getLogger()
+    level = level or LOG_LEVEL
+    root.setLevel(level.upper() if isinstance(level, str) else level)
+    if _listener is not None:
+        return root
+
+    handlers = [DailyRotatingFileHandler(root=log_dir or LOG_DIR)]
+    handlers[0].setFormatter(JsonFormatter())
+    if console:
+        stream = logging.StreamHandler(sys.stdout)
+        stream.setFormatter(ConsoleFormatter())
+        handlers.append(stream)
+
+    records = queue.SimpleQueue()
+    queue_handler = _QueueHandler(records)
+    queue_handler.addFilter(ContextFilter())
+    root.addHandler(queue_handler)
+
+    _listener = QueueListener(records, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+    return root
+
+
+def shutdown_logging():
+    """Flush the queue and stop the listener thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
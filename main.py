@@ -1,24 +1,76 @@
-from flask import Flask, request, jsonify, session,render_template
-import threading
-from Live_trading_with_Supertrend_ultra_final_lite import topgun
+from flask import Flask, Response, request, jsonify, session,render_template
 from flask_cors import CORS
+import logging
 import os
+import sys
+import threading
 from dotenv import load_dotenv
 load_dotenv()
 
+from log_config import setup_logging
+
+log = logging.getLogger(__name__)
+
+# The trading stack (pandas, numpy, the broker client, charts) is imported on
+# first use, so the web server starts with little more than Flask loaded
+
 app = Flask(__name__)
 CORS(app)  # Enable CORS for cross-origin requests
-global stop_flag
-# stop_flag = False 
-
-# Function to start trading in a separate thread
-def start_trading(trading_symbol, symbol_token, exchange, quantity,):
-    global stop_flag
- # Reset stop flag when starting
-    stop_flag = False
-    trade_thread = threading.Thread(target=topgun, args=(trading_symbol, symbol_token, exchange, quantity))
-    trade_thread.start()
-    return trade_thread
+
+# One engine (one login, one polling loop) shared by every symbol, created by the first strategy
+# MARKET_DATA_MODE=stream switches from 60s quote polling to the WebSocket tick feed
+engine = None
+instruments = None
+_lazy_lock = threading.Lock()
+
+def get_engine():
+    global engine
+    with _lazy_lock:
+        if engine is None:
+            setup_logging()
+            from trading_engine import TradingEngine
+            engine = TradingEngine(market_data=os.getenv("MARKET_DATA_MODE", "poll"))
+    return engine
+
+# Scrip master search index, built by the first search (or in the background by app.run below)
+def get_instruments():
+    global instruments
+    with _lazy_lock:
+        if instruments is None:
+            from instrument_index import InstrumentIndex
+            instruments = InstrumentIndex()
+    return instruments
+
+# Register the symbol with the shared engine and make sure its loop is running
+# Returns (strategy, None), or (None, reason) when the engine is at capacity
+def start_trading(trading_symbol, symbol_token, exchange, quantity, **strategy_kwargs):
+    from trading_engine import CapacityError
+
+    engine = get_engine()
+    try:
+        strategy = engine.add_symbol(trading_symbol, symbol_token, exchange, quantity, **strategy_kwargs)
+    except CapacityError as e:
+        return None, str(e)
+    engine.start()
+    return strategy, None
+
+# Start the engine at once if a previous run left strategies running; it resumes them
+# (positions, open orders and candles) from the state journal
+def resume_trading():
+    engine = get_engine()
+    symbols = engine.saved_symbols()
+    if symbols:
+        log.info("♻ Resuming %d saved strategies: %s", len(symbols), ", ".join(symbols))
+        engine.start()
+
+# Stop one strategy, and the engine (loop + broker session) once none are left
+def stop_trading(strategy_id):
+    if engine is None:
+        return None
+    strategy = engine.remove(strategy_id)
+    if strategy is not None and not engine.strategies:
+        engine.stop(timeout=5)
+    return strategy
 
 app.secret_key = os.getenv("SECRET_KEY", "your_secret_key")  # Replace with a secure key
 
@@ -33,10 +85,7 @@ def login():
     data = request.json
     username = data.get('username')
     password = data.get('password')
-    print(username)
-    print(USERNAME)
-    print(password)
-    print(PASSWORD)
+    log.debug("Login attempt for %s", username)
 
     if username == USERNAME and password == PASSWORD:
         session['user'] = username  # Store user in session
@@ -51,10 +100,25 @@ def dashboard():
     else:
         return jsonify({"message": "Unauthorized"}), 401
 
+@app.route("/search_instruments", methods=["GET"])
+def search_instruments():
+    """Top matches per instrument bucket (EQ/FUT/OPT/Others) for a name or symbol query."""
+    try:
+        limit = min(max(int(request.args.get("limit", 20)), 1), 100)
+    except ValueError:
+        return jsonify({"error": "limit must be a number"}), 400
+
+    results = get_instruments().search(
+        request.args.get("q", ""),
+        symbol=request.args.get("symbol"),
+        instrument_type=request.args.get("type", ""),
+        limit=limit,
+    )
+    return jsonify(results), 200
+
 @app.route("/apply_supertrend", methods=["POST"])
 def apply_supertrend():
     """API endpoint to trigger the Supertrend calculation."""
-    global stop_flag
     
     try:
         # Ensure the request contains JSON
@@ -74,36 +138,147 @@ def apply_supertrend():
         if not all([trading_symbol, symbol_token, quantity]):
             return jsonify({"error": "Missing required parameters"}), 400
 
-        # Run the trading function in a separate thread
-        # thread = threading.Thread(target=topgun, args=(trading_symbol, symbol_token, exchange, quantity))
-        # thread.start()
-        start_trading(trading_symbol, symbol_token, exchange, quantity)
+        # Add the symbol to the shared trading engine
+        strategy, error = start_trading(trading_symbol, symbol_token, exchange, quantity)
+        if strategy is None:
+            return jsonify({"error": error}), 429
 
         return jsonify({
             "message": "Supertrend strategy applied successfully",
             "trading_symbol": trading_symbol,
-            "symbol_token": symbol_token
+            "symbol_token": symbol_token,
+            "strategy_id": strategy.id
         }), 200
 
     except Exception as e:
-        print(f"Error in apply_supertrend: {str(e)}")
+        log.exception("Error in apply_supertrend: %s", e)
         return jsonify({"error": f"An unexpected error occurred: {str(e)}"}), 500
 
 @app.route("/stop_supertrend", methods=["POST"])
 def stop_supertrend():
+    """Stop one symbol (if a symboltoken is given) or the whole trading engine."""
+    data = request.get_json(silent=True) or {}
+    symbol_token = data.get("symboltoken")
+
+    if engine is None:
+        return jsonify({"message": "Supertrend trading is not running"}), 200
 
-    #Still pending to put logic inside this api, which can break the running topgun() function.??
-    """Stop the currently running trade."""
-    global stop_flag
-    stop_flag = True  # Set flag to stop the running trade
+    if symbol_token:
+        strategies = engine.find(symbol_token, data.get("exchange", "NSE"))
+        if not strategies:
+            return jsonify({"error": f"Symbol {symbol_token} is not running"}), 404
+        for strategy in strategies:  # Every candle size and variant running on it
+            stop_trading(strategy.id)
+        return jsonify({"message": f"Supertrend trading stopped for {strategies[0].trading_symbol}"}), 200
+
+    engine.remove_all()
+    engine.stop(timeout=5)  # Stops the polling loop and logs out
     return jsonify({"message": "Supertrend trading stopped"}), 200
 
+@app.route("/strategies", methods=["POST"])
+def start_strategy():
+    """Start a strategy (Supertrend unless "strategy" names another); returns at once while its history loads."""
+    data = request.get_json(silent=True) or {}
+    trading_symbol = data.get("tradingsymbol")
+    symbol_token = data.get("symboltoken")
+    quantity = data.get("quantity")
+    if not all([trading_symbol, symbol_token, quantity]):
+        return jsonify({"error": "Missing required parameters"}), 400
+
+    strategy_kwargs = {}
+    try:
+        if "length" in data:
+            strategy_kwargs["length"] = int(data["length"])
+        if "multiplier" in data:
+            strategy_kwargs["multiplier"] = float(data["multiplier"])
+    except (TypeError, ValueError):
+        return jsonify({"error": "length and multiplier must be numbers"}), 400
+    # Any of ONE_MINUTE ... ONE_HOUR, ONE_DAY; every size of one symbol is built from the same 1-minute prices
+    if "candle_size" in data:
+        from Live_trading_with_Supertrend_ultra_final_lite import CANDLE_SIZE_MINUTES
+        if data["candle_size"] not in CANDLE_SIZE_MINUTES:
+            return jsonify({"error": f"candle_size must be one of {', '.join(CANDLE_SIZE_MINUTES)}"}), 400
+        strategy_kwargs["candle_size"] = data["candle_size"]
+    # A registered strategy and its parameters, e.g. {"strategy": "supertrend_atr", "params": {"min_atr_pct": 0.1}};
+    # variants of one symbol and candle size share candles and every indicator they have in common
+    if "strategy" in data:
+        from strategies import make_strategy
+        try:
+            strategy_kwargs["strategy"] = make_strategy(data["strategy"], **(data.get("params") or {}))
+        except (TypeError, ValueError) as e:
+            return jsonify({"error": f"Invalid strategy: {e}"}), 400
+
+    strategy, error = start_trading(trading_symbol, symbol_token, data.get("exchange", "NSE"), quantity,
+                                    **strategy_kwargs)
+    if strategy is None:
+        return jsonify({"error": error}), 429
+    return jsonify(strategy.status()), 202
+
+@app.route("/strategies", methods=["GET"])
+def list_strategies():
+    if engine is None:
+        return jsonify({"engine": {"running": False}, "strategies": []}), 200
+    return jsonify({
+        "engine": engine.status(),
+        "strategies": [strategy.status() for strategy in engine.snapshot()]
+    }), 200
+
+@app.route("/strategies/<strategy_id>", methods=["GET"])
+def strategy_status(strategy_id):
+    strategy = engine.get(strategy_id) if engine is not None else None
+    if strategy is None:
+        return jsonify({"error": f"No strategy {strategy_id}"}), 404
+    return jsonify(strategy.status()), 200
+
+@app.route("/strategies/<strategy_id>", methods=["DELETE"])
+def stop_strategy(strategy_id):
+    strategy = stop_trading(strategy_id)
+    if strategy is None:
+        return jsonify({"error": f"No strategy {strategy_id}"}), 404
+    return jsonify(strategy.status()), 200
+
+@app.route("/charts", methods=["GET"])
+def charts():
+    """Current chart data for every running symbol (candles + Supertrend line)."""
+    if engine is None:
+        return jsonify({}), 200
+    return jsonify(engine.charts.charts()), 200
+
+@app.route("/charts/stream", methods=["GET"])
+def chart_stream():
+    """Server-sent events: a snapshot per symbol, then only new or changed bars."""
+    if engine is None:
+        return "", 204  # Nothing running; EventSource stops retrying until the page opens it again
+    return Response(engine.charts.stream(), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.route("/orders", methods=["GET"])
+def list_orders():
+    """The newest orders the engine placed (?limit=, default 100) and their broker status."""
+    try:
+        limit = max(1, min(int(request.args.get("limit", 100)), 1000))
+    except ValueError:
+        return jsonify({"error": "limit must be a number"}), 400
+    if engine is None:
+        return jsonify({"orders": []}), 200
+    return jsonify({"orders": [order.status_dict() for order in engine.orders.orders(limit)]}), 200
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    """Prometheus scrape target: hot-path timings per symbol, order counts and broker API retries/errors."""
+    body = engine.metrics() if engine is not None else ""
+    return Response(body, mimetype="text/plain; version=0.0.4")
+
 @app.route('/')
 def home():
     return "Trading Bot is Running!"
 
 
 if __name__ == "__main__":
+    sys.stdout.reconfigure(encoding='utf-8')
+    setup_logging()
+    threading.Thread(target=lambda: get_instruments().load(), name="instrument-index", daemon=True).start()
+    threading.Thread(target=resume_trading, name="resume", daemon=True).start()
     app.run(host="0.0.0.0", port=5000)
 # if __name__ == "__main__":
 #     app.run(debug=True, port=5000)  # Changed port to avoid conflict
@@ -0,0 +1,366 @@
+import base64
+import hashlib
+import json
+import logging
+import os
+import socket
+import struct
+import threading
+import time
+from collections import namedtuple
+
+log = logging.getLogger(__name__)
+
+FEED_URL = "wss://smartapisocket.angelone.in/smart-stream"
+HEARTBEAT_SECONDS = 10
+
+# SmartAPI WebSocket 2.0 subscription modes and exchange types
+MODE_LTP = 1
+MODE_QUOTE = 2
+MODE_SNAP_QUOTE = 3
+
+EXCHANGE_TYPES = {
+    "NSE": 1,
+    "NFO": 2,
+    "BSE": 3,
+    "BFO": 4,
+    "MCX": 5,
+    "NCX": 7,
+    "CDS": 13,
+}
+EXCHANGE_NAMES = {code: name for name, code in EXCHANGE_TYPES.items()}
+
+# Binary tick layout (little endian). Prices are in paise.
+_HEADER = struct.Struct("<bb25sqqq")      # mode, exchange type, token, sequence, exchange time (ms), ltp
+_QUOTE = struct.Struct("<qqqddqqqq")      # last qty, avg price, day volume, buy qty, sell qty, open, high, low, close
+LTP_PACKET_SIZE = _HEADER.size            # 51
+QUOTE_PACKET_SIZE = LTP_PACKET_SIZE + _QUOTE.size  # 123
+
+Tick = namedtuple(
+    "Tick",
+    ["exchange", "token", "sequence", "timestamp_ms", "ltp", "volume", "open", "high", "low", "close"]
+)
+
+
+def decode_tick(buf):
+    """
+    Decode one binary tick from the feed. Reads straight out of the received
+    buffer with struct.unpack_from, no intermediate slices.
+    """
+    mode, exchange_type, raw_token, sequence, timestamp_ms, ltp = _HEADER.unpack_from(buf, 0)
+    token = raw_token.split(b"\0", 1)[0].decode("ascii")
+    exchange = EXCHANGE_NAMES.get(exchange_type, str(exchange_type))
+
+    if mode >= MODE_QUOTE and len(buf) >= QUOTE_PACKET_SIZE:
+        _, _, volume, _, _, open_, high, low, close = _QUOTE.unpack_from(buf, LTP_PACKET_SIZE)
+        return Tick(exchange, token, sequence, timestamp_ms, ltp / 100.0, volume,
+                    open_ / 100.0, high / 100.0, low / 100.0, close / 100.0)
+
+    price = ltp / 100.0
+    return Tick(exchange, token, sequence, timestamp_ms, price, 0, price, price, price, price)
+
+
+def encode_tick(exchange, token, ltp, timestamp_ms=None, sequence=0, volume=0,
+                open_=None, high=None, low=None, close=None):
+    """Build a quote-mode binary tick (used by the replay server and for recordings)"""
+    if timestamp_ms is None:
+        timestamp_ms = int(time.time() * 1000)
+    to_paise = lambda price: int(round((ltp if price is None else price) * 100))
+    header = _HEADER.pack(MODE_QUOTE, EXCHANGE_TYPES.get(exchange, 1), str(token).encode("ascii"),
+                          sequence, timestamp_ms, to_paise(ltp))
+    quote = _QUOTE.pack(0, to_paise(ltp), volume, 0.0, 0.0,
+                        to_paise(open_), to_paise(high), to_paise(low), to_paise(close))
+    return header + quote
+
+
+class MarketFeed:
+    """
+    Streaming market data over the SmartAPI WebSocket 2.0 feed.
+
+    Runs the socket on a background thread, keeps the connection alive with
+    the text "ping" heartbeat, resubscribes after reconnects and calls
+    on_tick(Tick) for every decoded packet. Pass record_to to append the raw
+    frames to a file that ReplayServer can play back.
+    """
+
+    def __init__(self, on_tick, auth_token=None, api_key=None, client_code=None, feed_token=None,
+                 url=None, mode=MODE_QUOTE, record_to=None, reconnect_delay=2):
+        self.on_tick = on_tick
+        self.url = url or os.getenv("ANGELONE_FEED_URL") or FEED_URL
+        self.mode = mode
+        self.reconnect_delay = reconnect_delay
+        self.headers = {
+            "Authorization": f"Bearer {auth_token}" if auth_token else "",
+            "x-api-key": api_key or "",
+            "x-client-code": client_code or "",
+            "x-feed-token": feed_token or "",
+        }
+        self.tokens = {}
+        self.connected = False
+        self.ticks = 0
+        self._ws = None
+        self._thread = None
+        self._stop_event = threading.Event()
+        self._lock = threading.Lock()
+        self._record = open(record_to, "ab") if record_to else None
+
+    def set_tokens(self, auth_token, feed_token):
+        """New session tokens, used from the next (re)connect on"""
+        self.headers = {**self.headers, "Authorization": f"Bearer {auth_token}" if auth_token else "",
+                        "x-feed-token": feed_token or ""}
+
+    def subscribe(self, instruments):
+        """Subscribe (exchange, symbol_token) pairs; safe to call while connected"""
+        added = {}
+        with self._lock:
+            for exchange, symbol_token in instruments:
+                tokens = self.tokens.setdefault(exchange, set())
+                if str(symbol_token) not in tokens:
+                    tokens.add(str(symbol_token))
+                    added.setdefault(exchange, []).append(str(symbol_token))
+        if added and self.connected:
+            self._send_subscription(added, action=1)
+
+    def unsubscribe(self, instruments):
+        removed = {}
+        with self._lock:
+            for exchange, symbol_token in instruments:
+                if str(symbol_token) in self.tokens.get(exchange, ()):
+                    self.tokens[exchange].discard(str(symbol_token))
+                    removed.setdefault(exchange, []).append(str(symbol_token))
+        if removed and self.connected:
+            self._send_subscription(removed, action=0)
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return self._thread
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="market-feed", daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def stop(self):
+        self._stop_event.set()
+        if self._ws is not None:
+            self._ws.close()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(5)
+        if self._record is not None:
+            self._record.close()
+            self._record = None
+
+    def _run(self):
+        import websocket  # websocket-client, installed with smartapi-python
+
+        while not self._stop_event.is_set():
+            self._ws = websocket.WebSocketApp(
+                self.url,
+                header=self.headers,
+                on_open=self._on_open,
+                on_message=self._on_message,
+                on_error=lambda ws, error: log.warning("⚠ Market feed error: %s", error),
+                on_close=self._on_close,
+            )
+            self._ws.run_forever()
+            self.connected = False
+            if not self._stop_event.is_set():
+                log.warning("⚠ Market feed disconnected, reconnecting in %ss", self.reconnect_delay)
+                self._stop_event.wait(self.reconnect_delay)
+
+    def _on_open(self, ws):
+        self.connected = True
+        log.info("✅ Market feed connected")
+        with self._lock:
+            tokens = {exchange: list(tokens) for exchange, tokens in self.tokens.items() if tokens}
+        if tokens:
+            self._send_subscription(tokens, action=1)
+        threading.Thread(target=self._heartbeat, args=(ws,), daemon=True).start()
+
+    def _on_close(self, ws, status_code=None, message=None):
+        self.connected = False
+
+    def _heartbeat(self, ws):
+        while self.connected and ws is self._ws and not self._stop_event.wait(HEARTBEAT_SECONDS):
+            try:
+                ws.send("ping")
+            except Exception:
+                return
+
+    def _send_subscription(self, tokens_by_exchange, action):
+        request = {
+            "correlationID": "topgun",
+            "action": action,
+            "params": {
+                "mode": self.mode,
+                "tokenList": [
+                    {"exchangeType": EXCHANGE_TYPES[exchange], "tokens": tokens}
+                    for exchange, tokens in tokens_by_exchange.items()
+                ],
+            },
+        }
+        try:
+            self._ws.send(json.dumps(request))
+        except Exception as e:
+            log.warning("⚠ Market feed subscription failed: %s", e)
+
+    def _on_message(self, ws, message):
+        if isinstance(message, str):  # "pong" and error replies
+            return
+        if len(message) < LTP_PACKET_SIZE:
+            return
+        if self._record is not None:
+            self._record.write(struct.pack("<I", len(message)))
+            self._record.write(message)
+        try:
+            tick = decode_tick(message)
+        except struct.error as e:
+            log.warning("⚠ Could not decode tick: %s", e)
+            return
+        self.ticks += 1
+        self.on_tick(tick)
+
+
+def load_recording(path):
+    """Read frames written by MarketFeed(record_to=...)"""
+    frames = []
+    with open(path, "rb") as f:
+        data = f.read()
+    offset = 0
+    while offset + 4 <= len(data):
+        (size,) = struct.unpack_from("<I", data, offset)
+        frames.append(data[offset + 4:offset + 4 + size])
+        offset += 4 + size
+    return frames
+
+
+class ReplayServer:
+    """
+    Local WebSocket server that plays recorded (or synthetic) tick frames to
+    any client that connects, paced by the frames' exchange timestamps and
+    sped up by `speed`. Lets the streaming mode run offline:
+
+        server = ReplayServer(load_recording("ticks.bin"), speed=100)
+        url = server.start()   # pass as MarketFeed(url=...) or ANGELONE_FEED_URL
+    """
+
+    _GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+    def __init__(self, frames, speed=1.0, host="127.0.0.1", port=0, wait_for_subscribe=True):
+        self.frames = list(frames)
+        self.speed = float(speed)
+        self.wait_for_subscribe = wait_for_subscribe
+        self._server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._server.bind((host, port))
+        self._server.listen()
+        self.host, self.port = self._server.getsockname()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    @property
+    def url(self):
+        return f"ws://{self.host}:{self.port}/smart-stream"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._accept_loop, name="replay-server", daemon=True)
+        self._thread.start()
+        return self.url
+
+    def stop(self):
+        self._stop_event.set()
+        try:
+            self._server.close()
+        except OSError:
+            pass
+
+    def _accept_loop(self):
+        while not self._stop_event.is_set():
+            try:
+                conn, _ = self._server.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    def _serve(self, conn):
+        try:
+            if not self._handshake(conn):
+                return
+            if self.wait_for_subscribe:
+                while True:
+                    opcode, payload = self._recv_frame(conn)
+                    if opcode == 0x8:
+                        return
+                    if opcode == 0x1 and payload != b"ping":
+                        break
+            previous_ts = None
+            for frame in self.frames:
+                if self._stop_event.is_set():
+                    return
+                (timestamp_ms,) = struct.unpack_from("<q", frame, 35)
+                if previous_ts is not None and self.speed > 0:
+                    delay = (timestamp_ms - previous_ts) / 1000.0 / self.speed
+                    if delay > 0:
+                        time.sleep(delay)
+                previous_ts = timestamp_ms
+                self._send_frame(conn, frame, opcode=0x2)
+            self._send_frame(conn, b"", opcode=0x8)
+        except (OSError, ConnectionError):
+            pass
+        finally:
+            conn.close()
+
+    def _handshake(self, conn):
+        request = b""
+        while b"\r\n\r\n" not in request:
+            chunk = conn.recv(4096)
+            if not chunk:
+                return False
+            request += chunk
+        key = None
+        for line in request.decode("latin-1").split("\r\n"):
+            if line.lower().startswith("sec-websocket-key:"):
+                key = line.split(":", 1)[1].strip()
+        if key is None:
+            return False
+        accept = base64.b64encode(hashlib.sha1((key + self._GUID).encode()).digest()).decode()
+        conn.sendall((
+            "HTTP/1.1 101 Switching Protocols\r\n"
+            "Upgrade: websocket\r\n"
+            "Connection: Upgrade\r\n"
+            f"Sec-WebSocket-Accept: {accept}\r\n\r\n"
+        ).encode())
+        return True
+
+    @staticmethod
+    def _recv_exact(conn, size):
+        data = b""
+        while len(data) < size:
+            chunk = conn.recv(size - len(data))
+            if not chunk:
+                raise ConnectionError("client closed the connection")
+            data += chunk
+        return data
+
+    def _recv_frame(self, conn):
+        first, second = self._recv_exact(conn, 2)
+        size = second & 0x7F
+        if size == 126:
+            (size,) = struct.unpack(">H", self._recv_exact(conn, 2))
+        elif size == 127:
+            (size,) = struct.unpack(">Q", self._recv_exact(conn, 8))
+        mask = self._recv_exact(conn, 4) if second & 0x80 else None
+        payload = self._recv_exact(conn, size)
+        if mask:
+            payload = bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+        return first & 0x0F, payload
+
+    @staticmethod
+    def _send_frame(conn, payload, opcode=0x2):
+        size = len(payload)
+        if size < 126:
+            header = struct.pack(">BB", 0x80 | opcode, size)
+        elif size < 65536:
+            header = struct.pack(">BBH", 0x80 | opcode, 126, size)
+        else:
+            header = struct.pack(">BBQ", 0x80 | opcode, 127, size)
+        conn.sendall(header + payload)
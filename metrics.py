@@ -0,0 +1,103 @@
+import bisect
+import threading
+
+# Latency bucket upper bounds in milliseconds
+DEFAULT_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+class LatencyHistogram:
+    """Thread-safe fixed-bucket latency histogram (cumulative counts, Prometheus style)"""
+
+    def __init__(self, buckets_ms=DEFAULT_BUCKETS_MS):
+        self.buckets_ms = tuple(buckets_ms)
+        self._counts = [0] * (len(self.buckets_ms) + 1)  # last slot is +Inf
+        self._sum_ms = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value_ms):
+        slot = bisect.bisect_left(self.buckets_ms, value_ms)
+        with self._lock:
+            self._counts[slot] += 1
+            self._sum_ms += value_ms
+            self._count += 1
+
+    @property
+    def count(self):
+        return self._count
+
+    def quantile(self, q):
+        """Approximate quantile (upper bound of the bucket it falls in)"""
+        with self._lock:
+            counts = list(self._counts)
+            total = self._count
+        if total == 0:
+            return None
+        rank = q * total
+        running = 0
+        for bound, count in zip(self.buckets_ms + (float("inf"),), counts):
+            running += count
+            if running >= rank:
+                return bound
+        return float("inf")
+
+    def snapshot(self):
+        with self._lock:
+            counts = list(self._counts)
+            total, total_ms = self._count, self._sum_ms
+        cumulative, running = {}, 0
+        for bound, count in zip(self.buckets_ms + (float("inf"),), counts):
+            running += count
+            cumulative["+Inf" if bound == float("inf") else bound] = running
+        return {
+            "count": total,
+            "sum_ms": round(total_ms, 3),
+            "avg_ms": round(total_ms / total, 3) if total else None,
+            "p50_ms": self.quantile(0.5),
+            "p99_ms": self.quantile(0.99),
+            "buckets": cumulative,
+        }
+
+# Finer buckets for in-process (CPU) spans, which mostly take microseconds
+CPU_BUCKETS_MS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 100)
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+               for value in labels.values())
+    return "{" + ",".join(f'{key}="{value}"' for key, value in zip(labels, escaped)) + "}"
+
+
+class PrometheusText:
+    """Collects samples grouped by metric family and renders the Prometheus text exposition format"""
+
+    def __init__(self):
+        self._families = {}  # name -> (type, help, sample lines)
+
+    def _family(self, name, kind, help_text):
+        return self._families.setdefault(name, (kind, help_text, []))[2]
+
+    def counter(self, name, help_text, value, **labels):
+        self._family(name, "counter", help_text).append(f"{name}{_labels(labels)} {value}")
+
+    def gauge(self, name, help_text, value, **labels):
+        self._family(name, "gauge", help_text).append(f"{name}{_labels(labels)} {value}")
+
+    def histogram(self, name, help_text, snapshot, **labels):
+        """Add a LatencyHistogram.snapshot()"""
+        lines = self._family(name, "histogram", help_text)
+        for bound, count in snapshot["buckets"].items():
+            le = bound if bound == "+Inf" else f"{bound:g}"
+            lines.append(f"{name}_bucket{_labels({**labels, 'le': le})} {count}")
+        lines.append(f"{name}_sum{_labels(labels)} {snapshot['sum_ms']}")
+        lines.append(f"{name}_count{_labels(labels)} {snapshot['count']}")
+
+    def render(self):
+        out = []
+        for name, (kind, help_text, lines) in self._families.items():
+            out.append(f"# HELP {name} {help_text}")
+            out.append(f"# TYPE {name} {kind}")
+            out.extend(lines)
+        return "\n".join(out) + "\n"
@@ -0,0 +1,164 @@
+import argparse
+import itertools
+import logging
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+from backtest import load_candles, supertrend_signals, trades_from_signals
+from candle_builder import resample_arrays
+
+log = logging.getLogger(__name__)
+
+# max_closed_drawdown is the deepest fall of closed-trade P&L from its peak (starting at 0), not the
+# mark-to-market max_drawdown backtest.py reports, which also counts open trades' swings
+RESULT_COLUMNS = [
+    "length", "multiplier", "candle_minutes", "risk_reward",
+    "trades", "net_pnl", "win_rate", "profit_factor", "max_closed_drawdown",
+]
+
+# Set in each worker by _attach(): the base candles, read straight out of shared memory
+_shared = {}
+
+
+def _attach(price_name, time_name, bars):
+    price_shm = shared_memory.SharedMemory(name=price_name)
+    time_shm = shared_memory.SharedMemory(name=time_name)
+    prices = np.ndarray((5, bars), dtype=np.float64, buffer=price_shm.buf)
+    _shared.update(
+        segments=(price_shm, time_shm),  # Keep the mappings alive for the worker's lifetime
+        times=np.ndarray((bars,), dtype=np.int64, buffer=time_shm.buf),
+        prices=prices,
+        resampled={},
+    )
+
+
+def _candles(candle_minutes):
+    """High/low/close for a candle size, resampled once per worker from the shared 1-minute base"""
+    cached = _shared["resampled"].get(candle_minutes)
+    if cached is None:
+        open_, high, low, close, volume = _shared["prices"]
+        if candle_minutes <= 1:
+            cached = (high, low, close)
+        else:
+            _, _, high, low, close, _ = resample_arrays(_shared["times"], open_, high, low, close, volume, candle_minutes)
+            cached = (high, low, close)
+        _shared["resampled"][candle_minutes] = cached
+    return cached
+
+
+def _evaluate(candle_minutes, length, multiplier, risk_rewards):
+    """One Supertrend run, then the state machine for every SL/TP ratio that shares it"""
+    high, low, close = _candles(candle_minutes)
+    _, is_buy, change = supertrend_signals(high, low, close, length, multiplier)
+    rows = []
+    for risk_reward in risk_rewards:
+        pnl = np.array([trade[-1] for trade in trades_from_signals(high, low, close, is_buy, change, risk_reward)])
+        equity = np.concatenate(([0.0], np.cumsum(pnl)))
+        losses = -pnl[pnl < 0].sum()
+        rows.append((
+            length, multiplier, candle_minutes, risk_reward,
+            int(pnl.size),
+            float(pnl.sum()),
+            float((pnl > 0).mean()) if pnl.size else 0.0,
+            float(pnl[pnl > 0].sum() / losses) if losses > 0 else float("inf"),
+            float((equity - np.maximum.accumulate(equity)).min()),
+        ))
+    return rows
+
+
+def grid(lengths, multipliers, candle_minutes=(1,), risk_rewards=(2.0,)):
+    return list(itertools.product(candle_minutes, lengths, multipliers, risk_rewards))
+
+
+def random_search(samples, length_range=(5, 30), multiplier_range=(1.0, 4.0),
+                  candle_minutes=(1, 5, 15), risk_reward_range=(1.0, 3.0), seed=None):
+    rng = random.Random(seed)
+    return [
+        (rng.choice(candle_minutes),
+         rng.randint(*length_range),
+         round(rng.uniform(*multiplier_range), 2),
+         round(rng.uniform(*risk_reward_range), 2))
+        for _ in range(samples)
+    ]
+
+
+def optimize(df, combos, max_workers=None, rank_by="net_pnl"):
+    """
+    Backtest every (candle_minutes, length, multiplier, risk_reward) combo
+    on a 1-minute OHLCV DataFrame across a process pool. The price arrays go
+    into shared memory once; workers map them instead of unpickling frames.
+    Returns a DataFrame ranked by `rank_by` (best first).
+    """
+    index = df.index
+    if index.tz is None:
+        index = index.tz_localize("Asia/Kolkata")
+    times = index.tz_convert("UTC").asi8
+    prices = df[["open", "high", "low", "close", "volume"]].to_numpy(dtype=np.float64).T
+    bars = times.size
+
+    # Combos that differ only in risk_reward share one Supertrend run
+    tasks = {}
+    for candle_minutes, length, multiplier, risk_reward in combos:
+        tasks.setdefault((candle_minutes, length, multiplier), []).append(risk_reward)
+
+    price_shm = shared_memory.SharedMemory(create=True, size=prices.nbytes)
+    time_shm = shared_memory.SharedMemory(create=True, size=times.nbytes)
+    try:
+        np.ndarray(prices.shape, dtype=np.float64, buffer=price_shm.buf)[:] = prices
+        np.ndarray(times.shape, dtype=np.int64, buffer=time_shm.buf)[:] = times
+
+        rows = []
+        with ProcessPoolExecutor(max_workers=max_workers or os.cpu_count(), initializer=_attach,
+                                 initargs=(price_shm.name, time_shm.name, bars)) as pool:
+            futures = [pool.submit(_evaluate, *key, risk_rewards) for key, risk_rewards in tasks.items()]
+            for done, future in enumerate(as_completed(futures), 1):
+                rows.extend(future.result())
+                if done % 50 == 0 or done == len(futures):
+                    log.info("🔍 %d/%d Supertrend settings evaluated", done, len(futures))
+    finally:
+        price_shm.close()
+        price_shm.unlink()
+        time_shm.close()
+        time_shm.unlink()
+
+    results = pd.DataFrame(rows, columns=RESULT_COLUMNS)
+    return results.sort_values(rank_by, ascending=False, ignore_index=True)
+
+
+def _floats(text):
+    return [float(value) for value in text.split(",")]
+
+
+def _ints(text):
+    return [int(value) for value in text.split(",")]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sweep Supertrend parameters over 1-minute candles")
+    parser.add_argument("csv", help="1-minute OHLCV CSV with date, open, high, low, close, volume columns")
+    parser.add_argument("--lengths", type=_ints, default=list(range(5, 31)))
+    parser.add_argument("--multipliers", type=_floats, default=[1.0, 1.5, 2.0, 2.5, 3.0, 3.5, 4.0])
+    parser.add_argument("--candles", type=_ints, default=[1, 5, 15])
+    parser.add_argument("--risk-rewards", type=_floats, default=[1.0, 1.5, 2.0, 3.0])
+    parser.add_argument("--random", type=int, default=0, help="Sample this many random combos instead of the grid")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--rank-by", default="net_pnl", choices=RESULT_COLUMNS[4:])
+    parser.add_argument("--out", default="sweep_results.csv")
+    args = parser.parse_args()
+
+    if args.random:
+        combos = random_search(args.random, candle_minutes=args.candles)
+    else:
+        combos = grid(args.lengths, args.multipliers, args.candles, args.risk_rewards)
+
+    from log_config import setup_logging
+    setup_logging()
+
+    results = optimize(load_candles(args.csv), combos, max_workers=args.workers, rank_by=args.rank_by)
+    results.to_csv(args.out, index=False)
+    print(results.head(20).to_string())
@@ -0,0 +1,440 @@
+import datetime
+import hashlib
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+log = logging.getLogger(__name__)
+
+# Order.status values
+PENDING = "pending"        # Queued, not sent yet
+SENT = "sent"              # Sent, but the broker's answer was lost; resolved from the order book
+OPEN = "open"              # Accepted by the broker, not (fully) filled
+COMPLETE = "complete"
+REJECTED = "rejected"
+CANCELLED = "cancelled"
+FAILED = "failed"          # Never reached the broker
+TERMINAL = (COMPLETE, REJECTED, CANCELLED, FAILED)
+
+# Order book "status" -> Order.status; anything else (open, trigger pending, ...) is OPEN
+_BOOK_STATUS = {"complete": COMPLETE, "rejected": REJECTED, "cancelled": CANCELLED}
+
+
+def order_tag(key):
+    """Angel One `ordertag` (max 20 chars) for an idempotency key; it is echoed in the order book"""
+    return hashlib.blake2s(key.encode(), digest_size=8).hexdigest()
+
+
+def _number(value, cast=float):
+    try:
+        return cast(float(value))
+    except (TypeError, ValueError):
+        return cast(0)
+
+
+class Order:
+    """One order and what the broker has said about it"""
+
+    def __init__(self, key, exchange, symbol_token, trading_symbol, side, quantity, on_update=None, started=None,
+                 order_type="MARKET", trigger_price=None):
+        self.key = key
+        self.tag = order_tag(key)
+        self.exchange = exchange
+        self.symbol_token = str(symbol_token)
+        self.trading_symbol = trading_symbol
+        self.side = side
+        self.quantity = int(quantity)
+        self.order_type = order_type  # MARKET, or STOPLOSS_MARKET with a trigger_price
+        self.trigger_price = trigger_price
+        self.variety = "STOPLOSS" if order_type.startswith("STOPLOSS") else "NORMAL"
+        self.change = None           # A modifyOrder waiting for the broker's order id
+        self.status = PENDING
+        self.order_id = None
+        self.filled = 0
+        self.average_price = None
+        self.message = None
+        self.attempts = 0
+        self.sending = False         # A placeOrder call is in flight
+        self.created = datetime.datetime.now()
+        self.sent_at = None          # time.monotonic() of the last send
+        self.started = started       # time.perf_counter() of the decision, for signal-to-order timing
+        self.round_trip_ms = None    # placeOrder round trip, once the broker answered
+        self.on_update = on_update
+
+    @property
+    def terminal(self):
+        return self.status in TERMINAL
+
+    @property
+    def signed_filled(self):
+        """Filled quantity, negative for SELL"""
+        return self.filled if self.side == "BUY" else -self.filled
+
+    def payload(self, product="INTRADAY", duration="DAY"):
+        payload = {
+            "variety": self.variety,
+            "tradingsymbol": self.trading_symbol,
+            "symboltoken": self.symbol_token,
+            "exchange": self.exchange,
+            "transactiontype": self.side,
+            "ordertype": self.order_type,
+            "producttype": product,
+            "duration": duration,
+            "price": 0,
+            "quantity": self.quantity,
+            "disclosedquantity": 0,
+            "ordertag": self.tag,
+        }
+        if self.trigger_price is not None:
+            payload["triggerprice"] = round(self.trigger_price, 2)
+        return payload
+
+    def status_dict(self):
+        return {
+            "key": self.key,
+            "tag": self.tag,
+            "order_id": self.order_id,
+            "trading_symbol": self.trading_symbol,
+            "exchange": self.exchange,
+            "symbol_token": self.symbol_token,
+            "side": self.side,
+            "quantity": self.quantity,
+            "order_type": self.order_type,
+            "trigger_price": self.trigger_price,
+            "status": self.status,
+            "filled": self.filled,
+            "average_price": self.average_price,
+            "message": self.message,
+            "attempts": self.attempts,
+            "created": self.created.isoformat(timespec="seconds"),
+        }
+
+
+class OrderManager:
+    """
+    Places orders off the trading thread and follows them to a fill.
+
+    submit() returns at once; a small pool sends placeOrder. One poller
+    thread reads the whole order book every `poll_interval` seconds while
+    any order is unfinished, and updates every order from it, so there is
+    one book request per interval however many orders are in flight.
+
+    Every order carries an idempotency key. Submitting a key again returns
+    the existing order instead of placing another. The key's hash goes to
+    the broker as `ordertag`: if placeOrder fails without an answer, the
+    order is looked up by tag in the book, and it is only sent again once
+    the book has shown for `resolve_after` seconds that it never arrived.
+
+    Net filled quantity per instrument is kept from the book and compared
+    with the broker's positions every `reconcile_interval` seconds.
+
+    Stop-loss orders (order_type="STOPLOSS_MARKET") wait at the broker until
+    their trigger; modify() turns one into a MARKET order to exit at once.
+
+    before_send(), if given, is called right before every placeOrder (e.g. to
+    wait until the order is in the state journal). adopt() follows an order a
+    previous run submitted without ever sending it again.
+
+    Unfinished orders are indexed on their own, so a poll pass does not scan
+    every order of the session; of the finished ones only the latest
+    `keep_finished` are kept (for orders(), status() and resubmitted keys).
+    """
+
+    def __init__(self, place, order_book, positions=None, modify=None, workers=4, poll_interval=1.0,
+                 resolve_after=5.0, max_attempts=2, reconcile_interval=60.0, before_send=None, keep_finished=1000):
+        self._place = place
+        self._order_book = order_book
+        self._positions = positions
+        self._modify = modify
+        self._before_send = before_send
+        self.poll_interval = poll_interval
+        self.resolve_after = resolve_after
+        self.max_attempts = max_attempts
+        self.reconcile_interval = reconcile_interval
+        self.keep_finished = keep_finished
+        self._orders = {}            # key -> Order
+        self._open = {}              # key -> Order, for the ones not finished yet
+        self._done = deque()         # keys of finished orders, oldest first
+        self._by_id = {}             # broker order id -> Order
+        self.positions = {}          # (exchange, token) -> net filled quantity
+        self.mismatches = {}         # (exchange, token) -> {"local", "broker"} from the last reconcile
+        self.counts = {}             # (trading symbol, side, status) -> orders that ended in it
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="orders")
+        self._wake = threading.Event()
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._reconciled = 0.0
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="order-poller", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stop_event.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def submit(self, key, exchange, symbol_token, trading_symbol, side, quantity, on_update=None, started=None,
+               order_type="MARKET", trigger_price=None):
+        """
+        Queue an order and return its Order. on_update(order, placed) is
+        called (from an order thread) when the broker first answers
+        (placed=True) and whenever its status or fill changes afterwards.
+        """
+        with self._lock:
+            order = self._orders.get(key)
+            if order is not None:
+                log.warning("⚠ Order %s already submitted (%s), not placing it again", key, order.status)
+                return order
+            order = Order(key, exchange, symbol_token, trading_symbol, side, quantity, on_update, started,
+                          order_type, trigger_price)
+            self._orders[key] = self._open[key] = order
+        self._pool.submit(self._send, order)
+        return order
+
+    def adopt(self, key, exchange, symbol_token, trading_symbol, side, quantity, on_update=None,
+              order_type="MARKET", trigger_price=None, filled=0):
+        """
+        Follow an order from a previous run (e.g. the state journal) that may or
+        may not have reached the broker. It is looked up by tag in the order
+        book and marked FAILED if it is not there after resolve_after seconds;
+        it is never sent again.
+        """
+        with self._lock:
+            order = self._orders.get(key)
+            if order is not None:
+                return order
+            order = Order(key, exchange, symbol_token, trading_symbol, side, quantity, on_update,
+                          order_type=order_type, trigger_price=trigger_price)
+            order.status = SENT
+            order.filled = int(filled)
+            order.attempts = self.max_attempts
+            order.sent_at = time.monotonic()
+            order.message = "Sent before a restart"
+            self._orders[key] = self._open[key] = order
+        self._wake.set()
+        return order
+
+    def add_position(self, exchange, symbol_token, quantity):
+        """Count quantity filled before a restart into the net position compared with the broker's"""
+        key = (exchange, str(symbol_token))
+        with self._lock:
+            self.positions[key] = self.positions.get(key, 0) + quantity
+
+    def modify(self, key, order_type="MARKET", trigger_price=None):
+        """
+        Change an unfinished order, e.g. turn a pending stop into a MARKET exit.
+        If the broker has not given the order an id yet, the change goes out
+        as soon as it has. Returns False if the order has already finished.
+        """
+        order = self._orders.get(key)
+        if order is None or order.terminal or self._modify is None:
+            return False
+        order.change = (order_type, trigger_price)
+        if order.order_id is not None:
+            self._pool.submit(self._send_change, order)
+        return True
+
+    def get(self, key):
+        return self._orders.get(key)
+
+    def orders(self, limit=None):
+        with self._lock:
+            orders = list(self._orders.values())
+        return orders[-limit:] if limit else orders
+
+    def open_orders(self):
+        with self._lock:
+            return list(self._open.values())
+
+    def _send(self, order):
+        order.attempts += 1
+        order.status = SENT
+        order.sending = True
+        if self._before_send is not None:
+            self._before_send()
+        start = time.perf_counter()
+        try:
+            response = self._place(order.payload())
+        except Exception as e:
+            # The broker may or may not have it; the poller looks for the tag before sending again
+            order.message = str(e)
+            order.sent_at = time.monotonic()
+            order.sending = False
+            log.warning("⚠ No answer placing %s %s %s (%s), checking the order book",
+                        order.side, order.quantity, order.trading_symbol, e)
+            self._wake.set()
+            return
+        order.round_trip_ms = (time.perf_counter() - start) * 1000
+        order.sent_at = time.monotonic()
+        order.sending = False
+
+        if response.get("status"):
+            data = response.get("data") or {}
+            order.order_id = data.get("orderid")
+            order.status = OPEN
+            with self._lock:
+                self._by_id[order.order_id] = order
+            log.info("✅ %s %s order for %s %s placed, order id %s", order.side, order.order_type, order.quantity,
+                     order.trading_symbol, order.order_id)
+            if order.change is not None:
+                self._pool.submit(self._send_change, order)
+            self._wake.set()
+        else:
+            order.status = REJECTED
+            order.message = response.get("message")
+            log.error("❌ %s order for %s %s rejected: %s", order.side, order.quantity,
+                      order.trading_symbol, order.message)
+            self._finished(order)
+        self._notify(order, placed=True)
+
+    def _send_change(self, order):
+        change, order.change = order.change, None
+        if change is None or order.terminal:
+            return
+        order_type, trigger_price = change
+        payload = order.payload()
+        payload.update(orderid=order.order_id, ordertype=order_type)
+        payload.pop("ordertag", None)
+        payload.pop("triggerprice", None)
+        if trigger_price is not None:
+            payload["triggerprice"] = round(trigger_price, 2)
+        try:
+            response = self._modify(payload)
+        except Exception as e:
+            # Whatever the broker did, the order is still followed through the book
+            log.warning("⚠ No answer changing %s order %s to %s: %s", order.trading_symbol, order.order_id,
+                        order_type, e)
+            return
+        if response.get("status"):
+            order.order_type, order.trigger_price = order_type, trigger_price
+            log.info("✏ %s order %s for %s changed to %s", order.side, order.order_id, order.trading_symbol,
+                     order_type)
+            self._wake.set()
+        else:
+            # Most often the order filled or was rejected in the meantime; the book will say
+            log.warning("⚠ Could not change %s order %s to %s: %s", order.trading_symbol, order.order_id,
+                        order_type, response.get("message"))
+
+    def _notify(self, order, placed=False):
+        if order.on_update is None:
+            return
+        try:
+            order.on_update(order, placed)
+        except Exception as e:
+            log.exception("⚠ Order callback failed for %s: %s", order.key, e)
+
+    def _finished(self, order):
+        counter = (order.trading_symbol, order.side, order.status)
+        with self._lock:
+            self.counts[counter] = self.counts.get(counter, 0) + 1
+            if self._open.pop(order.key, None) is None:
+                return
+            self._done.append(order.key)
+            while len(self._done) > self.keep_finished:
+                old = self._orders.pop(self._done.popleft(), None)
+                if old is not None and self._by_id.get(old.order_id) is old:
+                    del self._by_id[old.order_id]
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+            try:
+                if self.open_orders():
+                    self.poll()
+                if self._positions is not None and time.monotonic() - self._reconciled >= self.reconcile_interval:
+                    self.reconcile()
+            except Exception as e:
+                log.exception("⚠ Order book poll failed: %s", e)
+
+    def poll(self):
+        """One pass: fetch the order book once and update every unfinished order from it"""
+        active = [order for order in self.open_orders() if order.status != PENDING and not order.sending]
+        if not active:
+            return
+        book = self._order_book() or []
+        by_id = {entry.get("orderid"): entry for entry in book}
+        by_tag = {entry.get("ordertag"): entry for entry in book if entry.get("ordertag")}
+
+        for order in active:
+            entry = by_id.get(order.order_id) if order.order_id else None
+            entry = entry or by_tag.get(order.tag)
+            if entry is not None:
+                self._apply(order, entry)
+            elif order.status == SENT and time.monotonic() - order.sent_at >= self.resolve_after:
+                if order.attempts < self.max_attempts:
+                    log.warning("⚠ %s never reached the broker, sending it again", order.key)
+                    order.sending = True
+                    self._pool.submit(self._send, order)
+                else:
+                    order.status = FAILED
+                    log.error("❌ %s %s %s could not be placed: %s", order.side, order.quantity,
+                              order.trading_symbol, order.message)
+                    self._finished(order)
+                    self._notify(order)
+
+    def _apply(self, order, entry):
+        placed = order.status == SENT  # An answer lost in transit, found in the book
+        if order.order_id is None:
+            order.order_id = entry.get("orderid")
+            with self._lock:
+                self._by_id[order.order_id] = order
+            if order.change is not None:
+                self._pool.submit(self._send_change, order)
+        status = _BOOK_STATUS.get(str(entry.get("status") or entry.get("orderstatus") or "").lower(), OPEN)
+        filled = _number(entry.get("filledshares"), int)
+        average = _number(entry.get("averageprice")) or None
+        if status == order.status and filled == order.filled and not placed:
+            return
+
+        delta = filled - order.filled
+        if delta:
+            key = (order.exchange, order.symbol_token)
+            with self._lock:
+                self.positions[key] = self.positions.get(key, 0) + (delta if order.side == "BUY" else -delta)
+        order.status, order.filled, order.average_price = status, filled, average
+        if status == REJECTED:
+            order.message = entry.get("text") or order.message
+            log.error("❌ %s order %s for %s rejected: %s", order.side, order.order_id,
+                      order.trading_symbol, order.message)
+        elif status == COMPLETE:
+            log.info("💹 %s %s %s filled at %s", order.side, filled, order.trading_symbol, average)
+        if order.terminal:
+            self._finished(order)
+        self._notify(order, placed)
+
+    def reconcile(self):
+        """Compare net filled quantities with the broker's positions; returns (and logs) the differences"""
+        self._reconciled = time.monotonic()
+        broker = {}
+        for entry in self._positions() or []:
+            key = (entry.get("exchange"), str(entry.get("symboltoken")))
+            broker[key] = broker.get(key, 0) + _number(entry.get("netqty"), int)
+        with self._lock:
+            local = dict(self.positions)
+        mismatches = {}
+        for key in set(local) | set(broker):
+            if local.get(key, 0) != broker.get(key, 0):
+                mismatches[key] = {"local": local.get(key, 0), "broker": broker.get(key, 0)}
+        for (exchange, token), quantities in mismatches.items():
+            if (exchange, token) not in self.mismatches:
+                log.warning("⚠ Position mismatch for %s:%s: filled here %s, broker %s",
+                            exchange, token, quantities["local"], quantities["broker"])
+        self.mismatches = mismatches
+        return mismatches
+
+    def status(self):
+        with self._lock:
+            orders = list(self._orders.values())
+        by_status = {}
+        for order in orders:
+            by_status[order.status] = by_status.get(order.status, 0) + 1
+        return {"orders": by_status, "position_mismatches": len(self.mismatches)}
@@ -0,0 +1,250 @@
+import glob
+import json
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+
+log = logging.getLogger(__name__)
+
+JOURNAL_PREFIX = "journal-"
+
+
+def _segment_start(path):
+    return int(os.path.basename(path)[len(JOURNAL_PREFIX):].split(".")[0])
+
+
+def _write_atomic(path, write):
+    """write(file) to a temporary file, fsync it, then move it over path"""
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        write(f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+class StateStore:
+    """
+    Crash-safe strategy state, kept in `root`:
+
+        <root>/journal-<seq>.log        append-only, one JSON line per position or order change
+        <root>/<key>.npz                one snapshot per strategy: candles, indicators and position
+
+    record() and snapshot() only queue, so the trading thread never waits
+    on the disk. A journal thread appends whatever has been recorded and
+    fsyncs it in one go (group commit); wait() blocks until everything
+    recorded so far is on disk, which is what orders call before they are
+    sent. Snapshots are written by a second thread and replaced atomically.
+
+    compact() starts a new journal segment and, once the snapshots queued
+    before it are written, deletes the segments they cover. load() returns
+    every strategy's snapshot with the journal lines written after it.
+    """
+
+    def __init__(self, root=None, wait_timeout=2.0):
+        self.root = root or os.getenv("STATE_DIR", os.path.join("data", "state"))
+        self.wait_timeout = wait_timeout
+        self.counts = {"records": 0, "fsyncs": 0, "snapshots": 0}
+        self._seq = 0                # Last sequence number handed out
+        self._durable = 0            # Last sequence number fsynced
+        self._segment = 1            # Sequence number the journal segment being written starts at
+        self._records = []           # (seq, line) or (seq, None) for "start a new segment"
+        self._snapshots = []         # (path, payload) to write, (path, None) to delete, (None, seq) to compact
+        self._cond = threading.Condition()
+        self._threads = None
+        self._stopping = False
+
+    @staticmethod
+    def key(*parts):
+        """File-name-safe key for e.g. (exchange, symbol_token, candle_size, variant)"""
+        return "_".join(str(part) for part in parts)
+
+    def _path(self, key):
+        return os.path.join(self.root, key + ".npz")
+
+    def load(self):
+        """
+        {key: state} for every strategy saved here: the snapshot's fields (with
+        its "times" and "ohlcv" candle arrays) overlaid with the newer journal
+        lines. Call before recording anything, so new sequence numbers follow
+        the saved ones.
+        """
+        states = {}
+        if not os.path.isdir(self.root):
+            return states
+        for path in glob.glob(os.path.join(self.root, "*.npz")):
+            try:
+                with np.load(path) as snapshot:
+                    state = json.loads(snapshot["meta"].tobytes())
+                    state["times"], state["ohlcv"] = snapshot["times"], snapshot["ohlcv"]
+            except Exception as e:
+                log.warning("⚠ Unreadable state snapshot %s: %s", path, e)
+                continue
+            states[state["key"]] = state
+            self._seq = max(self._seq, state["seq"])
+
+        segments = sorted(glob.glob(os.path.join(self.root, JOURNAL_PREFIX + "*.log")), key=_segment_start)
+        for path in segments:
+            with open(path, "rb") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        break  # Torn last line of a crash; nothing after it was acknowledged
+                    self._seq = max(self._seq, record["seq"])
+                    saved = states.get(record["key"])
+                    if saved is not None and saved["seq"] >= record["seq"]:
+                        continue
+                    if record.get("forget"):
+                        states.pop(record["key"], None)
+                    else:
+                        states[record["key"]] = {**(saved or {}), **record["state"], "seq": record["seq"],
+                                                 "recorded_at": record["recorded_at"]}
+        self._durable = self._seq
+        self._segment = self._seq + 1
+        return states
+
+    def record(self, key, state):
+        """Queue one journal line with a strategy's position state; returns its sequence number"""
+        return self._append(key, {"recorded_at": time.time(), "state": state})
+
+    def forget(self, key):
+        """Drop a strategy's saved state (it was removed, not just stopped)"""
+        self._append(key, {"forget": True})
+        self._queue_snapshot(self._path(key), None)
+
+    def _append(self, key, fields):
+        with self._cond:
+            self._start()
+            self._seq += 1
+            line = json.dumps({"seq": self._seq, "key": key, **fields}, separators=(",", ":")) + "\n"
+            self._records.append((self._seq, line.encode()))
+            self._cond.notify_all()
+            return self._seq
+
+    def snapshot(self, key, state, times, ohlcv):
+        """Queue a strategy's full snapshot; the arrays are copied, so the caller may keep changing its own"""
+        with self._cond:
+            payload = {"key": key, "seq": self._seq, "saved_at": time.time(), **state}
+        self._queue_snapshot(self._path(key), (payload, np.array(times, dtype=np.int64),
+                                               np.array(ohlcv, dtype=np.float64)))
+
+    def compact(self):
+        """Start a new journal segment; the old ones go once the snapshots queued so far are written"""
+        with self._cond:
+            self._start()
+            self._records.append((self._seq, None))
+            self._snapshots.append((None, self._seq))
+            self._cond.notify_all()
+
+    def _queue_snapshot(self, path, payload):
+        with self._cond:
+            self._start()
+            self._snapshots.append((path, payload))
+            self._cond.notify_all()
+
+    def wait(self, seq=None):
+        """Block until the journal is fsynced up to seq (default: everything recorded so far)"""
+        with self._cond:
+            seq = self._seq if seq is None else seq
+            if not self._cond.wait_for(lambda: self._durable >= seq or self._threads is None, self.wait_timeout):
+                log.warning("⚠ State journal is not durable after %ss, carrying on", self.wait_timeout)
+                return False
+            return True
+
+    def _start(self):
+        if self._threads is not None:
+            return
+        os.makedirs(self.root, exist_ok=True)
+        self._stopping = False
+        self._threads = [threading.Thread(target=self._write_journal, name="state-journal", daemon=True),
+                         threading.Thread(target=self._write_snapshots, name="state-snapshots", daemon=True)]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self, timeout=None):
+        """Write out everything queued, then stop the writer threads"""
+        with self._cond:
+            threads, self._stopping = self._threads, True
+            self._cond.notify_all()
+        for thread in threads or ():
+            thread.join(timeout)
+        with self._cond:
+            self._threads = None
+            self._cond.notify_all()
+
+    def _open_segment(self, start):
+        path = os.path.join(self.root, f"{JOURNAL_PREFIX}{start:012d}.log")
+        return open(path, "ab")
+
+    def _write_journal(self):
+        f = None
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._records or self._stopping)
+                batch, self._records = self._records, []
+                if not batch and self._stopping:
+                    break
+            for seq, line in batch:
+                if line is None:
+                    if f is not None:
+                        f.flush()
+                        os.fsync(f.fileno())
+                        f.close()
+                        f = None
+                    with self._cond:
+                        self._segment = seq + 1
+                        self._cond.notify_all()
+                    continue
+                if f is None:
+                    f = self._open_segment(self._segment)
+                f.write(line)
+            if f is not None:
+                f.flush()
+                os.fsync(f.fileno())
+            with self._cond:
+                self._durable = batch[-1][0]
+                self.counts["records"] += sum(line is not None for _, line in batch)
+                self.counts["fsyncs"] += 1
+                self._cond.notify_all()
+        if f is not None:
+            f.close()
+
+    def _write_snapshots(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._snapshots or self._stopping)
+                batch, self._snapshots = self._snapshots, []
+                if not batch and self._stopping:
+                    break
+            for path, payload in batch:
+                try:
+                    if path is None:
+                        self._drop_segments(payload)
+                    elif payload is None:
+                        if os.path.exists(path):
+                            os.remove(path)
+                    else:
+                        meta, times, ohlcv = payload
+                        encoded = np.frombuffer(json.dumps(meta).encode(), dtype=np.uint8)
+                        _write_atomic(path, lambda f: np.savez(f, meta=encoded, times=times, ohlcv=ohlcv))
+                        self.counts["snapshots"] += 1
+                except Exception as e:
+                    log.exception("⚠ Could not write state to %s: %s", path or self.root, e)
+
+    def _drop_segments(self, seq):
+        """Delete the journal segments that only hold lines up to seq (all covered by snapshots now)"""
+        with self._cond:
+            # Only once the journal thread has moved past seq to a new segment
+            if not self._cond.wait_for(lambda: self._segment > seq, self.wait_timeout):
+                return
+        for path in glob.glob(os.path.join(self.root, JOURNAL_PREFIX + "*.log")):
+            if _segment_start(path) <= seq:
+                os.remove(path)
+
+    def status(self):
+        with self._cond:
+            return {**self.counts, "seq": self._seq, "durable": self._durable}
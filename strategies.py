@@ -0,0 +1,80 @@
+import logging
+
+from candle_builder import CLOSE
+
+log = logging.getLogger(__name__)
+
+
+class Strategy:
+    """
+    The trading rules a SymbolStrategy runs. A strategy declares the
+    indicators it reads as specs, e.g. ("supertrend", 10, 2.0) or ("atr", 14)
+    (see indicators.INDICATORS); strategies on the same candles asking for
+    the same spec read one indicator, computed once per update.
+
+    signal(values, candle) gets {spec: value} and the newest candle and
+    returns ('buy' or 'sell', whether it flipped on this candle). Positions,
+    stop loss, take profit and orders stay with SymbolStrategy.
+
+    Subclasses set `name` and take keyword parameters with defaults; they
+    are saved with the strategy's state and make up its variant.
+    """
+
+    name = None
+
+    def __init__(self, **params):
+        self.params = params
+        self.indicators = ()
+
+    @property
+    def variant(self):
+        """Name and parameters, e.g. supertrend_10_2.0; a symbol and candle size run each variant once"""
+        return "_".join([self.name, *(str(value) for value in self.params.values())])
+
+    def signal(self, values, candle):
+        raise NotImplementedError
+
+
+class SupertrendStrategy(Strategy):
+    """Long while the close is above the Supertrend line, short while it is below"""
+
+    name = "supertrend"
+
+    def __init__(self, length=10, multiplier=2.0):
+        super().__init__(length=int(length), multiplier=float(multiplier))
+        self.supertrend = ("supertrend", int(length), float(multiplier))
+        self.indicators = (self.supertrend,)
+
+    def signal(self, values, candle):
+        point = values[self.supertrend]
+        return point.signal, point.signal_change
+
+
+class SupertrendVolatilityStrategy(SupertrendStrategy):
+    """Supertrend flips, acted on only while ATR(atr_length) is at least min_atr_pct percent of the price"""
+
+    name = "supertrend_atr"
+
+    def __init__(self, length=10, multiplier=2.0, atr_length=10, min_atr_pct=0.05):
+        super().__init__(length, multiplier)
+        self.params.update(atr_length=int(atr_length), min_atr_pct=float(min_atr_pct))
+        self.atr = ("atr", int(atr_length))
+        self.indicators = (self.supertrend, self.atr)
+
+    def signal(self, values, candle):
+        signal, changed = super().signal(values, candle)
+        floor = self.params["min_atr_pct"] / 100 * candle[CLOSE]
+        if changed and not values[self.atr] >= floor:
+            log.debug("Ignoring %s flip, ATR %s is under %s", signal, values[self.atr], floor)
+            changed = False
+        return signal, changed
+
+
+STRATEGIES = {strategy.name: strategy for strategy in (SupertrendStrategy, SupertrendVolatilityStrategy)}
+
+
+def make_strategy(name="supertrend", **params):
+    """A registered strategy by name, e.g. make_strategy("supertrend", length=10, multiplier=3)"""
+    if name not in STRATEGIES:
+        raise ValueError(f"Unknown strategy: {name} (one of {', '.join(STRATEGIES)})")
+    return STRATEGIES[name](**params)
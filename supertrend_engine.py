@@ -0,0 +1,288 @@
+import math
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+# One Supertrend reading for the newest bar, same meaning as the pandas_ta
+# columns: value -> SUPERT_<len>_<mult>, direction -> SUPERTd_<len>_<mult>
+SupertrendPoint = namedtuple(
+    "SupertrendPoint",
+    ["value", "direction", "upper", "lower", "atr", "signal", "signal_change"]
+)
+
+# Newest-bar Supertrend for many symbols at once: arrays with one entry per
+# symbol. signal is +1 (close above the line, 'buy') or -1 ('sell');
+# ready is False where ATR has fewer than `length` true ranges
+SupertrendScan = namedtuple("SupertrendScan", ["value", "direction", "signal", "signal_change", "ready"])
+
+# Everything the next bar needs from the bar before it
+_State = namedtuple(
+    "_State",
+    ["bars", "close", "atr_mean", "atr_weight", "atr_obs", "upper", "lower", "direction", "signal"]
+)
+
+_EMPTY_STATE = _State(0, math.nan, math.nan, 1.0, 0, math.nan, math.nan, 1, None)
+
+
+def supertrend_column(length=10, multiplier=2.0):
+    """Column name pandas_ta uses for the Supertrend line, e.g. SUPERT_10_2.0"""
+    return f"SUPERT_{int(length)}_{float(multiplier)}"
+
+
+class StreamingSupertrend:
+    """
+    Incremental Supertrend that gives the same numbers as
+    ta.supertrend(high, low, close, length, multiplier) over the same candles.
+
+    ATR is the RMA pandas_ta uses (an adjusted EWM with alpha = 1/length, i.e.
+    Wilder smoothing), carried as a running weighted mean so each update is O(1).
+
+    update(..., new_bar=False) revises the bar that is still forming,
+    update(..., new_bar=True) closes it and starts the next one.
+    """
+
+    def __init__(self, length=10, multiplier=2.0):
+        self.length = int(length)
+        self.multiplier = float(multiplier)
+        self.column = supertrend_column(self.length, self.multiplier)
+        self._decay = 1.0 - 1.0 / self.length
+        self._closed = _EMPTY_STATE  # state after the last closed bar
+        self._current = None         # state after the bar still forming
+        self.last = None
+
+    @property
+    def bars(self):
+        return self._current.bars if self._current is not None else 0
+
+    @property
+    def ready(self):
+        """True once ATR has `length` true ranges behind it"""
+        return self.bars > self.length
+
+    def reset(self):
+        self._closed = _EMPTY_STATE
+        self._current = None
+        self.last = None
+
+    def dump(self):
+        """Everything update() carries between calls, as plain lists (for StateStore snapshots)"""
+        return [list(self._closed),
+                list(self._current) if self._current is not None else None,
+                list(self.last) if self.last is not None else None]
+
+    def restore(self, state):
+        """Carry on from a dump()"""
+        closed, current, last = state
+        self._closed = _State(*closed)
+        self._current = _State(*current) if current is not None else None
+        self.last = SupertrendPoint(*last) if last is not None else None
+
+    def seed(self, high, low, close):
+        """Replay a block of candles (e.g. the historical warm-up), oldest first"""
+        for h, l, c in zip(high, low, close):
+            self.update(h, l, c, new_bar=True)
+        return self.last
+
+    def update(self, high, low, close, new_bar=True):
+        if new_bar and self._current is not None:
+            self._closed = self._current
+        self._current, self.last = self._step(self._closed, float(high), float(low), float(close))
+        return self.last
+
+    def _step(self, prev, high, low, close):
+        i = prev.bars
+
+        # True range; pandas_ta leaves the first bar's TR undefined
+        tr = math.nan if i == 0 else true_range(high, low, prev.close)
+        atr_mean, atr_weight, atr_obs = rma_step(prev.atr_mean, prev.atr_weight, prev.atr_obs, tr, self._decay)
+        atr = atr_mean if atr_obs >= self.length else math.nan
+
+        upper, lower, direction, value = band_step(i == 0, prev.upper, prev.lower, prev.direction,
+                                                   high, low, close, atr, self.multiplier)
+        signal = 'buy' if close > value else 'sell'
+        signal_change = prev.signal is not None and signal != prev.signal
+
+        state = _State(i + 1, close, atr_mean, atr_weight, atr_obs, upper, lower, direction, signal)
+        point = SupertrendPoint(value, direction, upper, lower, atr, signal, signal_change)
+        return state, point
+
+
+def true_range(high, low, prev_close):
+    return max(abs(high - low), abs(high - prev_close), abs(prev_close - low))
+
+
+def rma_step(mean, weight, obs, value, decay):
+    """
+    One step of a running adjusted EWM, the same as Series.ewm(adjust=True)
+    step for step; NaN values are skipped. Returns (mean, weight, obs).
+    """
+    if value == value:
+        obs += 1
+        if mean != mean:
+            mean = value
+        else:
+            weight *= decay
+            if mean != value:
+                mean = (weight * mean + value) / (weight + 1.0)
+            weight += 1.0
+    return mean, weight, obs
+
+
+def band_step(first, prev_upper, prev_lower, prev_direction, high, low, close, atr, multiplier):
+    """Supertrend bands, direction and line for one bar given the bar before: (upper, lower, direction, value)"""
+    hl2 = 0.5 * (high + low)
+    matr = multiplier * atr
+    upper = hl2 + matr
+    lower = hl2 - matr
+
+    if first:
+        return upper, lower, 1, 0.0
+    if close > prev_upper:
+        direction = 1
+    elif close < prev_lower:
+        direction = -1
+    else:
+        direction = prev_direction
+        if direction > 0 and lower < prev_lower:
+            lower = prev_lower
+        if direction < 0 and upper > prev_upper:
+            upper = prev_upper
+    return upper, lower, direction, lower if direction > 0 else upper
+
+
+def supertrend_arrays(high, low, close, length=10, multiplier=2.0):
+    """
+    Supertrend over whole NumPy arrays, same numbers as ta.supertrend.
+    True range and ATR are vectorized; only the band/direction recursion loops.
+    Returns (trend, direction) float64 / int8 arrays.
+    """
+    high = np.asarray(high, dtype=np.float64)
+    low = np.asarray(low, dtype=np.float64)
+    close = np.asarray(close, dtype=np.float64)
+    m = close.size
+
+    prev_close = np.empty(m)
+    prev_close[0] = np.nan
+    prev_close[1:] = close[:-1]
+    tr = np.maximum(np.abs(high - low), np.maximum(np.abs(high - prev_close), np.abs(prev_close - low)))
+    tr[0] = np.nan
+    atr = pd.Series(tr).ewm(alpha=1.0 / length, min_periods=length).mean().to_numpy()
+
+    hl2 = 0.5 * (high + low)
+    matr = multiplier * atr
+    upper = (hl2 + matr).tolist()
+    lower = (hl2 - matr).tolist()
+    closes = close.tolist()
+
+    trend = [0.0] * m
+    direction = [1] * m
+    d = 1
+    for i in range(1, m):
+        c = closes[i]
+        if c > upper[i - 1]:
+            d = 1
+        elif c < lower[i - 1]:
+            d = -1
+        else:
+            if d > 0 and lower[i] < lower[i - 1]:
+                lower[i] = lower[i - 1]
+            if d < 0 and upper[i] > upper[i - 1]:
+                upper[i] = upper[i - 1]
+        direction[i] = d
+        trend[i] = lower[i] if d > 0 else upper[i]
+
+    return np.array(trend, dtype=np.float64), np.array(direction, dtype=np.int8)
+
+
+def supertrend_matrix(high, low, close, length=10, multiplier=2.0):
+    """
+    supertrend_arrays for many symbols at once: (symbols x bars) matrices in,
+    (trend, direction) matrices of the same shape out, row for row the same
+    numbers. Shorter histories can be left-padded with NaN.
+
+    True range and ATR run over the whole matrix; the band/direction
+    recursion loops over bars only, each step handling every symbol.
+    """
+    high = np.asarray(high, dtype=np.float64)
+    low = np.asarray(low, dtype=np.float64)
+    close = np.asarray(close, dtype=np.float64)
+    if close.ndim != 2:
+        raise ValueError(f"expected a (symbols x bars) matrix, got shape {close.shape}")
+    n, m = close.shape
+
+    # Bars along the first axis, so each step of the loop reads contiguous rows
+    high, low, close = (np.ascontiguousarray(a.T) for a in (high, low, close))
+    prev_close = np.empty((m, n))
+    prev_close[0] = np.nan
+    prev_close[1:] = close[:-1]
+    tr = np.maximum(np.abs(high - low), np.maximum(np.abs(high - prev_close), np.abs(prev_close - low)))
+    atr = _rma_columns(tr, length)
+
+    hl2 = 0.5 * (high + low)
+    matr = multiplier * atr
+    upper = hl2 + matr
+    lower = hl2 - matr
+
+    direction = np.ones((m, n), dtype=np.int8)
+    d = direction[0].copy()
+    for i in range(1, m):
+        c = close[i]
+        up = c > upper[i - 1]
+        down = c < lower[i - 1]
+        np.copyto(d, 1, where=up)
+        np.copyto(d, -1, where=down)
+        # No breakout: the band on the trend's side can only tighten
+        np.copyto(lower[i], lower[i - 1], where=(d > 0) & ~up & (lower[i] < lower[i - 1]))
+        np.copyto(upper[i], upper[i - 1], where=(d < 0) & ~down & (upper[i] > upper[i - 1]))
+        direction[i] = d
+
+    trend = np.where(direction > 0, lower, upper)
+    # supertrend_arrays starts every series at 0.0: here that is each row's first bar after its padding
+    valid = ~np.isnan(close)
+    rows = np.flatnonzero(valid.any(axis=0))
+    trend[valid.argmax(axis=0)[rows], rows] = 0.0
+    return np.ascontiguousarray(trend.T), np.ascontiguousarray(direction.T)
+
+
+def _rma_columns(values, length):
+    """
+    Series.ewm(alpha=1/length, min_periods=length).mean() down every column
+    at once: the adjusted EWM is a ratio of two decaying cumulative sums,
+    taken in blocks short enough that decay ** -block stays finite.
+    """
+    decay = 1.0 - 1.0 / length
+    valid = ~np.isnan(values)
+    values = np.where(valid, values, 0.0)
+    block = max(1, int(200 / -math.log10(decay))) if decay > 0 else 1
+    total = np.empty_like(values)
+    weight = np.empty_like(values)
+    carry_total = np.zeros(values.shape[1:])
+    carry_weight = np.zeros(values.shape[1:])
+    for start in range(0, len(values), block):
+        end = min(len(values), start + block)
+        powers = decay ** np.arange(end - start)
+        scale = (1.0 / powers)[:, None] if decay > 0 else np.ones((end - start, 1))
+        powers = powers[:, None]
+        total[start:end] = powers * (decay * carry_total + np.cumsum(values[start:end] * scale, axis=0))
+        weight[start:end] = powers * (decay * carry_weight + np.cumsum(valid[start:end] * scale, axis=0))
+        carry_total, carry_weight = total[end - 1], weight[end - 1]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = total / weight
+    mean[np.cumsum(valid, axis=0) < length] = np.nan
+    return mean
+
+
+def supertrend_scan(high, low, close, length=10, multiplier=2.0):
+    """Signals on the newest bar of each row of (symbols x bars) matrices, as a SupertrendScan"""
+    trend, direction = supertrend_matrix(high, low, close, length, multiplier)
+    close = np.asarray(close, dtype=np.float64)
+    signal = np.where(close[:, -1] > trend[:, -1], 1, -1).astype(np.int8)
+    if close.shape[1] > 1:
+        previous = np.where(close[:, -2] > trend[:, -2], 1, -1)
+        signal_change = signal != previous
+    else:
+        signal_change = np.zeros(close.shape[0], dtype=bool)
+    valid = ~np.isnan(close)
+    ready = (valid.sum(axis=1) > length) & valid[:, -1]
+    return SupertrendScan(trend[:, -1], direction[:, -1], signal, signal_change, ready)
@@ -0,0 +1,1000 @@
+import contextlib
+import datetime
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import Live_trading_with_Supertrend_ultra_final_lite as lt
+from candle_builder import CandleBuilder, CandleSeries, CLOSE, COLUMNS, frame_arrays, resample_ohlcv
+from chart_service import ChartService
+from indicators import IndicatorGraph, Supertrend
+from log_config import log_context
+from market_feed import MarketFeed
+from metrics import CPU_BUCKETS_MS, LatencyHistogram, PrometheusText
+from order_manager import CANCELLED, COMPLETE, FAILED, REJECTED, OrderManager
+from state_store import StateStore
+from strategies import SupertrendStrategy, make_strategy
+
+log = logging.getLogger(__name__)
+
+MAX_STRATEGIES = int(os.getenv("MAX_STRATEGIES", "200"))
+# Rest a stop-loss order at the broker for every filled entry (NATIVE_STOP_ORDERS=0 to only watch prices)
+NATIVE_STOP_ORDERS = os.getenv("NATIVE_STOP_ORDERS", "1") == "1"
+# A saved strategy younger than this (seconds) resumes from its snapshot's candles without a history fetch
+WARM_RESTART_AGE = float(os.getenv("WARM_RESTART_AGE", "300"))
+# Warm-ups load 1-minute history and resample it: enough sessions for `history` candles, at most this many
+SESSION_MINUTES = 375
+MAX_HISTORY_DAYS = 30
+
+# Per-symbol timing spans: in-process work gets microsecond buckets, broker round trips the default ones.
+# The engine times candle and indicator updates once per instrument, so its strategies only time decisions
+CPU_SPANS = ("candle_update", "indicator_update", "decision")
+NETWORK_SPANS = ("order_round_trip", "signal_to_order")
+
+# SymbolStrategy.state values
+WARMING_UP, RUNNING, STOPPED, WARMUP_FAILED = "warming_up", "running", "stopped", "failed"
+
+
+class CapacityError(RuntimeError):
+    """Raised by TradingEngine.add_symbol when max_strategies are already running"""
+
+
+class SymbolStrategy:
+    """
+    Runs one Strategy (Supertrend unless given another) on one instrument:
+    candles, the indicators it reads and the open position.
+
+    Orders go through an OrderManager without waiting for the broker. The
+    position flips as soon as the order is submitted; fills reported back
+    keep net_quantity, and an order that ends unfilled puts the position
+    back to what was actually filled.
+
+    Stop loss and take profit are checked against every price received.
+    With native_stops, each filled entry also gets a STOPLOSS_MARKET order
+    at the broker, so the stop holds between polls; any other exit turns
+    that order into a MARKET order instead of sending a second one.
+
+    With a state_store, every position or order change is journaled before
+    the order it leads to is sent, and restore() takes a previous run's
+    state back, following its unfinished orders instead of placing them again.
+
+    Candles are built from 1-minute prices and history at any candle_size.
+    Strategies on the same instrument can share one CandleSeries: pass the
+    timeframe's CandleBuilder as `candles` and feed on_candle() instead of
+    on_price(). Strategies on the same candles can share one IndicatorGraph
+    (`indicators`), stepped once per update by whoever feeds on_candle().
+    """
+
+    def __init__(self, trading_symbol, symbol_token, exchange, quantity, length=10, multiplier=2.0,
+                 candle_size=None, history=100, order_manager=None, lock=None, native_stops=None,
+                 state_store=None, candles=None, strategy=None, indicators=None):
+        self.id = uuid.uuid4().hex[:12]
+        self.trading_symbol = trading_symbol
+        self.symbol_token = symbol_token
+        self.exchange = exchange
+        self.quantity = quantity
+
+        self.candle_size = candle_size or lt.CANDLE_SIZE
+        if self.candle_size not in lt.CANDLE_SIZE_MINUTES:
+            raise ValueError(f"Unknown candle size: {self.candle_size}")
+        candle_minutes = lt.CANDLE_SIZE_MINUTES[self.candle_size]
+        if candles is not None and candles.candle_minutes != candle_minutes:
+            raise ValueError(f"{self.candle_size} strategy given {candles.candle_minutes}-minute candles")
+        self.candles = candles if candles is not None else CandleBuilder(candle_minutes=candle_minutes,
+                                                                         capacity=history)
+        self.strategy = strategy if strategy is not None else SupertrendStrategy(length, multiplier)
+        if indicators is not None and indicators.candles is not self.candles:
+            raise ValueError("indicators are computed over other candles")
+        self.indicators = indicators if indicators is not None else IndicatorGraph(self.candles)
+        for spec in self.strategy.indicators:
+            self.indicators.require(spec)
+
+        self.active_position = None
+        self.position_quantity = 0   # Quantity the open position was entered with
+        self.net_quantity = 0        # Filled quantity as the broker reported it, negative when short
+        self.entry_price = None
+        self.stop_loss = None
+        self.take_profit = None
+        self.last_action = None  # (candle time, signal) of the last flip acted on
+
+        self.state = WARMING_UP
+        self.error = None
+        self.started_at = datetime.datetime.now()
+        self.last_update = None
+
+        self.timings = {name: LatencyHistogram(CPU_BUCKETS_MS) for name in CPU_SPANS}
+        self.timings.update((name, LatencyHistogram()) for name in NETWORK_SPANS)
+        self._price_received = None  # perf_counter() of the price being handled
+
+        self.order_manager = order_manager
+        self.lock = lock             # Held while order updates change the position (the engine's update lock)
+        self.order_seq = 0
+        self._filled = {}            # Unfinished order key -> signed quantity filled so far
+        self._sent = {}              # Unfinished order key -> (side, quantity, order_type, trigger_price)
+        self.state_store = state_store
+        self.native_stops = NATIVE_STOP_ORDERS if native_stops is None else native_stops
+        self.stop_order = None       # The stop-loss order resting at the broker for the open position
+        self._entry_key = None       # Order that opened the position; its fill places the stop
+        # Context attached to every log record written while this strategy is handled
+        self.log_fields = {"symbol": trading_symbol, "token": str(symbol_token), "exchange": exchange,
+                           "candle_size": self.candle_size, "strategy": self.strategy.variant,
+                           "strategy_id": self.id}
+
+    @property
+    def instrument(self):
+        return (self.exchange, str(self.symbol_token))
+
+    @property
+    def key(self):
+        return (self.exchange, str(self.symbol_token), self.candle_size, self.strategy.variant)
+
+    @property
+    def state_key(self):
+        return StateStore.key(*self.key)
+
+    @property
+    def supertrend(self):
+        """The Supertrend indicator the strategy reads, if any (charts draw its line)"""
+        for spec in self.strategy.indicators:
+            node = self.indicators.nodes.get(spec)
+            if isinstance(node, Supertrend):
+                return node
+        return None
+
+    @property
+    def history_days(self):
+        """Sessions of 1-minute history that hold `history` candles of this strategy's size"""
+        minutes = self.candles.candle_minutes * self.candles.capacity
+        return max(1, min(MAX_HISTORY_DAYS, -(-minutes // SESSION_MINUTES)))
+
+    @property
+    def active(self):
+        """Warmed up and not stopped: the only state in which prices are acted on"""
+        return self.state == RUNNING
+
+    def position_state(self):
+        """Settings, position and unfinished orders as plain values, for the state journal"""
+        return {
+            "id": self.id,
+            "trading_symbol": self.trading_symbol,
+            "symbol_token": str(self.symbol_token),
+            "exchange": self.exchange,
+            "quantity": self.quantity,
+            "strategy": {"name": self.strategy.name, "params": self.strategy.params},
+            "candle_size": self.candle_size,
+            "history": self.candles.capacity,
+            "native_stops": self.native_stops,
+            "active_position": self.active_position,
+            "position_quantity": self.position_quantity,
+            "net_quantity": self.net_quantity,
+            "entry_price": self.entry_price,
+            "stop_loss": self.stop_loss,
+            "take_profit": self.take_profit,
+            "last_action": self.last_action,
+            "order_seq": self.order_seq,
+            "orders": {key: [*self._sent[key], filled] for key, filled in self._filled.items()},
+            "stop_order": self.stop_order.key if self.stop_order is not None else None,
+            "entry_key": self._entry_key,
+        }
+
+    def _journal(self):
+        if self.state_store is not None:
+            self.state_store.record(self.state_key, self.position_state())
+
+    def save(self):
+        """Queue a full snapshot (position, candles and indicators); call with the update lock held"""
+        if self.state_store is None:
+            return
+        state = self.position_state()
+        state["last_cum_volume"] = self.candles.last_cum_volume
+        state["indicators"] = self.indicators.dump(self.strategy.indicators)
+        if self.state == RUNNING:
+            times, ohlcv = self.candles.times(), self.candles.view()
+        else:
+            times, ohlcv = (), np.empty((0, len(COLUMNS)))  # Candles may be half loaded by a warm-up
+        self.state_store.snapshot(self.state_key, state, times, ohlcv)
+
+    def restore(self, saved, positions=True):
+        """
+        Take back a previous run's state (from StateStore.load). The id and
+        order sequence are kept, so order keys carry on where they stopped.
+        With positions, the position comes back too and its unfinished orders
+        are followed through the order book, never sent again. Returns True
+        if candles and indicators came back as well.
+        """
+        self.id = saved["id"]
+        self.log_fields["strategy_id"] = self.id
+        self.order_seq = saved["order_seq"]
+        if positions:
+            for name in ("active_position", "position_quantity", "net_quantity", "entry_price", "stop_loss",
+                         "take_profit"):
+                setattr(self, name, saved[name])
+            self.last_action = tuple(saved["last_action"]) if saved["last_action"] else None
+            self._entry_key = saved["entry_key"]
+            for key, (side, quantity, order_type, trigger_price, filled) in saved["orders"].items():
+                self._filled[key] = filled
+                self._sent[key] = (side, quantity, order_type, trigger_price)
+                order = self.order_manager.adopt(key, self.exchange, self.symbol_token, self.trading_symbol, side,
+                                                 quantity, self.on_order_update, order_type, trigger_price,
+                                                 abs(filled))
+                if key == saved["stop_order"]:
+                    self.stop_order = order
+        if not len(saved.get("times", ())) or "indicators" not in saved:
+            return False
+        self.candles.load_arrays(saved["times"], saved["ohlcv"], saved["last_cum_volume"])
+        return self.indicators.restore(saved["indicators"], self.strategy.indicators)
+
+    def status(self):
+        last_price = float(self.candles.last("close")) if not self.candles.empty else None
+        return {
+            "id": self.id,
+            "trading_symbol": self.trading_symbol,
+            "symbol_token": self.symbol_token,
+            "exchange": self.exchange,
+            "candle_size": self.candle_size,
+            "strategy": self.strategy.variant,
+            "quantity": self.quantity,
+            "state": self.state,
+            "error": self.error,
+            "position": self.active_position,
+            "net_quantity": self.net_quantity,
+            "open_orders": len(self._filled),
+            "entry_price": self.entry_price,
+            "stop_loss": self.stop_loss,
+            "stop_order_id": self.stop_order.order_id if self.stop_order is not None else None,
+            "take_profit": self.take_profit,
+            "bars": len(self.candles),
+            "last_price": last_price,
+            "started_at": self.started_at.isoformat(timespec="seconds"),
+            "last_update": self.last_update.isoformat(timespec="seconds") if self.last_update else None,
+        }
+
+    @property
+    def live_df(self):
+        """The candle buffer as a DataFrame (built on demand, for charts and debugging)"""
+        return self.candles.frame()
+
+    def warm_up(self, history=None, load_candles=True):
+        """
+        Seed candles and indicators from 1-minute history (today's, or the last
+        sessions', fetched unless given) resampled to this strategy's candle
+        size. load_candles=False keeps shared candles, and the indicators
+        already computed over them, as they are live.
+        """
+        if history is None:
+            history = lt.fetch_historical_stock_data(self.symbol_token, self.exchange, "ONE_MINUTE",
+                                                     self.history_days)
+        times_ns, ohlcv = resample_ohlcv(*frame_arrays(history), self.candles.candle_minutes)
+        if load_candles:
+            self.candles.load_arrays(times_ns, ohlcv)
+        self.indicators.seed(ohlcv, reseed=load_candles)
+
+        if len(times_ns):
+            log.info("Initial indicators calculated for %s (%s, %s)", self.trading_symbol, self.candle_size,
+                     self.strategy.variant)
+
+    def on_price(self, timestamp_ns, price, cum_volume=None):
+        """Fold a trade price (tick or polled LTP) into the candles and act on the strategy's latest signal"""
+        received = time.perf_counter()
+        new_bar = self.candles.update(timestamp_ns, price, cum_volume)
+        self.timings["candle_update"].observe((time.perf_counter() - received) * 1000)
+        self.on_candle(new_bar, received)
+
+    def on_candle(self, new_bar, received, changed=None):
+        """
+        Act on a candle update (what CandleBuilder.update returned) for a price
+        received at perf_counter() `received`. Shared indicators are stepped
+        (and timed) by the caller, which passes the specs that changed;
+        otherwise they are stepped here.
+        """
+        if new_bar is None:
+            return
+        if changed is None:
+            start = time.perf_counter()
+            changed = self.indicators.update(new_bar)
+            self.timings["indicator_update"].observe((time.perf_counter() - start) * 1000)
+        start = time.perf_counter()
+
+        specs = self.strategy.indicators
+        if not self.indicators.ready(specs):
+            log.warning("⚠ Indicators not available for %s", self.trading_symbol)
+            return
+        # Only a change in what the strategy reads can change its signal; an open position is checked on every price
+        unchanged = changed.isdisjoint(specs)
+        if unchanged and self.active_position is None:
+            return
+        self._price_received = received
+        if unchanged:
+            self.check_exits()
+        else:
+            signal, signal_changed = self.strategy.signal(self.indicators.values(specs), self.candles.last())
+            self.apply_trading_strategy(signal, signal_changed)
+        self.timings["decision"].observe((time.perf_counter() - start) * 1000)
+        self._price_received = None
+
+    def trade(self, quantity, **order):
+        """Submit one order (MARKET unless told otherwise) for a signed position change; a reversal is one order"""
+        if quantity == 0:
+            return None
+        self.order_seq += 1
+        side = "BUY" if quantity > 0 else "SELL"
+        key = f"{self.id}-{self.order_seq}"
+        self._filled[key] = 0
+        self._sent[key] = (side, abs(quantity), order.get("order_type", "MARKET"), order.get("trigger_price"))
+        self._journal()  # Journaled before it can be sent
+        return self.submit_order(key, side, abs(quantity), **order)
+
+    def submit_order(self, key, side, quantity, **order):
+        if self.order_manager is None:
+            log.error("❌ No order manager attached, %s %s %s not placed", side, quantity, self.trading_symbol)
+            return None
+        return self.order_manager.submit(key, self.exchange, self.symbol_token, self.trading_symbol, side, quantity,
+                                         on_update=self.on_order_update, started=self._price_received, **order)
+
+    def close_quantity(self):
+        """
+        Signed quantity an order must carry to close the open position. 0 when
+        the resting stop order is turned into a MARKET exit instead, or has
+        already filled.
+        """
+        stop, self.stop_order = self.stop_order, None
+        self._entry_key = None
+        if stop is not None and (stop.status == COMPLETE or self.order_manager.modify(stop.key, "MARKET")):
+            return 0
+        if self.active_position == "long":
+            return -self.position_quantity
+        if self.active_position == "short":
+            return self.position_quantity
+        return 0
+
+    def _exit(self):
+        """Close the open position; it is journaled as closed before the closing order can go out"""
+        quantity = self.close_quantity()
+        self.active_position = None
+        if self.trade(quantity) is None:
+            self._journal()
+
+    def close_position(self):
+        """Flatten the open position, its resting stop order turned into the MARKET exit (before a removal)"""
+        if self.active_position is not None:
+            log.info("🔄 Closing %s position in %s, the strategy is being removed", self.active_position,
+                     self.trading_symbol)
+            self._exit()
+
+    def _place_stop(self):
+        """Rest a STOPLOSS_MARKET order at the stop loss for the position just filled"""
+        price = float(self.candles.last("close")) if not self.candles.empty else None
+        long = self.active_position == "long"
+        if self.stop_loss is None or price is None or (self.stop_loss >= price if long else self.stop_loss <= price):
+            log.warning("⚠ Stop loss %s for %s is already through the price %s, watching prices only",
+                        self.stop_loss, self.trading_symbol, price)
+            return
+        quantity = -self.position_quantity if long else self.position_quantity
+        self.stop_order = self.trade(quantity, order_type="STOPLOSS_MARKET", trigger_price=self.stop_loss)
+
+    def on_order_update(self, order, placed):
+        """OrderManager callback: record timings and fills, and fall back to the filled position if an order died"""
+        now = time.perf_counter()
+        with self.lock or contextlib.nullcontext():
+            if placed and order.round_trip_ms is not None:
+                self.timings["order_round_trip"].observe(order.round_trip_ms)
+                if order.started is not None:
+                    self.timings["signal_to_order"].observe((now - order.started) * 1000)
+
+            previous = self._filled.get(order.key)
+            if previous is None:
+                return
+            self._order_changed(order, previous)
+            self._journal()
+
+    def _order_changed(self, order, previous):
+        self.net_quantity += order.signed_filled - previous
+        self._filled[order.key] = order.signed_filled
+        if not order.terminal:
+            return
+        del self._filled[order.key]
+        del self._sent[order.key]
+
+        if order is self.stop_order:
+            self.stop_order = None
+            if order.status == COMPLETE:
+                log.info("🛑 Stop loss order filled on %s position in %s at %s", self.active_position,
+                         self.trading_symbol, order.average_price)
+                self.active_position = None
+                self._entry_key = None
+            else:
+                log.warning("⚠ Stop loss order for %s %s (%s), watching prices only", self.trading_symbol,
+                            order.status, order.message)
+            return
+        if order.key == self._entry_key and order.status == COMPLETE:
+            self._entry_key = None
+            if self.native_stops and self.active_position is not None:
+                self._place_stop()
+
+        pending = [key for key in self._filled if self.stop_order is None or key != self.stop_order.key]
+        if order.status in (REJECTED, FAILED, CANCELLED) and not pending:
+            position = "long" if self.net_quantity > 0 else "short" if self.net_quantity < 0 else None
+            if position != self.active_position:
+                log.error("❌ %s order %s, %s position is %s, not %s", order.side, order.status,
+                          self.trading_symbol, position, self.active_position)
+                self.active_position = position
+                self.position_quantity = abs(self.net_quantity)
+
+    def _candle_time(self):
+        """The newest candle's start in IST, for log lines"""
+        return pd.Timestamp(self.candles.last_time_ns, tz="UTC").tz_convert("Asia/Kolkata")
+
+    def apply_trading_strategy(self, current_signal, signal_changed):
+        if current_signal is None or self.candles.empty:
+            log.error("❌ No data available for strategy application")
+            return
+
+        # Get the latest candle
+        candles = self.candles
+        latest = candles.last()
+
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("📊 %s candle time: %s, Signal: %s, Changed: %s",
+                      self.trading_symbol, self._candle_time(), current_signal, signal_changed)
+
+        # Ticks revise the same candle many times; act on each flip only once
+        if signal_changed and (candles.last_time_ns, current_signal) == self.last_action:
+            signal_changed = False
+
+        # If signal changed in the latest candle, take action
+        if signal_changed:
+            self.last_action = (candles.last_time_ns, current_signal)
+            # Close any existing position first; the close and the new entry go out as one order
+            # (or the close goes out as the resting stop order turned MARKET)
+            trade = 0
+            if self.active_position == "long":
+                log.info("🔄 Closing long position at %s at %s", latest[CLOSE], self._candle_time())
+                trade += self.close_quantity()
+                self.active_position = None
+            elif self.active_position == "short":
+                log.info("🔄 Closing short position at %s at %s", latest[CLOSE], self._candle_time())
+                trade += self.close_quantity()
+                self.active_position = None
+
+            # Open new position based on signal
+            if current_signal == 'buy' and self.active_position is None:
+                self.entry_price = latest[CLOSE]
+                # Calculate stop loss (lowest low of last 3 candles or 2% below entry)
+                if len(candles) >= 3:
+                    self.stop_loss = candles.column('low', 3).min()
+                else:
+                    self.stop_loss = self.entry_price * 0.98
+
+                # Calculate take profit (1:2 risk-reward)
+                risk = self.entry_price - self.stop_loss
+                self.take_profit = self.entry_price + (2 * risk)
+
+                log.info("📈 Opening buy position at %s, SL: %s, TP: %s at %s",
+                         self.entry_price, self.stop_loss, self.take_profit, self._candle_time())
+                trade += self.quantity
+                self.position_quantity = self.quantity
+                self.active_position = "long"
+
+            elif current_signal == 'sell' and self.active_position is None:
+                self.entry_price = latest[CLOSE]
+                # Calculate stop loss (highest high of last 3 candles or 2% above entry)
+                if len(candles) >= 3:
+                    self.stop_loss = candles.column('high', 3).max()
+                else:
+                    self.stop_loss = self.entry_price * 1.02
+
+                # Calculate take profit (1:2 risk-reward)
+                risk = self.stop_loss - self.entry_price
+                self.take_profit = self.entry_price - (2 * risk)
+
+                log.info("📉 Opening sell position at %s, SL: %s, TP: %s at %s",
+                         self.entry_price, self.stop_loss, self.take_profit, self._candle_time())
+                trade -= self.quantity
+                self.position_quantity = self.quantity
+                self.active_position = "short"
+
+            order = self.trade(trade)
+            self._entry_key = order.key if order is not None and self.active_position is not None else None
+            self._journal()
+
+        else:
+            self.check_exits()
+
+    def check_exits(self):
+        """Check the open position's stop loss and take profit against the price just received"""
+        if self.active_position == "long":
+            price = self.candles.last()[CLOSE]
+            if price <= self.stop_loss:
+                log.info("❌ Stop loss hit on long position at %s at %s", self.stop_loss, self._candle_time())
+                self._exit()
+            elif price >= self.take_profit:
+                log.info("💰 Take profit hit on long position at %s at %s", self.take_profit, self._candle_time())
+                self._exit()
+
+        elif self.active_position == "short":
+            price = self.candles.last()[CLOSE]
+            if price >= self.stop_loss:
+                log.info("❌ Stop loss hit on short position at %s at %s", self.stop_loss, self._candle_time())
+                self._exit()
+            elif price <= self.take_profit:
+                log.info("💰 Take profit hit on short position at %s at %s", self.take_profit, self._candle_time())
+                self._exit()
+
+
+class _Instrument:
+    """
+    What the strategies on one instrument share: candles on every timeframe,
+    the indicators computed over each and the history they load
+    """
+
+    def __init__(self, key):
+        self.key = key
+        self.series = CandleSeries()
+        self.indicators = {}         # Candle minutes -> IndicatorGraph over that timeframe's candles
+        # Work done once per update for all the strategies: candles on every timeframe, then their indicators
+        self.timings = {name: LatencyHistogram(CPU_BUCKETS_MS) for name in ("candle_update", "indicator_update")}
+        self.strategies = []         # Replaced, never changed in place, so the update loop can read it unlocked
+        self._fetch_lock = threading.Lock()
+        self._history = None         # (days, DataFrame) of the last fetch, while warm-ups need it
+
+    def history(self, days):
+        """1-minute history over (at least) `days` sessions; warm-ups running together share one fetch"""
+        with self._fetch_lock:
+            if self._history is None or self._history[0] < days:
+                # Enough for every strategy still waiting, so they all take this one
+                days = max([days] + [strategy.history_days for strategy in self.strategies
+                                     if strategy.state == WARMING_UP])
+                self._history = (days, lt.fetch_historical_stock_data(self.key[1], self.key[0], "ONE_MINUTE", days))
+            return self._history[1]
+
+    def timeframe(self, minutes, capacity=None):
+        """(candles, indicators) of one timeframe, added if no strategy uses it yet"""
+        candles = self.series.timeframe(minutes, capacity)
+        graph = self.indicators.get(minutes)
+        if graph is None or graph.candles is not candles:
+            graph = self.indicators[minutes] = IndicatorGraph(candles)
+        return candles, graph
+
+    def drop(self, minutes):
+        self.series.drop(minutes)
+        self.indicators.pop(minutes, None)
+
+    def release_history(self):
+        if not any(strategy.state == WARMING_UP for strategy in self.strategies):
+            self._history = None
+
+
+class TradingEngine:
+    """
+    Runs every registered SymbolStrategy from one scheduler loop, on one broker session.
+    Symbols can be added or removed while the loop is running.
+
+    add_symbol returns at once: historical warm-ups run on a small bounded
+    pool and a strategy only starts trading once its warm-up is done. At most
+    max_strategies run at a time; more raise CapacityError. A removed strategy
+    is marked stopped before it leaves the registry, so it acts on no price
+    after the one it may be processing.
+
+    market_data="poll" fetches batched quotes every poll_interval seconds.
+    market_data="stream" pushes WebSocket ticks into the strategies as they
+    arrive and falls back to polling whenever the feed is disconnected.
+
+    Each strategy runs one Strategy variant on one instrument and candle
+    size. Strategies on the same instrument share one quote or tick per
+    update, one CandleSeries (1-minute candles plus every larger timeframe
+    they use, derived from the same prices) and one 1-minute history fetch,
+    resampled per timeframe. Strategies on the same timeframe share one
+    IndicatorGraph: an indicator several of them read is computed once per
+    update, and a flat strategy is only run when one it reads changed.
+
+    Charts are built by a ChartService on its own thread; the trading loop
+    only marks which symbols changed.
+
+    Strategy state is kept in a StateStore (state_dir): position and order
+    changes are journaled as they happen and every strategy is snapshotted
+    each checkpoint_interval seconds and on shutdown. After a restart, run()
+    resumes every saved strategy; one saved less than WARM_RESTART_AGE
+    seconds ago trades again from its snapshot without a history fetch.
+    """
+
+    def __init__(self, poll_interval=60, market_data="poll", feed_url=None,
+                 max_strategies=MAX_STRATEGIES, warm_up_workers=4, chart_interval=1.0,
+                 state_dir=None, checkpoint_interval=60):
+        if market_data not in ("poll", "stream"):
+            raise ValueError(f"Unknown market data mode: {market_data}")
+        self.poll_interval = poll_interval
+        self.market_data = market_data
+        self.feed_url = feed_url
+        self.feed = None
+        self.max_strategies = max_strategies
+        self.strategies = {}         # (exchange, token, candle size, variant) -> SymbolStrategy
+        self.instruments = {}        # (exchange, token) -> _Instrument
+        self._by_id = {}
+        self._warm_up_pool = ThreadPoolExecutor(max_workers=warm_up_workers, thread_name_prefix="warm-up")
+        self._lock = threading.Lock()
+        self._update_lock = threading.Lock()  # Feed thread and poll loop never update at the same time
+        self.charts = ChartService(lock=self._update_lock, interval=chart_interval)
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._logged_in = False
+        self.timings = {"quote_fetch": LatencyHistogram(), "poll_pass": LatencyHistogram()}
+        self.store = StateStore(state_dir or lt.state_dir)
+        self._saved = self.store.load()  # key -> state of a previous run's strategy, until it is resumed
+        self.checkpoint_interval = checkpoint_interval
+        self.orders = OrderManager(lt.place_order, lt.fetch_order_book, lt.fetch_positions, modify=lt.modify_order,
+                                   before_send=self.store.wait)
+        lt.auth.on_change(self._on_session)
+
+    def add_symbol(self, trading_symbol, symbol_token, exchange, quantity, **strategy_kwargs):
+        """
+        Start a strategy on one instrument and candle size (strategy_kwargs go
+        to SymbolStrategy). `strategy` is a Strategy; without one, Supertrend
+        with the given length and multiplier.
+        """
+        candle_size = strategy_kwargs.get("candle_size") or lt.CANDLE_SIZE
+        if candle_size not in lt.CANDLE_SIZE_MINUTES:
+            raise ValueError(f"Unknown candle size: {candle_size}")
+        if strategy_kwargs.get("strategy") is None:
+            strategy_kwargs["strategy"] = SupertrendStrategy(
+                **{name: strategy_kwargs.pop(name) for name in ("length", "multiplier") if name in strategy_kwargs})
+        variant = strategy_kwargs["strategy"].variant
+        key = (exchange, str(symbol_token), candle_size, variant)
+        saved = self._saved.get(StateStore.key(*key))
+        if saved is not None:
+            for name in ("history", "native_stops"):
+                strategy_kwargs.setdefault(name, saved[name])
+        with self._lock:
+            if key in self.strategies:
+                log.warning("⚠ %s (%s, %s) is already running, updating quantity to %s", trading_symbol,
+                            candle_size, variant, quantity)
+                self.strategies[key].quantity = quantity
+                return self.strategies[key]
+            if len(self.strategies) >= self.max_strategies:
+                raise CapacityError(f"Already running the maximum of {self.max_strategies} strategies")
+            instrument = self.instruments.get(key[:2])
+            subscribe = instrument is None
+            if subscribe:
+                instrument = self.instruments[key[:2]] = _Instrument(key[:2])
+            candles, indicators = instrument.timeframe(lt.CANDLE_SIZE_MINUTES[candle_size],
+                                                       strategy_kwargs.get("history"))
+            strategy = SymbolStrategy(trading_symbol, symbol_token, exchange, quantity, order_manager=self.orders,
+                                      lock=self._update_lock, state_store=self.store, candles=candles,
+                                      indicators=indicators, **strategy_kwargs)
+            if saved is not None and self._restore(strategy, saved):
+                strategy.state = RUNNING
+                self.charts.mark(strategy)
+            instrument.strategies = [*instrument.strategies, strategy]
+            self.strategies[key] = strategy
+            self._by_id[strategy.id] = strategy
+        if self._logged_in and strategy.state == WARMING_UP:
+            self._warm_up_pool.submit(self._warm_up, strategy)
+        if subscribe and self.feed is not None:
+            self.feed.subscribe([instrument.key])
+        return strategy
+
+    def _live(self, strategy):
+        """True if another strategy is already trading on the candles this one shares"""
+        instrument = self.instruments.get(strategy.instrument)
+        others = instrument.strategies if instrument is not None else ()
+        return any(other is not strategy and other.active and other.candles is strategy.candles for other in others)
+
+    def _restore(self, strategy, saved):
+        """Give a new strategy its saved state; True if it can trade at once, without a history fetch"""
+        self._saved.pop(strategy.state_key, None)
+        recorded = saved.get("recorded_at") or saved.get("saved_at") or 0
+        # Intraday positions do not outlive their session: the broker squares them off
+        same_session = datetime.date.fromtimestamp(recorded) == datetime.date.today()
+        # Candles other strategies are already trading on are newer than any snapshot
+        if strategy.candles.capacity != saved["history"] or self._live(strategy):
+            saved = {name: value for name, value in saved.items() if name not in ("times", "ohlcv", "indicators")}
+        candles = strategy.restore(saved, positions=same_session)
+        if same_session:
+            self.orders.add_position(strategy.exchange, strategy.symbol_token, strategy.net_quantity)
+        warm = candles and time.time() - saved["saved_at"] <= WARM_RESTART_AGE
+        log.info("♻ Restored %s: %s position (net %s), %s open orders, %s", strategy.trading_symbol,
+                 strategy.active_position, strategy.net_quantity, len(strategy._filled),
+                 f"{len(strategy.candles)} candles" if warm else "reloading history", extra=strategy.log_fields)
+        return warm
+
+    def saved_symbols(self):
+        """Trading symbols a previous run saved that have not been resumed yet"""
+        return [saved["trading_symbol"] for saved in list(self._saved.values())]
+
+    def resume(self):
+        """Add back every strategy a previous run saved that has not been added again yet"""
+        for saved in list(self._saved.values()):
+            try:
+                self.add_symbol(saved["trading_symbol"], saved["symbol_token"], saved["exchange"], saved["quantity"],
+                                candle_size=saved["candle_size"],
+                                strategy=make_strategy(saved["strategy"]["name"], **saved["strategy"]["params"]))
+            except (CapacityError, KeyError, ValueError) as e:
+                log.warning("⚠ Not resuming %s: %s", saved["trading_symbol"], e)
+
+    def checkpoint(self):
+        """Snapshot every strategy and let the journal lines behind the snapshots go"""
+        with self._update_lock:
+            for strategy in self.snapshot():
+                if strategy.state != STOPPED:
+                    strategy.save()
+            # Saved strategies not resumed (yet) are carried forward, or compacting would drop their newer
+            # journal lines; saved_at and recorded_at stay as they were, so they are no fresher than before
+            # (a state only the journal had gets saved_at 0, or snapshot() would stamp it as saved now)
+            for key, saved in list(self._saved.items()):
+                state = {name: value for name, value in saved.items() if name not in ("key", "seq", "times", "ohlcv")}
+                state["saved_at"] = saved.get("saved_at", 0)
+                self.store.snapshot(key, state, saved.get("times", ()), saved.get("ohlcv", np.empty((0, len(COLUMNS)))))
+            self.store.compact()
+
+    def _warm_up(self, strategy):
+        instrument = self.instruments.get(strategy.instrument)
+        if strategy.state == STOPPED or instrument is None:
+            return
+        strategy.state = WARMING_UP
+        try:
+            with log_context(**strategy.log_fields):
+                history = instrument.history(strategy.history_days)
+                # Seeded under the update lock: the candles may be shared with strategies already trading
+                with self._update_lock:
+                    if strategy.state == STOPPED:
+                        return
+                    strategy.warm_up(history, load_candles=not self._live(strategy))
+                    strategy.state = RUNNING
+        except Exception as e:
+            strategy.state, strategy.error = WARMUP_FAILED, str(e)
+            log.warning("⚠ Warm-up failed for %s: %s", strategy.trading_symbol, e, extra=strategy.log_fields)
+            return
+        finally:
+            instrument.release_history()
+        self.charts.mark(strategy)
+
+    def get(self, strategy_id):
+        with self._lock:
+            return self._by_id.get(strategy_id)
+
+    def find(self, symbol_token, exchange="NSE"):
+        """Every strategy running on an instrument, one per candle size and variant"""
+        instrument = self.instruments.get((exchange, str(symbol_token)))
+        return list(instrument.strategies) if instrument is not None else []
+
+    def remove_symbol(self, symbol_token, exchange="NSE"):
+        """Stop every strategy on an instrument; returns them"""
+        return [self.remove(strategy.id) for strategy in self.find(symbol_token, exchange)]
+
+    def remove(self, strategy_id):
+        """
+        Stop one strategy by id, closing its open position first; returns it,
+        or None if no such strategy is running
+        """
+        with self._lock:
+            strategy = self._by_id.pop(strategy_id, None)
+            if strategy is None:
+                return None
+            self.strategies.pop(strategy.key, None)
+            instrument = self.instruments[strategy.instrument]
+        # Taking the update lock waits out a price the strategy is handling right now
+        with self._update_lock:
+            strategy.state = STOPPED
+            # Nothing tracks the position once the strategy is gone, so its stop must not stay resting either
+            strategy.close_position()
+            self.store.forget(strategy.state_key)
+            strategy.state_store = None  # Fills still coming in must not journal the forgotten strategy back
+            with self._lock:
+                instrument.strategies = [other for other in instrument.strategies if other is not strategy]
+                for spec in strategy.strategy.indicators:
+                    strategy.indicators.release(spec)
+                if not any(other.candles is strategy.candles for other in instrument.strategies):
+                    instrument.drop(strategy.candles.candle_minutes)
+                unsubscribe = not instrument.strategies
+                if unsubscribe:
+                    del self.instruments[instrument.key]
+        self.charts.forget(strategy.key)
+        if unsubscribe and self.feed is not None:
+            self.feed.unsubscribe([instrument.key])
+        return strategy
+
+    def remove_all(self):
+        for strategy in self.snapshot():
+            self.remove(strategy.id)
+
+    def snapshot(self):
+        with self._lock:
+            return list(self.strategies.values())
+
+    def status(self):
+        return {
+            "running": self.running,
+            "market_data": self.market_data,
+            "feed_connected": bool(self.feed is not None and self.feed.connected),
+            "strategies": len(self.strategies),
+            "instruments": len(self.instruments),
+            "max_strategies": self.max_strategies,
+            "state_journal": self.store.status(),
+            **self.orders.status(),
+        }
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """Start the scheduler loop in a background thread (no-op if it is already running)"""
+        if self.running:
+            return self._thread
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self.run, name="trading-engine", daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def stop(self, timeout=None):
+        self._stop_event.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+
+    def run(self):
+        """Log in once, warm up every symbol, then poll them all until stopped"""
+        self._stop_event.clear()
+        if not lt.login_to_angel_one():
+            log.error("Exiting due to login failure")
+            return
+        self._logged_in = True
+        lt.broker.warm_up()  # Spare keep-alive connections for order placement
+        self.charts.start()
+        self.orders.start()
+
+        self.resume()
+        for strategy in self.snapshot():
+            if strategy.state == WARMING_UP:
+                self._warm_up_pool.submit(self._warm_up, strategy)
+
+        if self.market_data == "stream":
+            self.feed = MarketFeed(self.on_tick, auth_token=lt.auth.jwt_token, api_key=lt.API_KEY,
+                                   client_code=lt.CLIENT_ID, feed_token=lt.auth.feed_token, url=self.feed_url)
+            with self._lock:
+                self.feed.subscribe(list(self.instruments))
+            self.feed.start()
+
+        log.info("Starting live trading session...")
+        checkpointed = time.monotonic()
+        try:
+            while not self._stop_event.is_set():
+                if self.feed is None or not self.feed.connected:
+                    self.tick()
+                if time.monotonic() - checkpointed >= self.checkpoint_interval:
+                    self.checkpoint()
+                    checkpointed = time.monotonic()
+
+                log.debug("Waiting for next update...")
+                self._stop_event.wait(self.poll_interval)
+
+            log.info("Gracefully stopping trading...")
+        except KeyboardInterrupt:
+            log.info("Trading session ended by user.")
+        except Exception as e:
+            log.exception("⚠ Error in trading loop: %s", e)
+        finally:
+            if self.feed is not None:
+                self.feed.stop()
+                self.feed = None
+            self.charts.stop(timeout=5)  # Renders whatever changed last
+            self.orders.stop(timeout=5)
+            self.checkpoint()
+            self.store.stop(timeout=5)
+            self._logged_in = False
+            lt.logout_from_angel_one()  # Ensure safe logout before stopping
+            log.info("Trading session ended.")
+
+    def tick(self):
+        """One pass over all symbols: one batched quote fetch, then update each instrument's strategies"""
+        with self._lock:
+            instruments = list(self.instruments.values())
+        if not instruments:
+            return
+
+        start = time.perf_counter()
+        quotes = lt.fetch_live_quotes([instrument.key for instrument in instruments])
+        self.timings["quote_fetch"].observe((time.perf_counter() - start) * 1000)
+        now_ns = time.time_ns()
+        for instrument in instruments:
+            if self._stop_event.is_set():
+                break
+            quote = quotes.get(instrument.key)
+            if quote is not None:
+                # Exchange time when the quote has it (as the tick feed does), else receive time
+                timestamp_ns = lt.quote_time_ns(quote) or now_ns
+                self._update(instrument, timestamp_ns, lt.quote_price(quote), lt.quote_volume(quote))
+        self.timings["poll_pass"].observe((time.perf_counter() - start) * 1000)
+
+    def metrics(self):
+        """Engine, per-symbol and broker timings and counters in the Prometheus text format"""
+        out = PrometheusText()
+        out.gauge("trading_strategies", "Registered strategies", len(self.strategies))
+        out.gauge("trading_instruments", "Instruments quoted and candled once for all their strategies",
+                  len(self.instruments))
+        for name, histogram in self.timings.items():
+            out.histogram("trading_engine_span_ms", "Engine loop spans in milliseconds",
+                          histogram.snapshot(), span=name)
+        with self._lock:
+            instruments = list(self.instruments.values())
+        for instrument in instruments:
+            for name, histogram in instrument.timings.items():
+                if histogram.count:
+                    out.histogram("trading_instrument_span_ms", "Per-instrument candle and indicator work, done once "
+                                  "for all its strategies, in milliseconds", histogram.snapshot(), span=name,
+                                  instrument=":".join(instrument.key))
+        for strategy in self.snapshot():
+            labels = {"symbol": strategy.trading_symbol, "strategy_id": strategy.id}
+            for name, histogram in strategy.timings.items():
+                if histogram.count:
+                    out.histogram("trading_symbol_span_ms", "Per-symbol hot path spans in milliseconds",
+                                  histogram.snapshot(), span=name, **labels)
+        for (symbol, side, status), count in sorted(self.orders.counts.items()):
+            out.counter("trading_orders_total", "Orders by how they ended", count,
+                        symbol=symbol, side=side, status=status)
+        out.gauge("trading_open_orders", "Orders not yet filled, rejected or cancelled", len(self.orders.open_orders()))
+        out.gauge("trading_position_mismatches", "Instruments whose filled quantity differs from the broker's position",
+                  len(self.orders.mismatches))
+        state = self.store.status()
+        out.counter("trading_state_records_total", "Position and order changes written to the state journal",
+                    state["records"])
+        out.counter("trading_state_fsyncs_total", "State journal fsyncs (each one commits a batch of records)",
+                    state["fsyncs"])
+        out.counter("trading_state_snapshots_total", "Strategy snapshots written", state["snapshots"])
+        out.counter("broker_logins_total", "Password + TOTP logins", lt.auth.logins)
+        out.counter("broker_token_refreshes_total", "Session tokens renewed through generateTokens", lt.auth.refreshes)
+        if lt.auth.logged_in:
+            out.gauge("broker_session_expiry_seconds", "Seconds until the session token expires",
+                      round(lt.auth.expires_at - time.time(), 1))
+        for path, stats in lt.broker.stats().items():
+            out.histogram("broker_request_ms", "Broker API round trips in milliseconds (every attempt)",
+                          stats["latency"], endpoint=path)
+            out.counter("broker_retries_total", "Broker API calls retried", stats["retries"], endpoint=path)
+            out.counter("broker_errors_total", "Broker API calls that failed after retries",
+                        stats["errors"], endpoint=path)
+        return out.render()
+
+    def _on_session(self, auth):
+        """The session token changed: the feed uses the new one when it next connects"""
+        if self.feed is not None:
+            self.feed.set_tokens(auth.jwt_token, auth.feed_token)
+
+    def on_tick(self, tick):
+        """MarketFeed callback: fold one tick into its symbol's candles and strategies"""
+        instrument = self.instruments.get((tick.exchange, tick.token))
+        if instrument is not None:
+            self._update(instrument, tick.timestamp_ms * 1_000_000, tick.ltp, tick.volume or None)
+
+    def _update(self, instrument, timestamp_ns, price, cum_volume):
+        """
+        Fold one price into an instrument's candles (every timeframe at once),
+        step each timeframe's indicators once, then run its strategies
+        """
+        with self._update_lock:
+            strategies = [strategy for strategy in instrument.strategies if strategy.active]
+            if not strategies:
+                return
+            received = time.perf_counter()
+            new_bars = instrument.series.update(timestamp_ns, price, cum_volume)
+            updated = time.perf_counter()
+            instrument.timings["candle_update"].observe((updated - received) * 1000)
+            changed = {}
+            graphs = {strategy.candles.candle_minutes: strategy.indicators for strategy in strategies}
+            for minutes, graph in graphs.items():
+                if new_bars[minutes] is not None:
+                    changed[minutes] = graph.update(new_bars[minutes])
+            instrument.timings["indicator_update"].observe((time.perf_counter() - updated) * 1000)
+            for strategy in strategies:
+                minutes = strategy.candles.candle_minutes
+                try:
+                    with log_context(**strategy.log_fields):
+                        strategy.on_candle(new_bars[minutes], received, changed.get(minutes))
+                        strategy.last_update = datetime.datetime.now()
+                except Exception as e:
+                    log.exception("⚠ Error updating %s: %s", strategy.trading_symbol, e, extra=strategy.log_fields)
+        for strategy in strategies:
+            self.charts.mark(strategy)